@@ -0,0 +1,7 @@
+"""
+Offline benchmark harness for the scrapers.
+
+Recorded site responses live in ``benchmarks/fixtures`` and are served by a
+local HTTP stand-in (``benchmarks.server``) so the benchmarks never touch the
+network. Run ``python -m benchmarks.run --help`` for usage.
+"""
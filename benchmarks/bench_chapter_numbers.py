@@ -0,0 +1,95 @@
+"""
+Microbenchmark: chapter number extraction and sorting on large chapter lists.
+
+Compares the legacy per-link regex/sort code with ``scrapers.chapter_numbers``.
+A series page is parsed again on every refresh, so the warm (memoized) case
+is the common one.
+
+    python -m benchmarks.bench_chapter_numbers --chapters 50000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapers.chapter_numbers import chapter_sort_key, extract_chapter_number
+
+
+def legacy_extract_chapter_number(text):
+    patterns = [
+        r'chapter\s*(\d+(?:\.\d+)?)',
+        r'ch\.?\s*(\d+(?:\.\d+)?)',
+        r'(\d+(?:\.\d+)?)',
+    ]
+    text_lower = text.lower().strip()
+    for pattern in patterns:
+        match = re.search(pattern, text_lower)
+        if match:
+            return match.group(1)
+    return "0"
+
+
+def legacy_sort_key(x):
+    return float(x['chapter']) if x['chapter'].replace('.', '').isdigit() else 0
+
+
+def make_titles(count, seed=0):
+    rng = random.Random(seed)
+    formats = ["Chapter {n}", "Ch. {n}", "Vol. {v} Ch. {n}", "Chapter {n}.5", "{n}", "Chapter {n}a",
+               "Chapter {n} - The Long Road", "Ch {n} Part 2"]
+    return [rng.choice(formats).format(n=i // 2 + 1, v=i // 200 + 1) for i in range(count)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def run(count):
+    titles = make_titles(count)
+
+    def legacy():
+        chapters = [{'chapter': legacy_extract_chapter_number(t), 'title': t} for t in titles]
+        chapters.sort(key=legacy_sort_key)
+        return chapters
+
+    def current():
+        chapters = [{'chapter': extract_chapter_number(t), 'title': t} for t in titles]
+        chapters.sort(key=lambda x: chapter_sort_key(x['chapter']))
+        return chapters
+
+    def clear():
+        extract_chapter_number.cache_clear()
+        chapter_sort_key.cache_clear()
+
+    legacy_time, legacy_result = timed(legacy)
+    clear()
+    cold_time, current_result = timed(current)
+    warm_time, _ = timed(current)
+
+    # Titles whose part ("12a", "Part 2") or volume prefix the legacy code misread
+    lost = sum(1 for t in titles if legacy_extract_chapter_number(t) != extract_chapter_number(t))
+    print(f"{count} chapters")
+    print(f"  legacy:          {legacy_time * 1000:8.1f} ms  ({lost} titles misread)")
+    print(f"  current (cold):  {cold_time * 1000:8.1f} ms")
+    print(f"  current (warm):  {warm_time * 1000:8.1f} ms")
+    print(f"  first five:      {[ch['chapter'] for ch in current_result[:5]]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chapter number microbenchmark.")
+    parser.add_argument('--chapters', type=int, default=10000)
+    args = parser.parse_args(argv)
+    run(args.chapters)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
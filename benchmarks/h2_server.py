@@ -0,0 +1,157 @@
+"""
+Local HTTP/2 (TLS) server for page images.
+
+Serves the synthetic pages of ``FixtureSite`` under ``/mdcdn/data/`` and
+``/wp-content/uploads/`` like a CDN that speaks HTTP/2, so the optional
+HTTP/2 transport can be exercised and measured offline. Streams are served
+concurrently, each with the configured latency, as a real CDN would.
+
+A self-signed certificate for ``127.0.0.1`` is created with the ``openssl``
+command line tool; clients must trust ``cert.pem`` from ``make_certificate``.
+Requires the ``h2`` package.
+
+    python -m benchmarks.h2_server --port 8766
+"""
+
+import asyncio
+import json
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+
+import h2.config
+import h2.connection
+import h2.events
+import h2.exceptions
+
+_CHUNK_SIZE = 16 * 1024
+
+
+def make_certificate(folder=None):
+    """Create a self-signed certificate for 127.0.0.1; returns ``(cert_path, key_path)``."""
+    folder = folder or tempfile.mkdtemp(prefix='bench-h2-')
+    cert, key = os.path.join(folder, 'cert.pem'), os.path.join(folder, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '2',
+                    '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+                    '-keyout', key, '-out', cert], check=True, capture_output=True)
+    return cert, key
+
+
+class H2ImageServer:
+    """Serves one image body for every page path over HTTP/2."""
+
+    def __init__(self, image, latency_ms=0):
+        self.image = image
+        self.latency = latency_ms / 1000.0
+        self.stats = {'requests': 0, 'images': 0, 'image_bytes': 0, 'connections': 0}
+        self.stats_lock = threading.Lock()
+
+    async def handle(self, reader, writer):
+        conn = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False))
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        with self.stats_lock:
+            self.stats['connections'] += 1
+        # Flow control: streams waiting for the client to open its window
+        windows = {}
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                try:
+                    events = conn.receive_data(data)
+                except h2.exceptions.ProtocolError:
+                    break
+                for event in events:
+                    if isinstance(event, h2.events.RequestReceived):
+                        asyncio.ensure_future(self.respond(conn, writer, event, windows))
+                    elif isinstance(event, h2.events.WindowUpdated):
+                        for waiter in list(windows.values()):
+                            waiter.set()
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+                writer.write(conn.data_to_send())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def respond(self, conn, writer, event, windows):
+        headers = dict((k.decode() if isinstance(k, bytes) else k, v.decode() if isinstance(v, bytes) else v)
+                       for k, v in event.headers)
+        path = headers.get(':path', '/').split('?')[0]
+        stream_id = event.stream_id
+        with self.stats_lock:
+            self.stats['requests'] += 1
+        if path == '/__stats__':
+            with self.stats_lock:
+                body, content_type = json.dumps(self.stats).encode(), 'application/json'
+        elif path.startswith('/mdcdn/data/') or path.startswith('/wp-content/uploads/'):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            with self.stats_lock:
+                self.stats['images'] += 1
+                self.stats['image_bytes'] += len(self.image)
+            body, content_type = self.image, 'image/png'
+        else:
+            conn.send_headers(stream_id, [(':status', '404'), ('content-length', '0')], end_stream=True)
+            writer.write(conn.data_to_send())
+            return
+        conn.send_headers(stream_id, [(':status', '200'), ('content-type', content_type),
+                                      ('content-length', str(len(body)))])
+        view = memoryview(body)
+        while view:
+            window = min(conn.local_flow_control_window(stream_id), conn.max_outbound_frame_size, _CHUNK_SIZE)
+            if window <= 0:
+                waiter = windows[stream_id] = asyncio.Event()
+                await waiter.wait()
+                windows.pop(stream_id, None)
+                continue
+            conn.send_data(stream_id, bytes(view[:window]))
+            view = view[window:]
+            writer.write(conn.data_to_send())
+            await writer.drain()
+        conn.end_stream(stream_id)
+        writer.write(conn.data_to_send())
+        await writer.drain()
+
+    def serve(self, cert, key, port=0, ready=None):
+        """Run the server forever; ``ready(port)`` is called once it listens."""
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert, key)
+        context.set_alpn_protocols(['h2'])
+
+        async def main():
+            server = await asyncio.start_server(self.handle, '127.0.0.1', port, ssl=context)
+            if ready:
+                ready(server.sockets[0].getsockname()[1])
+            async with server:
+                await server.serve_forever()
+
+        asyncio.run(main())
+
+
+def serve_h2(port_queue, image, latency_ms, cert, key):
+    """Process entry point: start an HTTP/2 image server and report its port back."""
+    H2ImageServer(image, latency_ms).serve(cert, key, ready=port_queue.put)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    if __package__ in (None, ''):
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from benchmarks.server import make_png
+
+    parser = argparse.ArgumentParser(description="Serve benchmark page images over HTTP/2.")
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--image-kb', type=int, default=300)
+    parser.add_argument('--latency-ms', type=int, default=0)
+    args = parser.parse_args()
+
+    cert, key = make_certificate()
+    print(f"Serving images over HTTP/2 on https://127.0.0.1:{args.port} (certificate: {cert})")
+    H2ImageServer(make_png(args.image_kb * 1024), args.latency_ms).serve(cert, key, args.port)
@@ -0,0 +1,289 @@
+"""
+Run every scraper end-to-end against the local fixture server.
+
+Each scenario runs ``get_chapters`` and ``download_chapter`` in a fresh
+process so CPU time and peak RSS belong to that scraper alone.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --latency-ms 80 --bandwidth-kbps 2048
+    python -m benchmarks.run --save baseline.json
+    python -m benchmarks.run --baseline baseline.json --tolerance 0.15
+    python -m benchmarks.run --h2 --latency-ms 80
+    python -m benchmarks.run --pipeline --keep-delays
+
+With ``--h2`` the page images come from a local HTTP/2 server
+(``benchmarks/h2_server.py``) and the scrapers use the HTTP/2 transport.
+With ``--pipeline`` chapters go through the staged download pipeline
+(``utils/pipeline.py``) instead of one ``download_chapter`` after another.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.server import MANGADEX_MANGA_ID, SERIES_SLUG, make_png, serve
+from utils.manifest import MANIFEST_NAME
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# name -> (module, class, series URL builder)
+SCENARIOS = {
+    'mangadex': ('scrapers.mangadex', 'MangaDexScraper',
+                 lambda base: f"{base}/title/{MANGADEX_MANGA_ID}/{SERIES_SLUG}"),
+    'wordpress': ('scrapers.wordpress_manga', 'WordPressMangaScraper',
+                  lambda base: f"{base}/manga/{SERIES_SLUG}/"),
+    'asura': ('scrapers.asura_scans', 'AsuraScansScraper',
+              lambda base: f"{base}/series/{SERIES_SLUG}/"),
+}
+
+# Metric -> True if bigger is better
+GATED_METRICS = {
+    'pages_per_sec': True,
+    'mb_per_sec': True,
+    'cpu_seconds': False,
+    'peak_rss_mb': False,
+}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def server_stats(base, h2_base=None, cert=None):
+    with urllib.request.urlopen(f"{base}/__stats__") as resp:
+        stats = json.loads(resp.read())
+    if h2_base:
+        import httpx
+
+        with httpx.Client(http2=True, verify=cert) as client:
+            h2_stats = client.get(f"{h2_base}/__stats__").json()
+        stats['requests'] += h2_stats['requests'] - 1
+        stats['images'] += h2_stats['images']
+        stats['image_bytes'] += h2_stats['image_bytes']
+    return stats
+
+
+def folder_totals(folder):
+    pages = size = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name == MANIFEST_NAME:
+                continue
+            pages += 1
+            size += os.path.getsize(os.path.join(root, name))
+    return pages, size
+
+
+def make_scraper(name, base, keep_delays=False):
+    module_name, class_name, _ = SCENARIOS[name]
+    scraper = getattr(importlib.import_module(module_name), class_name)()
+    if not keep_delays:
+        scraper.request_delay_override = (0, 0)
+    if name == 'mangadex':
+        scraper.API_URL = f"{base}/mangadex"
+        scraper.CDN_URL = f"{base}/mdcdn"
+    return scraper
+
+
+def run_scenario(name, base, max_chapters, keep_delays, verbose, cpu_workers, transcode, result_queue,
+                 h2_base=None, cert=None, pipeline=False):
+    """Child process entry point: benchmark one scraper and report metrics."""
+    from scrapers.http2 import configure_http2
+    from scrapers.strategy_cache import configure_strategy_cache
+    from utils.process_pool import configure_cpu_pool, shutdown_cpu_pool
+    from utils.pipeline import ChapterPipeline
+    from utils.transcode import configure_transcoding, parse_setting
+
+    # Learn strategies from scratch each run without touching the user's cache
+    configure_strategy_cache(persist=False)
+    configure_cpu_pool(cpu_workers)
+    if h2_base:
+        configure_http2(True, verify=cert)
+    if transcode:
+        configure_transcoding(*parse_setting(transcode))
+    scraper = make_scraper(name, base, keep_delays)
+    series_url = SCENARIOS[name][2](base)
+    dest = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    chapters = []
+    failed = 0
+    error = None
+    before = server_stats(base, h2_base, cert)
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        with output:
+            try:
+                chapters = scraper.get_chapters(series_url, 'en')[:max_chapters]
+                if pipeline:
+                    results = []
+                    ChapterPipeline(scraper).run(
+                        chapters, lambda ch: ch['id'],
+                        lambda ch, urls: scraper.download_pages(
+                            ch['id'], urls, os.path.join(dest, f"Chapter_{ch['chapter']}")),
+                        lambda ch, ok, error: results.append(ok))
+                    failed = len(chapters) - sum(results)
+                else:
+                    for ch in chapters:
+                        folder = os.path.join(dest, f"Chapter_{ch['chapter']}")
+                        if not scraper.download_chapter(ch['id'], folder):
+                            failed += 1
+            except Exception as e:
+                # Still report a result: the parent waits for one
+                error = e
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        pages, size = folder_totals(dest)
+    finally:
+        shutdown_cpu_pool()
+        shutil.rmtree(dest, ignore_errors=True)
+    if error is not None:
+        print(f"{name}: scenario failed: {error}")
+        failed = max(len(chapters), 1)
+    after = server_stats(base, h2_base, cert)
+    downloaded_mb = (after['image_bytes'] - before['image_bytes']) / (1024 * 1024)
+    result_queue.put({
+        'scenario': name,
+        'chapters': len(chapters),
+        'failed': failed,
+        'pages': pages,
+        'mb': downloaded_mb,
+        'stored_mb': size / (1024 * 1024),
+        'requests': after['requests'] - before['requests'] - 1,
+        'wall_seconds': wall,
+        'cpu_seconds': cpu,
+        'pages_per_sec': pages / wall if wall else 0.0,
+        'mb_per_sec': downloaded_mb / wall if wall else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+    })
+
+
+def compare(results, baseline, tolerance):
+    """Return human readable regressions of ``results`` against ``baseline``."""
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['scenario'])
+        if not previous:
+            continue
+        for metric, higher_is_better in GATED_METRICS.items():
+            new, old = result.get(metric), previous.get(metric)
+            if new is None or not old:
+                continue
+            if higher_is_better and new < old * (1 - tolerance):
+                regressions.append(f"{result['scenario']}: {metric} dropped {old:.2f} -> {new:.2f}")
+            elif not higher_is_better and new > old * (1 + tolerance):
+                regressions.append(f"{result['scenario']}: {metric} grew {old:.2f} -> {new:.2f}")
+        if result['failed'] > previous.get('failed', 0):
+            regressions.append(f"{result['scenario']}: {result['failed']} chapters failed")
+    return regressions
+
+
+def print_table(results):
+    header = f"{'scenario':<10} {'chap':>5} {'fail':>5} {'pages':>6} {'reqs':>6} {'MB':>8} {'stored':>8} " \
+             f"{'wall s':>8} {'cpu s':>7} {'pages/s':>8} {'MB/s':>7} {'peak MB':>8}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.1f}" if r['peak_rss_mb'] is not None else 'n/a'
+        print(f"{r['scenario']:<10} {r['chapters']:>5} {r['failed']:>5} {r['pages']:>6} {r['requests']:>6} "
+              f"{r['mb']:>8.1f} {r['stored_mb']:>8.1f} {r['wall_seconds']:>8.2f} {r['cpu_seconds']:>7.2f} "
+              f"{r['pages_per_sec']:>8.1f} {r['mb_per_sec']:>7.2f} {rss:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline scraper benchmarks.")
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f"Scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--chapters', type=int, default=10, help="Chapters to download per scenario")
+    parser.add_argument('--pages', type=int, default=10, help="Pages per chapter")
+    parser.add_argument('--image-kb', type=int, default=300, help="Size of each synthetic page")
+    parser.add_argument('--latency-ms', type=int, default=0, help="Added latency per response")
+    parser.add_argument('--bandwidth-kbps', type=int, default=0, help="Per-response bandwidth cap (0 = unlimited)")
+    parser.add_argument('--challenge-every', type=int, default=0,
+                        help="Serve a challenge page instead of every Nth image (0 = never)")
+    parser.add_argument('--keep-delays', action='store_true', help="Keep the scrapers' random politeness delays")
+    parser.add_argument('--cpu-workers', type=int, default=0, help="Process pool size for parsing (0 = inline)")
+    parser.add_argument('--transcode', metavar='FORMAT[:QUALITY]', help="Transcode pages, e.g. webp:80")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Resolve chapter pages ahead of the image downloads")
+    parser.add_argument('--h2', action='store_true', help="Serve page images over HTTP/2 and use the HTTP/2 transport")
+    parser.add_argument('--verbose', action='store_true', help="Show scraper output")
+    parser.add_argument('--save', metavar='FILE', help="Write results as JSON")
+    parser.add_argument('--baseline', metavar='FILE', help="Fail if results regress against this JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Allowed regression ratio (default 0.15)")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    ctx = multiprocessing.get_context('spawn')
+    h2_server = h2_base = cert = None
+    if args.h2:
+        from benchmarks.h2_server import make_certificate, serve_h2
+
+        cert, key = make_certificate()
+        port_queue = ctx.Queue()
+        h2_server = ctx.Process(target=serve_h2, daemon=True, args=(
+            port_queue, make_png(args.image_kb * 1024), args.latency_ms, cert, key))
+        h2_server.start()
+        h2_base = f"https://127.0.0.1:{port_queue.get(timeout=30)}"
+    port_queue = ctx.Queue()
+    server = ctx.Process(target=serve, daemon=True, args=(
+        port_queue, args.chapters, args.pages, args.image_kb, args.latency_ms, args.bandwidth_kbps,
+        args.challenge_every, h2_base))
+    server.start()
+    base = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+
+    results = []
+    try:
+        for name in args.scenarios or list(SCENARIOS):
+            result_queue = ctx.Queue()
+            child = ctx.Process(target=run_scenario, args=(
+                name, base, args.chapters, args.keep_delays, args.verbose, args.cpu_workers, args.transcode, result_queue,
+                h2_base, cert, args.pipeline))
+            child.start()
+            results.append(result_queue.get())
+            child.join()
+    finally:
+        server.terminate()
+        if h2_server:
+            h2_server.terminate()
+
+    print_table(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({r['scenario']: r for r in results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
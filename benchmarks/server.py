@@ -0,0 +1,364 @@
+"""
+Local HTTP stand-in for the sites the scrapers talk to.
+
+Serves recorded MangaDex API responses, Madara/WordPress series and chapter
+pages, the Madara chapter list endpoints, the WordPress REST API and
+synthetic PNG pages. Latency and bandwidth
+can be shaped per response so runs can mimic slow links.
+"""
+
+import json
+import os
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+MANGADEX_MANGA_ID = "0f1e2d3c-4b5a-4968-8776-655443322110"
+SERIES_SLUG = "benchmark-series"
+SERIES_TITLE = "Benchmark Series"
+
+_CHUNK_SIZE = 16 * 1024
+
+CHALLENGE_HTML = (b'<!DOCTYPE html><html lang="en-US"><head><title>Just a moment...</title></head>'
+                  b'<body><div id="challenge-running">Checking if the site connection is secure</div></body></html>')
+
+
+def load_fixture(name):
+    """Read a fixture file as text."""
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def make_png(size_bytes, width=800, seed=0):
+    """Build a valid RGB PNG of roughly ``size_bytes``.
+
+    The pixel data is stored uncompressed so the size is predictable; bands of
+    noise alternate with white gutters like a scanned page, so re-encoding it
+    in a modern format does shrink it.
+    """
+    row_bytes = 1 + width * 3
+    height = max(1, size_bytes // row_bytes)
+    rng = random.Random(seed)
+    white = b'\xff' * (width * 3)
+    raw = bytearray()
+    for y in range(height):
+        raw.append(0)  # filter type: none
+        if (y // 32) % 2:
+            raw += white
+        else:
+            raw += rng.getrandbits(width * 3 * 8).to_bytes(width * 3, 'little')
+
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) +
+            chunk(b'IDAT', zlib.compress(bytes(raw), 0)) + chunk(b'IEND', b''))
+
+
+class FixtureSite:
+    """Renders the recorded fixtures for a synthetic series."""
+
+    def __init__(self, chapters=20, pages=10, image_kb=300, image_base=None):
+        self.chapters = chapters
+        self.pages = pages
+        self.image = make_png(image_kb * 1024)
+        # Where page images are served from, e.g. the HTTP/2 server; defaults to this server
+        self.image_base = image_base
+        self.md_chapters = json.loads(load_fixture('mangadex_chapter_list.json'))
+        self.md_at_home = json.loads(load_fixture('mangadex_at_home.json'))
+        self.wp_posts = json.loads(load_fixture('wp_posts.json'))
+        self.series_tpl = Template(load_fixture('madara_series.html'))
+        self.chapter_tpl = Template(load_fixture('madara_chapter.html'))
+
+    # MangaDex API
+
+    def mangadex_chapter_list(self, query):
+        # Every chapter has two translations, like the recorded response
+        records = []
+        for n in range(1, self.chapters + 1):
+            for variant in self.md_chapters['data']:
+                record = json.loads(json.dumps(variant))
+                record['id'] = f"{variant['id'][:-6]}{n:06d}"
+                record['attributes']['chapter'] = str(n)
+                record['attributes']['title'] = f"Chapter {n}"
+                record['attributes']['pages'] = self.pages
+                records.append(record)
+        # The filters and ordering the scraper pushes down for a chapter selection
+        if 'chapter[]' in query:
+            wanted = set(query['chapter[]'])
+            records = [r for r in records if r['attributes']['chapter'] in wanted]
+        if query.get('order[chapter]') == ['desc']:
+            records.sort(key=lambda r: -int(r['attributes']['chapter']))
+        offset = int(query.get('offset', ['0'])[0])
+        limit = int(query.get('limit', ['100'])[0])
+        body = dict(self.md_chapters)
+        body.update(data=records[offset:offset + limit], offset=offset, limit=limit, total=len(records))
+        return body
+
+    def mangadex_manga(self, manga_id):
+        """A title with its ``cover_art`` relationship expanded."""
+        return {'result': 'ok', 'response': 'entity', 'data': {
+            'id': manga_id, 'type': 'manga',
+            'attributes': {'title': {'en': SERIES_TITLE}},
+            'relationships': [{'id': 'a1b2c3d4-0000-4000-8000-000000000001', 'type': 'cover_art',
+                               'attributes': {'fileName': 'cover.png'}}],
+        }}
+
+    def mangadex_at_home(self, base):
+        body = json.loads(json.dumps(self.md_at_home))
+        body['baseUrl'] = f"{self.image_base or base}/mdcdn"
+        page_hash = body['chapter']['hash']
+        body['chapter']['data'] = [f"{i + 1}-{page_hash}.png" for i in range(self.pages)]
+        body['chapter']['dataSaver'] = [f"{i + 1}-{page_hash}.jpg" for i in range(self.pages)]
+        return body
+
+    # Madara / WordPress pages
+
+    def image_tags(self, base, number):
+        # Mix the lazy-loading markup real Madara themes emit
+        placeholder = 'data:image/gif;base64,R0lGODlhAQABAAAAACw='
+        tags = []
+        for i in range(self.pages):
+            url = f"{self.image_base or base}/wp-content/uploads/{SERIES_SLUG}/{number}/{i + 1:02d}.png"
+            if i % 3 == 1:
+                attrs = f'src="{placeholder}" data-lazy-src="{url}"'
+            elif i % 3 == 2:
+                attrs = f'src="{base}/wp-content/themes/madara/images/dflazy.jpg" data-src=" {url} "'
+            else:
+                attrs = f'src="{url}"'
+            tags.append(f'<div class="page-break no-gaps"><img id="image-{i}" {attrs} '
+                        f'class="wp-manga-chapter-img"></div>')
+        return '\n'.join(tags)
+
+    def chapter_items(self, chapter_url):
+        return '\n'.join(
+            f'<li class="wp-manga-chapter"><a href="{chapter_url(n)}">Chapter {n}</a>'
+            f'<span class="chapter-release-date"><i>January {n % 28 + 1}, 2023</i></span></li>'
+            for n in range(self.chapters, 0, -1)
+        )
+
+    def series_page(self, base, series_url, chapter_url):
+        return self.series_tpl.substitute(
+            base=base, slug=SERIES_SLUG, title=SERIES_TITLE, post_id=4242,
+            series_url=series_url, chapter_items=self.chapter_items(chapter_url),
+        )
+
+    def chapter_page(self, base, series_url, number):
+        return self.chapter_tpl.substitute(
+            base=base, title=SERIES_TITLE, number=number, post_id=4242,
+            chapter_id=10000 + int(number), series_url=series_url,
+            page_items=self.image_tags(base, number),
+        )
+
+    def wp_post_search(self, base, query):
+        """Chapter posts matching a REST ``search``, paginated and trimmed to ``_fields``."""
+        if query.get('search', [''])[0] != SERIES_SLUG.replace('-', ' '):
+            return [], 1
+        per_page = int(query.get('per_page', ['10'])[0])
+        page = int(query.get('page', ['1'])[0])
+        numbers = list(range(self.chapters, 0, -1))
+        total_pages = max(1, -(-len(numbers) // per_page))
+        posts = []
+        for n in numbers[(page - 1) * per_page:page * per_page]:
+            slug = f"{SERIES_SLUG}-chapter-{n}"
+            posts.append({'id': 10000 + n, 'slug': slug, 'link': f"{base}/{slug}/",
+                          'title': {'rendered': f"{SERIES_TITLE} &#8211; Chapter {n}"}})
+        return posts, total_pages
+
+    def wp_posts_for(self, base, slug):
+        match = re.fullmatch(rf'{SERIES_SLUG}-chapter-(\d+)', slug or '')
+        if not match:
+            return []
+        number = match.group(1)
+        post = json.loads(json.dumps(self.wp_posts[0]))
+        post.update(id=10000 + int(number), slug=slug, link=f"{base}/{slug}/")
+        post['title']['rendered'] = f"{SERIES_TITLE} Chapter {number}"
+        post['content']['rendered'] = self.image_tags(base, number)
+        return [post]
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.stats_lock:
+            server.stats['requests'] += 1
+        parsed = urlparse(self.path)
+        path, query = parsed.path, parse_qs(parsed.query)
+        base = f"http://{self.headers.get('Host')}"
+        site = server.site
+
+        if path == '/__stats__':
+            with server.stats_lock:
+                return self.send_body(json.dumps(server.stats).encode(), 'application/json', shaped=False)
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if path == '/mangadex/chapter':
+            return self.send_json(site.mangadex_chapter_list(query))
+        match = re.fullmatch(r'/mangadex/at-home/server/([\w-]+)', path)
+        if match:
+            return self.send_json(site.mangadex_at_home(base))
+        match = re.fullmatch(r'/mangadex/manga/([\w-]+)', path)
+        if match:
+            return self.send_json(site.mangadex_manga(match.group(1)))
+        if path.startswith(('/mdcdn/data/', '/mdcdn/covers/', '/wp-content/uploads/')):
+            return self.send_image()
+        if path == '/wp-json/wp/v2/posts':
+            if 'search' in query:
+                posts, total_pages = site.wp_post_search(base, query)
+                return self.send_json(self.only_fields(posts, query),
+                                      headers={'X-WP-TotalPages': str(total_pages)})
+            posts = site.wp_posts_for(base, query.get('slug', [''])[0])
+            return self.send_json(self.only_fields(posts, query))
+
+        # Madara layout used by the generic WordPress scraper
+        madara_series = f"{base}/manga/{SERIES_SLUG}/"
+        if path == f"/manga/{SERIES_SLUG}/":
+            html = site.series_page(base, madara_series, lambda n: f"{madara_series}chapter-{n}/")
+            return self.send_html(html)
+        match = re.fullmatch(rf'/manga/{SERIES_SLUG}/chapter-(\d+)/', path)
+        if match:
+            return self.send_html(site.chapter_page(base, madara_series, match.group(1)))
+
+        # Asura layout: chapters live at /<slug>-chapter-<n>/
+        asura_series = f"{base}/series/{SERIES_SLUG}/"
+        if path == f"/series/{SERIES_SLUG}/":
+            html = site.series_page(base, asura_series, lambda n: f"{base}/{SERIES_SLUG}-chapter-{n}/")
+            return self.send_html(html)
+        match = re.fullmatch(rf'/{SERIES_SLUG}-chapter-(\d+)/', path)
+        if match:
+            return self.send_html(site.chapter_page(base, asura_series, match.group(1)))
+
+        self.send_error(404)
+
+    def do_POST(self):
+        """Madara chapter list endpoints."""
+        server = self.server
+        with server.stats_lock:
+            server.stats['requests'] += 1
+        length = int(self.headers.get('Content-Length') or 0)
+        form = parse_qs(self.rfile.read(length).decode()) if length else {}
+        path = urlparse(self.path).path
+        base = f"http://{self.headers.get('Host')}"
+        site = server.site
+        if server.latency:
+            time.sleep(server.latency)
+
+        madara_series = f"{base}/manga/{SERIES_SLUG}/"
+        madara_chapters = site.chapter_items(lambda n: f"{madara_series}chapter-{n}/")
+        if path == f"/manga/{SERIES_SLUG}/ajax/chapters/":
+            return self.send_html(f'<ul class="main version-chap">{madara_chapters}</ul>')
+        if (path == '/wp-admin/admin-ajax.php' and form.get('action') == ['manga_get_chapters']
+                and form.get('manga') == ['4242']):
+            return self.send_html(f'<ul class="main version-chap">{madara_chapters}</ul>')
+        self.send_error(404)
+
+    def only_fields(self, posts, query):
+        """Apply the REST API's ``_fields`` filter."""
+        fields = query.get('_fields', [''])[0]
+        if not fields:
+            return posts
+        keep = fields.split(',')
+        return [{k: v for k, v in post.items() if k in keep} for post in posts]
+
+    def send_json(self, obj, headers=None):
+        self.send_body(json.dumps(obj).encode(), 'application/json', headers=headers)
+
+    def send_html(self, html):
+        self.send_body(html.encode('utf-8'), 'text/html; charset=UTF-8')
+
+    def send_image(self):
+        server = self.server
+        with server.stats_lock:
+            server.stats['images'] += 1
+            server.stats['image_bytes'] += len(server.site.image)
+            challenge = server.challenge_every and server.stats['images'] % server.challenge_every == 0
+        if challenge:
+            # Mimic a CDN handing out a challenge page with a 200 status
+            return self.send_body(CHALLENGE_HTML, 'text/html; charset=UTF-8')
+        self.send_body(server.site.image, 'image/png')
+
+    def send_body(self, body, content_type, shaped=True, headers=None):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        rate = self.server.bandwidth if shaped else None
+        view = memoryview(body)
+        for start in range(0, len(body), _CHUNK_SIZE):
+            piece = view[start:start + _CHUNK_SIZE]
+            self.wfile.write(piece)
+            if rate:
+                time.sleep(len(piece) / rate)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Threaded HTTP server bound to localhost that serves a ``FixtureSite``."""
+
+    daemon_threads = True
+
+    def __init__(self, site, port=0, latency_ms=0, bandwidth_kbps=0, challenge_every=0):
+        super().__init__(('127.0.0.1', port), FixtureRequestHandler)
+        self.site = site
+        self.challenge_every = challenge_every
+        self.latency = latency_ms / 1000.0
+        self.bandwidth = bandwidth_kbps * 1024 if bandwidth_kbps else None
+        self.stats = {'requests': 0, 'images': 0, 'image_bytes': 0}
+        self.stats_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start_in_thread(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def serve(port_queue, chapters, pages, image_kb, latency_ms, bandwidth_kbps, challenge_every=0, image_base=None):
+    """Process entry point: start a server and report its port back."""
+    server = FixtureServer(FixtureSite(chapters, pages, image_kb, image_base), 0, latency_ms, bandwidth_kbps,
+                           challenge_every)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve benchmark fixtures on localhost.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--chapters', type=int, default=20)
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--image-kb', type=int, default=300)
+    parser.add_argument('--latency-ms', type=int, default=0)
+    parser.add_argument('--bandwidth-kbps', type=int, default=0)
+    parser.add_argument('--challenge-every', type=int, default=0)
+    args = parser.parse_args()
+
+    httpd = FixtureServer(FixtureSite(args.chapters, args.pages, args.image_kb),
+                          args.port, args.latency_ms, args.bandwidth_kbps, args.challenge_every)
+    print(f"Serving fixtures on {httpd.base_url}")
+    print(f"  MangaDex:  {httpd.base_url}/mangadex (title {MANGADEX_MANGA_ID})")
+    print(f"  Madara:    {httpd.base_url}/manga/{SERIES_SLUG}/")
+    print(f"  Asura:     {httpd.base_url}/series/{SERIES_SLUG}/")
+    httpd.serve_forever()
@@ -0,0 +1,165 @@
+"""
+Soak test: RSS must stay flat across thousands of chapters.
+
+Downloads a long series from the local fixture server the way the GUI does
+(job journal, staged pipeline, chapter manifests, disk writer, catalog),
+deleting each chapter folder once it is recorded, and samples the resident
+set size every ``--sample-every`` chapters. After a warm-up, RSS may grow by
+at most ``--max-growth-mb``; otherwise the run fails with exit status 1 and
+a memory report (see ``utils/memory.py``).
+
+    python -m benchmarks.soak
+    python -m benchmarks.soak mangadex --chapters 5000 --max-growth-mb 10
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import SCENARIOS, make_scraper
+from benchmarks.server import serve
+
+
+def soak(name, base, sample_every, verbose):
+    """Download every chapter of the fixture series; returns ``(chapters, failed, samples)``."""
+    from scrapers.selection import list_chapters
+    from scrapers.strategy_cache import configure_strategy_cache
+    from utils.batch_queue import record_chapter
+    from utils.catalog import configure_catalog
+    from utils.journal import JobJournal, journaled_download
+    from utils.memory import current_rss_mb
+    from utils.pipeline import ChapterPipeline
+
+    work = tempfile.mkdtemp(prefix=f"soak-{name}-")
+    configure_strategy_cache(persist=False)
+    configure_catalog(os.path.join(work, 'catalog.sqlite3'))
+    journal = JobJournal(os.path.join(work, 'jobs.json'))
+    scraper = make_scraper(name, base)
+    series_url = SCENARIOS[name][2](base)
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    samples = []
+    done = [0, 0]  # chapters, failed
+    try:
+        with output:
+            chapters = list_chapters(scraper, series_url, 'en')
+            journal.record('series', series_url, title=name)
+            journal.record('chapters', series_url, chapters=[
+                {'id': ch['id'], 'chapter': str(ch['chapter'])} for ch in chapters])
+            del chapters
+            entries = journal.series[series_url]['chapters']
+            samples.append((0, current_rss_mb()))
+
+            def download(index, image_urls):
+                ch = entries[index]
+                folder = os.path.join(work, f"Chapter_{ch['chapter']}")
+                ok = journaled_download(journal, series_url, index, folder,
+                                        lambda: scraper.download_pages(ch['id'], image_urls, folder))
+                record_chapter(series_url, ch, folder, ok, name)
+                shutil.rmtree(folder, ignore_errors=True)
+                return ok
+
+            def finished(index, ok, error):
+                done[0] += 1
+                done[1] += not ok
+                if done[0] % sample_every == 0:
+                    samples.append((done[0], current_rss_mb()))
+
+            ChapterPipeline(scraper).run(range(len(entries)), lambda i: entries[i]['id'], download, finished)
+    finally:
+        journal.close()
+        configure_catalog()
+        shutil.rmtree(work, ignore_errors=True)
+    return done[0], done[1], samples
+
+
+def growth(samples, warmup):
+    """RSS growth in MB after the first ``warmup`` fraction of samples, and its trend per 1000 chapters."""
+    start = max(1, int(len(samples) * warmup))
+    settled = samples[start:]
+    if len(settled) < 2:
+        return 0.0, 0.0
+    base = settled[0][1]
+    grown = max(rss for _, rss in settled) - base
+    # Least-squares slope of RSS over chapters
+    n = len(settled)
+    mean_x = sum(x for x, _ in settled) / n
+    mean_y = sum(y for _, y in settled) / n
+    var = sum((x - mean_x) ** 2 for x, _ in settled)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in settled) / var if var else 0.0
+    return grown, slope * 1000
+
+
+def run_soak(name, base, sample_every, verbose, warmup, max_growth_mb, result_queue):
+    """Child process entry point, so each scenario starts from a clean heap."""
+    from utils.memory import memory_report
+
+    started = time.perf_counter()
+    chapters, failed, samples = soak(name, base, sample_every, verbose)
+    # What is still alive explains a failed run
+    report = memory_report() if growth(samples, warmup)[0] > max_growth_mb else None
+    result_queue.put({'scenario': name, 'chapters': chapters, 'failed': failed, 'samples': samples,
+                      'wall_seconds': time.perf_counter() - started, 'report': report})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that memory stays flat over a long download session.")
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f"Scenarios to run (default: wordpress mangadex; choices: {', '.join(SCENARIOS)})")
+    parser.add_argument('--chapters', type=int, default=2000, help="Chapters in the series")
+    parser.add_argument('--pages', type=int, default=2, help="Pages per chapter")
+    parser.add_argument('--image-kb', type=int, default=8, help="Size of each synthetic page")
+    parser.add_argument('--sample-every', type=int, default=100, help="Chapters between RSS samples")
+    parser.add_argument('--warmup', type=float, default=0.2, help="Fraction of the run before growth counts")
+    parser.add_argument('--max-growth-mb', type=float, default=15.0, help="Allowed RSS growth after warm-up")
+    parser.add_argument('--verbose', action='store_true', help="Show scraper output")
+    args = parser.parse_args(argv)
+
+    names = args.scenarios or ['wordpress', 'mangadex']
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    ctx = multiprocessing.get_context('spawn')
+    port_queue = ctx.Queue()
+    server = ctx.Process(target=serve, daemon=True,
+                         args=(port_queue, args.chapters, args.pages, args.image_kb, 0, 0))
+    server.start()
+    base = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+    failures = []
+    try:
+        for name in names:
+            result_queue = ctx.Queue()
+            child = ctx.Process(target=run_soak, args=(name, base, args.sample_every, args.verbose, args.warmup,
+                                                       args.max_growth_mb, result_queue))
+            child.start()
+            result = result_queue.get()
+            child.join()
+            samples = result['samples']
+            grown, trend = growth(samples, args.warmup)
+            first, last = samples[0][1], samples[-1][1]
+            print(f"{name:<10} {result['chapters']:>6} chapters {result['failed']:>4} failed "
+                  f"{result['wall_seconds']:>7.1f} s  RSS {first:.1f} -> {last:.1f} MB, "
+                  f"+{grown:.1f} MB after warm-up ({trend:+.2f} MB per 1000 chapters)")
+            if result['failed']:
+                failures.append(f"{name}: {result['failed']} chapters failed")
+            if grown > args.max_growth_mb:
+                failures.append(f"{name}: RSS grew {grown:.1f} MB after warm-up (limit {args.max_growth_mb} MB)")
+                print(result['report'])
+    finally:
+        server.terminate()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
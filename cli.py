@@ -0,0 +1,231 @@
+"""
+Command line interface for unattended downloads.
+
+    python cli.py add URL [URL ...] [--file watchlist.txt] [--lang en] [--chapters 150-200]
+    python cli.py run [--workers 8] [--per-host 2] [--host-limit mangadex.org=4]
+    python cli.py status
+    python cli.py clear
+    python cli.py catalog [--missing] [--stale DAYS]
+    python cli.py bandwidth [--global KBPS] [--per-host KBPS] [--host HOST=KBPS] [--window 09:00-18:00=512]
+    python cli.py thumbnails [--prefetch] [--clear]
+"""
+
+import argparse
+import sys
+
+from scrapers.chapter_index import configure_preferences
+from scrapers.selection import parse_selection
+from utils import bandwidth
+from utils.batch_queue import BatchQueue, read_url_file
+from utils.catalog import get_catalog
+from utils.image_verify import configure_verification
+from utils.memory import install_report_signal, start_tracing
+from utils.process_pool import configure_cpu_pool, shutdown_cpu_pool
+from utils.strips import configure_strips
+from utils.thumbnails import get_thumbnail_cache
+from utils.transcode import configure_transcoding, parse_setting
+
+
+def positive_int(value):
+    if not value.isdigit() or int(value) < 1:
+        raise argparse.ArgumentTypeError(f"invalid value '{value}', expected a number of at least 1")
+    return int(value)
+
+
+def host_limit(value):
+    host, _, limit = value.partition('=')
+    # A cap of 0 would leave the host's jobs queued forever
+    if not host or not limit.isdigit() or int(limit) < 1:
+        raise argparse.ArgumentTypeError(f"invalid host limit '{value}', expected HOST=N with N >= 1")
+    return host, int(limit)
+
+
+def host_rate(value):
+    host, _, kbps = value.partition('=')
+    if not host or not kbps.isdigit():
+        raise argparse.ArgumentTypeError(f"invalid host cap '{value}', expected HOST=KBPS")
+    return host, int(kbps)
+
+
+def bandwidth_window(value):
+    try:
+        return bandwidth.parse_window(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def chapter_selection(value):
+    try:
+        parse_selection(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def cmd_add(args, queue):
+    urls = list(args.urls)
+    if args.file:
+        urls += read_url_file(args.file)
+    added = queue.add_series(urls, args.lang, args.chapters)
+    print(f"Added {added} series ({len(queue.series)} queued).")
+
+
+def cmd_run(args, queue):
+    queue.max_workers = args.workers
+    queue.per_host = args.per_host
+    queue.host_limits.update(args.host_limit or [])
+    try:
+        queue.run()
+    except KeyboardInterrupt:
+        print("Stopping after the current chapters...")
+        queue.stop()
+        queue.save(force=True)
+    cmd_status(args, queue)
+
+
+def cmd_status(args, queue):
+    for url, (status, done, total) in queue.status().items():
+        print(f"{status:<8} {done:>5}/{total:<5} {url}")
+
+
+def cmd_clear(args, queue):
+    queue.remove_finished()
+    print(f"{len(queue.series)} series left in the queue.")
+
+
+def cmd_catalog(args, queue):
+    catalog = get_catalog()
+    if catalog is None:
+        print("The catalog is disabled.")
+        return
+    if args.missing:
+        for ch in catalog.missing_chapters():
+            print(f"{ch['status']:<8} {ch['title']} chapter {ch['chapter']}")
+    elif args.stale is not None:
+        for series in catalog.stale_series(args.stale * 24 * 3600):
+            print(f"{series['site']:<16} {series['title']}")
+    else:
+        for site in catalog.site_totals():
+            print(f"{site['site']:<16} {site['series']:>5} series {site['chapters']:>7} chapters "
+                  f"{site['pages']:>9} pages {site['bytes'] / (1024 * 1024):>10.1f} MB")
+
+
+def cmd_bandwidth(args, queue):
+    settings = bandwidth.BandwidthSettings() if args.clear else bandwidth.load_settings()
+    changed = args.clear
+    if args.global_kbps is not None:
+        settings.global_kbps, changed = args.global_kbps, True
+    if args.per_host is not None:
+        settings.per_host_kbps, changed = args.per_host, True
+    for host, kbps in args.host or []:
+        if kbps:
+            settings.hosts[host] = kbps
+        else:
+            settings.hosts.pop(host, None)
+        changed = True
+    if args.window is not None:
+        settings.windows, changed = args.window, True
+    if changed:
+        # Running downloads pick the new caps up within a few seconds
+        bandwidth.save_settings(settings)
+    print(f"Global: {settings.global_kbps or 'unlimited'} KB/s, per host: {settings.per_host_kbps or 'unlimited'} KB/s")
+    for host, kbps in settings.hosts.items():
+        print(f"  {host}: {kbps} KB/s")
+    for window in settings.windows:
+        print(f"  window {bandwidth.format_window(window)}")
+
+
+def cmd_thumbnails(args, queue):
+    cache = get_thumbnail_cache()
+    if args.clear:
+        cache.clear()
+    if args.prefetch:
+        catalog = get_catalog()
+        urls = [series['url'] for series in catalog.series()] if catalog else []
+        futures = cache.prefetch_covers(urls)
+        covers = sum(1 for future in futures if future.result())
+        print(f"Covers cached for {covers} of {len(urls)} series.")
+    count, size = cache.usage()
+    print(f"{count} thumbnails, {size / (1024 * 1024):.1f} of {cache.max_bytes / (1024 * 1024):.0f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Webcomic Downloader command line interface.")
+    parser.add_argument('--state', help="Queue state file (default: in the data directory)")
+    parser.add_argument('--cpu-workers', type=int, help="Processes for parsing and image work (0 = inline)")
+    parser.add_argument('--prefer-group', action='append', metavar='GROUP',
+                        help="Preferred scanlation group for duplicate chapters (repeatable, in order)")
+    parser.add_argument('--block-group', action='append', metavar='GROUP', help="Never download from this group")
+    parser.add_argument('--languages', help="Language priority for duplicate chapters, e.g. en,es")
+    parser.add_argument('--oldest', action='store_true', help="Prefer the oldest upload of a duplicate chapter")
+    parser.add_argument('--strip-height', type=int, metavar='PX', help="Re-cut webtoon strips into pages of about PX pixels")
+    parser.add_argument('--transcode', metavar='FORMAT[:QUALITY]', help="Transcode pages, e.g. webp:80 or avif:60")
+    parser.add_argument('--verify-decode', action='store_true',
+                        help="Also decode each downloaded image header with Pillow")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Trace allocations for the memory report printed on SIGUSR1")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    add = sub.add_parser('add', help="Add series URLs to the queue")
+    add.add_argument('urls', nargs='*')
+    add.add_argument('--file', help="Text file with one series URL per line")
+    add.add_argument('--lang', help="Chapter language (default: en, or the queued series' language)")
+    add.add_argument('--chapters', type=chapter_selection, metavar='SELECTION',
+                     help="Only these chapters, e.g. 150-200, 1,3,7.5 or 'latest 10'")
+    add.set_defaults(func=cmd_add)
+
+    run = sub.add_parser('run', help="Download everything pending in the queue")
+    run.add_argument('--workers', type=positive_int, default=8, help="Global number of concurrent jobs")
+    run.add_argument('--per-host', type=positive_int, default=2, help="Concurrent jobs per host")
+    run.add_argument('--host-limit', action='append', type=host_limit, metavar='HOST=N', help="Override the cap for one host")
+    run.set_defaults(func=cmd_run)
+
+    status = sub.add_parser('status', help="Show queue progress")
+    status.set_defaults(func=cmd_status)
+
+    clear = sub.add_parser('clear', help="Remove finished series from the queue")
+    clear.set_defaults(func=cmd_clear)
+
+    catalog = sub.add_parser('catalog', help="Show downloaded totals per site from the catalog")
+    catalog.add_argument('--missing', action='store_true', help="List chapters that are not downloaded")
+    catalog.add_argument('--stale', type=float, metavar='DAYS', help="List series not checked for DAYS days")
+    catalog.set_defaults(func=cmd_catalog)
+
+    shaping = sub.add_parser('bandwidth', help="Show or change download bandwidth caps (KB/s, 0 = unlimited)")
+    shaping.add_argument('--global', dest='global_kbps', type=int, metavar='KBPS', help="Cap for all downloads")
+    shaping.add_argument('--per-host', type=int, metavar='KBPS', help="Cap for each host")
+    shaping.add_argument('--host', action='append', type=host_rate, metavar='HOST=KBPS',
+                         help="Cap for one host (0 removes it)")
+    shaping.add_argument('--window', action='append', type=bandwidth_window, metavar='HH:MM-HH:MM=KBPS[/HOST_KBPS]',
+                         help="Caps during a time of day (repeatable; replaces the saved windows)")
+    shaping.add_argument('--clear', action='store_true', help="Remove every cap and window first")
+    shaping.set_defaults(func=cmd_bandwidth)
+
+    thumbnails = sub.add_parser('thumbnails', help="Show or fill the cover and chapter thumbnail cache")
+    thumbnails.add_argument('--prefetch', action='store_true', help="Fetch the covers of every series in the catalog")
+    thumbnails.add_argument('--clear', action='store_true', help="Remove every cached thumbnail first")
+    thumbnails.set_defaults(func=cmd_thumbnails)
+
+    args = parser.parse_args(argv)
+    if args.trace_memory:
+        start_tracing()
+    install_report_signal()
+    if args.cpu_workers is not None:
+        configure_cpu_pool(args.cpu_workers)
+    if args.transcode:
+        configure_transcoding(*parse_setting(args.transcode))
+    if args.strip_height:
+        configure_strips(args.strip_height)
+    if args.verify_decode:
+        configure_verification(decode=True)
+    configure_preferences(args.prefer_group, args.block_group,
+                          args.languages.split(',') if args.languages else None, not args.oldest)
+    try:
+        args.func(args, BatchQueue(state_path=args.state))
+    finally:
+        shutdown_cpu_pool()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
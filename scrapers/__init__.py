@@ -1,21 +1,119 @@
+"""
+Scraper registry.
+
+Scrapers are listed in a lightweight manifest (name, module, class) and a
+module is only imported when a URL is routed to it, so starting the CLI or
+GUI does not pay for every scraper's dependencies. URLs whose domain has a
+site definition (``scrapers/sites/``) go straight to that site's
+``scraper_class``; other URLs are offered to each scraper's ``can_handle``
+in manifest order.
+
+Third-party scrapers register through the ``webcomic_downloader.scrapers``
+entry point group, e.g. in their ``pyproject.toml``::
+
+    [project.entry-points."webcomic_downloader.scrapers"]
+    my_site = "my_package.my_site:MySiteScraper"
+
+They are tried before the generic WordPress scraper, and a site definition
+with ``"scraper_class": "MySiteScraper"`` routes its domains to them.
+"""
+
 import importlib
-import pkgutil
-from .base import BaseScraper
+from collections import namedtuple
+
+from .site_config import get_site_config_for_url
+
+ENTRY_POINT_GROUP = 'webcomic_downloader.scrapers'
+
+ScraperEntry = namedtuple('ScraperEntry', 'name module class_name')
+
+# Built-in scrapers in the order URLs are offered to them; the generic
+# WordPress scraper fetches the page in can_handle, so it goes last
+BUILTIN_SCRAPERS = (
+    ScraperEntry('asura_scans', 'scrapers.asura_scans', 'AsuraScansScraper'),
+    ScraperEntry('mangadex', 'scrapers.mangadex', 'MangaDexScraper'),
+    ScraperEntry('wordpress', 'scrapers.wordpress_manga', 'WordPressMangaScraper'),
+)
+
+_entries = None
+_classes = {}
 
-scraper_classes = []
 
-for loader, module_name, is_pkg in pkgutil.iter_modules(__path__):
-    if module_name == 'base':
-        continue
-    module = importlib.import_module(f'.{module_name}', __name__)
-    for attr in dir(module):
-        obj = getattr(module, attr)
-        if isinstance(obj, type) and issubclass(obj, BaseScraper) and obj is not BaseScraper:
-            scraper_classes.append(obj)
+def _plugin_entries():
+    """Scrapers registered by installed packages."""
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python < 3.8
+        return []
+    try:
+        found = entry_points()
+        found = found.select(group=ENTRY_POINT_GROUP) if hasattr(found, 'select') else found.get(ENTRY_POINT_GROUP, [])
+    except Exception as e:
+        print(f"Could not list scraper plugins: {e}")
+        return []
+    entries = []
+    for ep in found:
+        module, _, class_name = ep.value.partition(':')
+        entries.append(ScraperEntry(ep.name, module.strip(), class_name.strip()))
+    return entries
+
+
+def scraper_entries():
+    """The manifest: built-in scrapers with plugins before the generic fallback."""
+    global _entries
+    if _entries is None:
+        _entries = list(BUILTIN_SCRAPERS[:-1]) + _plugin_entries() + list(BUILTIN_SCRAPERS[-1:])
+    return _entries
+
+
+def load_scraper_class(entry):
+    """Import the module of a manifest entry and return its scraper class."""
+    cls = _classes.get(entry)
+    if cls is None:
+        cls = getattr(importlib.import_module(entry.module), entry.class_name)
+        _classes[entry] = cls
+    return cls
+
+
+def _entry_for_class(class_name):
+    for entry in scraper_entries():
+        if entry.class_name == class_name:
+            return entry
+    return None
+
 
 def get_scraper_for_url(url: str):
-    for scraper_cls in scraper_classes:
+    _, config = get_site_config_for_url(url)
+    if config:
+        entry = _entry_for_class(config['scraper_class'])
+        if entry is not None:
+            try:
+                return load_scraper_class(entry)()
+            except Exception as e:
+                print(f"Could not load scraper '{entry.name}': {e}")
+    for entry in scraper_entries():
+        try:
+            scraper_cls = load_scraper_class(entry)
+        except Exception as e:
+            print(f"Could not load scraper '{entry.name}': {e}")
+            continue
         scraper = scraper_cls()
         if scraper.can_handle(url):
             return scraper
-    return None 
\ No newline at end of file
+    return None
+
+
+def __getattr__(name):
+    # Importing every scraper is only paid for by code that asks for all of them
+    if name == 'scraper_classes':
+        classes = []
+        for entry in scraper_entries():
+            try:
+                classes.append(load_scraper_class(entry))
+            except Exception as e:
+                print(f"Could not load scraper '{entry.name}': {e}")
+        return classes
+    if name == 'BaseScraper':
+        from .base import BaseScraper
+        return BaseScraper
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,33 +1,29 @@
-import os
 import re
-import requests
-import json
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
+from utils import cpu_tasks
 from .base import BaseScraper
+from .challenge import BlockedError
+from .chapter_index import ChapterRecord, dedupe_chapters
+from . import js_extract
+from .chapter_numbers import sort_chapters
+from .selection import apply_selection
+from .site_config import get_site_config_for_url
+from .wp_api import WordPressAPI
 
 class AsuraScansScraper(BaseScraper):
     """Scraper specifically for Asura Scans website."""
     
-    # List of known Asura Scans domains (current and historical)
-    KNOWN_DOMAINS = [
-        "asurascanlation.com",
-        "asurascans.com", 
-        "asura.gg",  # Common new domain pattern
-        "asura.xyz",  # Another common pattern
-        "asurascans.net",
-        "asurascans.org"
-    ]
+    SITE_ID = 'asura_scans'
     
     def can_handle(self, url: str) -> bool:
         """Check if this is an Asura Scans URL."""
         parsed_url = urlparse(url)
         domain = parsed_url.netloc.lower()
         
-        # Check against known domains
-        for known_domain in self.KNOWN_DOMAINS:
-            if known_domain in domain:
-                return True
+        # Known domains (current and historical) from scrapers/sites/asura_scans.json
+        site_id, _ = get_site_config_for_url(url)
+        if site_id == self.SITE_ID:
+            return True
         
         # Also check if the URL contains "asura" and typical manga path patterns
         if "asura" in domain and any(path in url.lower() for path in ["/manga/", "/manhwa/", "/manhua/"]):
@@ -35,66 +31,45 @@ class AsuraScansScraper(BaseScraper):
             
         return False
     
-    def get_chapters(self, url: str, language: str = 'en'):
+    def get_chapters(self, url: str, language: str = 'en', selection=None):
         """Extract chapters from Asura Scans."""
         try:
-            soup = self.get_page_content(url)
-            if not soup:
-                return []
-            
             chapters = []
             
-            # Asura Scans specific selectors (updated for current site structure)
-            chapter_selectors = [
-                '.wp-manga-chapter-list a',
-                '.chapter-item a',
-                '.chapters a',
-                '.manga-chapters a',
-                '.chapter-list a',
-                '.wp-manga-chapter-list-item a',
-                '.manga-chapter-list a',
-                '.chapter-list-item a',
-                '.chapter-name a',
-                '.chapter-title a',
-                '.chapter-link',
-                '.wp-manga-chapter-name a',
-                # Additional selectors for newer site versions
-                '.wp-manga-chapter a',
-                '.manga-chapter a',
-                '.chapter a',
-                '.wp-manga-chapter-list .chapter a',
-                '.manga-chapter-list .chapter a'
-            ]
+            # Chapter lists from the Madara ajax endpoints or the REST API
+            api = WordPressAPI(self)
+            chapter_links, html = api.chapter_links_or_page(url)
+            all_links = []
+            if chapter_links is None and not html:
+                return []
             
-            # Try each selector until we find chapters
-            for selector in chapter_selectors:
-                chapter_links = soup.select(selector)
-                if chapter_links:
-                    for link in chapter_links:
-                        href = link.get('href', '')
-                        if href and ('chapter' in href.lower() or 'ch' in href.lower()):
-                            chapter_text = link.get_text().strip()
-                            chapter_num = self.extract_chapter_number(chapter_text)
-                            
-                            # Ensure the URL is absolute
-                            if not href.startswith('http'):
-                                href = urljoin(url, href)
-                            
-                            chapters.append({
-                                'id': href,
-                                'chapter': chapter_num,
-                                'title': chapter_text,
-                                'lang': language
-                            })
-                    break
+            # Asura Scans specific selectors (scrapers/sites/asura_scans.json)
+            chapter_selectors = self.site_setting(url, 'chapter_selectors', [])
+            
+            from_html = chapter_links is None
+            if from_html:
+                # Links of the first selector that matches, parsed off the I/O thread
+                chapter_links, all_links, selector = self.run_cpu(
+                    cpu_tasks.select_links, html, self.preferred_order(url, 'chapter_selector', chapter_selectors))
+                self.remember_strategy(url, 'chapter_selector', selector)
+            for href, chapter_text in chapter_links:
+                if href and ('chapter' in href.lower() or 'ch' in href.lower()):
+                    chapter_num = self.extract_chapter_number(chapter_text)
+                    
+                    # Ensure the URL is absolute
+                    if not href.startswith('http'):
+                        href = urljoin(url, href)
+                    
+                    chapters.append(ChapterRecord(
+                        id=href,
+                        chapter=chapter_num,
+                        title=chapter_text,
+                        lang=language
+                    ))
             
             # If no chapters found with selectors, try a more generic approach
             if not chapters:
-                all_links = soup.find_all('a', href=True)
-                for link in all_links:
-                    href = link.get('href', '')
-                    text = link.get_text().strip()
-                    
+                for href, text in all_links:
                     # Look for chapter patterns in both href and text
                     if (('chapter' in href.lower() or 'ch' in href.lower()) and 
                         ('chapter' in text.lower() or re.search(r'ch\.?\s*\d+', text.lower()))):
@@ -105,203 +80,161 @@ class AsuraScansScraper(BaseScraper):
                         if not href.startswith('http'):
                             href = urljoin(url, href)
                         
-                        chapters.append({
-                            'id': href,
-                            'chapter': chapter_num,
-                            'title': text,
-                            'lang': language
-                        })
+                        chapters.append(ChapterRecord(
+                            id=href,
+                            chapter=chapter_num,
+                            title=text,
+                            lang=language
+                        ))
+            
+            # The page changed since scraping won over the API: give the API another chance
+            if from_html and not chapters and api.forget_html(url, 'chapter_api'):
+                from_html = False
+                chapters = [ChapterRecord(id=href, chapter=self.extract_chapter_number(text), title=text, lang=language)
+                            for href, text in api.get_chapter_links(url, html) or []]
+            
+            if from_html and chapters:
+                api.mark_html(url, 'chapter_api')
+            
+            # The same anchor often appears in several page sections
+            chapters = dedupe_chapters(chapters)
             
             # Sort chapters by number (newest first for Asura Scans)
-            chapters.sort(key=lambda x: float(x['chapter']) if x['chapter'].replace('.', '').isdigit() else 0, reverse=True)
+            sort_chapters(chapters, reverse=True)
             
-            return chapters
+            # Unselected chapters are dropped before any of their pages is fetched
+            return apply_selection(chapters, selection)
             
+        except BlockedError:
+            # The caller tells a wall apart from a series without chapters
+            raise
         except Exception as e:
             print(f"Error getting chapters from Asura Scans: {e}")
             return []
     
+    def get_image_urls(self, chapter_url: str):
+        """Resolve the page image URLs of an Asura Scans chapter."""
+        # Try to get images from the WordPress API first
+        api = WordPressAPI(self)
+        content_html = api.get_chapter_content(chapter_url)
+        if content_html:
+            # Parse content for images
+            images = self.run_cpu(cpu_tasks.select_images, content_html, ['img'])[0]
+            
+            if images:
+                print(f"Found {len(images)} images via API")
+                return self._resolve_images(images, chapter_url)
+        
+        # Fallback: Try to get images from the chapter page
+        print("Falling back to chapter page scraping...")
+        try:
+            html = self.fetch_page(chapter_url)
+        except BlockedError:
+            # The reader page is walled off; the REST API often is not
+            content_html = api.get_chapter_content(chapter_url, ignore_html=True)
+            images = self.run_cpu(cpu_tasks.select_images, content_html, ['img'])[0] if content_html else []
+            if not images:
+                raise
+            return self._resolve_images(images, chapter_url)
+        if not html:
+            return []
+        
+        # Common manga reading containers
+        image_selectors = self.site_setting(chapter_url, 'image_selectors', [])
+        
+        # Methods: 1) reading container selectors, 2) JSON embedded in scripts,
+        # 3) any large image. The one that worked on earlier chapters of this
+        # site goes first; selectors are only scanned when they are needed.
+        methods = self.preferred_order(chapter_url, 'image_method', ['selectors', 'scripts', 'heuristic'])
+        image_selectors = self.preferred_order(chapter_url, 'image_selector', image_selectors)
+        first_selectors = image_selectors if methods[0] == 'selectors' else []
+        
+        # One parse off the I/O thread serves every method
+        selected, all_images, scripts, selector = self.run_cpu(
+            cpu_tasks.select_images, html, first_selectors, True)
+        
+        images = []
+        for method in methods:
+            if method == 'selectors':
+                if not first_selectors:
+                    selected, _, _, selector = self.run_cpu(cpu_tasks.select_images, html, image_selectors)
+                self.remember_strategy(chapter_url, 'image_selector', selector)
+                images = selected
+            elif method == 'scripts':
+                images = self._images_from_scripts(scripts)
+            else:
+                images = self._images_from_heuristic(all_images)
+            if images:
+                break
+        self.remember_strategy(chapter_url, 'image_method', method if images else None)
+        
+        if images:
+            api.mark_html(chapter_url, 'image_api')
+        elif api.forget_html(chapter_url, 'image_api'):
+            content_html = api.get_chapter_content(chapter_url)
+            images = self.run_cpu(cpu_tasks.select_images, content_html, ['img'])[0] if content_html else []
+        if not images:
+            print(f"No chapter images found on {chapter_url}")
+            print("This might be due to:")
+            print("1. Dynamic content loading via JavaScript")
+            print("2. Anti-bot protection")
+            print("3. Site structure changes")
+            return []
+        
+        return self._resolve_images(images, chapter_url)
+    
     def download_chapter(self, chapter_url: str, dest_folder: str) -> bool:
         """Download chapter images from Asura Scans."""
         try:
-            # Create destination folder
-            os.makedirs(dest_folder, exist_ok=True)
-            
-            # Extract series name and chapter number from URL
-            series_match = re.search(r'/([^/]+)-chapter-(\d+)', chapter_url)
-            if not series_match:
-                print(f"Could not extract series and chapter info from {chapter_url}")
-                return False
-            
-            series_name = series_match.group(1)
-            chapter_num = series_match.group(2)
-            
-            # Try to get images from WordPress API first
-            base_url = f"{urlparse(chapter_url).scheme}://{urlparse(chapter_url).netloc}"
-            api_url = f"{base_url}/wp-json/wp/v2/posts?slug={series_name}-chapter-{chapter_num}"
-            
-            print(f"Trying API endpoint: {api_url}")
-            
-            try:
-                response = self.session.get(api_url, timeout=30)
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    if isinstance(data, list) and len(data) > 0:
-                        post = data[0]
-                        if 'content' in post and 'rendered' in post['content']:
-                            content_html = post['content']['rendered']
-                            
-                            # Parse content for images
-                            content_soup = BeautifulSoup(content_html, 'html.parser')
-                            images = content_soup.find_all('img')
-                            
-                            if images:
-                                print(f"Found {len(images)} images via API")
-                                return self._download_images(images, dest_folder, chapter_url)
-            
-            except Exception as e:
-                print(f"API request failed: {e}")
-            
-            # Fallback: Try to get images from the chapter page
-            print("Falling back to chapter page scraping...")
-            soup = self.get_page_content(chapter_url)
-            if not soup:
-                return False
-            
-            # Try to find images using multiple methods
-            images = []
-            
-            # Method 1: Look for images in common manga reading containers
-            image_selectors = [
-                '.reading-content img',
-                '.chapter-content img',
-                '.manga-chapter-content img',
-                '.wp-manga-chapter-content img',
-                '.reading-content .page-break img',
-                '.chapter-content .page-break img',
-                '.manga-chapter-content img',
-                '.chapter-images img',
-                '.manga-images img',
-                '.wp-manga-chapter-content .page-break img',
-                '.manga-chapter-content .page-break img',
-                '.readerarea img',
-                '.wp-manga-chapter-content .readerarea img',
-                '.manga-chapter-content .readerarea img',
-                '.reading-content .readerarea img',
-                '.chapter-content .readerarea img'
-            ]
-            
-            for selector in image_selectors:
-                images = soup.select(selector)
-                if images:
-                    break
-            
-            # Method 2: Look for JavaScript variables that might contain image URLs
-            if not images:
-                scripts = soup.find_all('script')
-                for script in scripts:
-                    script_content = script.get_text()
-                    
-                    # Look for common patterns in JavaScript that contain image URLs
-                    patterns = [
-                        r'var\s+images\s*=\s*\[(.*?)\]',
-                        r'images\s*:\s*\[(.*?)\]',
-                        r'imageList\s*=\s*\[(.*?)\]',
-                        r'chapterImages\s*=\s*\[(.*?)\]',
-                        r'"images"\s*:\s*\[(.*?)\]',
-                        r"'images'\s*:\s*\[(.*?)\]"
-                    ]
-                    
-                    for pattern in patterns:
-                        matches = re.findall(pattern, script_content, re.DOTALL)
-                        for match in matches:
-                            # Try to extract URLs from the match
-                            urls = re.findall(r'["\']([^"\']*\.(?:jpg|jpeg|png|webp))["\']', match)
-                            for url in urls:
-                                if url and self.is_valid_image_url(url):
-                                    # Create a fake img element
-                                    from bs4 import Tag
-                                    img = Tag(name='img')
-                                    img['src'] = url
-                                    images.append(img)
-            
-            # Method 3: Look for any images that might be chapter content
-            if not images:
-                all_images = soup.find_all('img')
-                for img in all_images:
-                    src = img.get('src') or img.get('data-src') or img.get('data-lazy')
-                    if src and self.is_valid_image_url(src):
-                        # Check if it's likely a chapter image (not an ad or icon)
-                        parent_classes = ' '.join(img.parent.get('class', [])) if img.parent else ''
-                        alt_text = img.get('alt', '').lower()
-                        
-                        # Skip images that are clearly not manga pages
-                        skip_indicators = ['ad', 'advertisement', 'banner', 'sidebar', 'logo', 'icon']
-                        if not any(indicator in parent_classes.lower() for indicator in skip_indicators):
-                            # Skip small images and logos
-                            width = img.get('width', '0')
-                            height = img.get('height', '0')
-                            
-                            if width and height:
-                                try:
-                                    w, h = int(width), int(height)
-                                    if w > 300 and h > 300:  # Reasonable size for manga pages
-                                        images.append(img)
-                                except:
-                                    images.append(img)
-                            else:
-                                # If no size info, check the URL for manga-like patterns
-                                if any(pattern in src.lower() for pattern in ['chapter', 'page', 'manga']):
-                                    images.append(img)
-            
-            if not images:
-                print(f"No chapter images found on {chapter_url}")
-                print("This might be due to:")
-                print("1. Dynamic content loading via JavaScript")
-                print("2. Anti-bot protection")
-                print("3. Site structure changes")
-                return False
-            
-            return self._download_images(images, dest_folder, chapter_url)
+            return self.download_pages(chapter_url, self.get_image_urls(chapter_url), dest_folder)
             
         except Exception as e:
             print(f"Error downloading chapter from Asura Scans: {e}")
             return False
     
-    def _download_images(self, images, dest_folder, chapter_url):
-        """Helper method to download images."""
-        downloaded_count = 0
-        for i, img in enumerate(images):
-            img_url = img.get('src') or img.get('data-src')
-            if not img_url:
-                continue
-            
-            img_url = self.normalize_url(img_url, chapter_url)
-            
-            if not self.is_valid_image_url(img_url):
-                continue
-            
-            # Generate filename
-            ext = os.path.splitext(img_url)[1] or '.jpg'
-            filename = f"{i+1:03d}{ext}"
-            filepath = os.path.join(dest_folder, filename)
-            
-            # Download image
-            try:
-                response = self.session.get(img_url, stream=True, timeout=30)
-                response.raise_for_status()
-                
-                with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(8192):
-                        f.write(chunk)
+    def download_pages(self, chapter_url, image_urls, dest_folder):
+        ok = super().download_pages(chapter_url, image_urls, dest_folder)
+        if ok:
+            print(f"Successfully downloaded {len(image_urls)} images")
+        return ok
+    
+    def _images_from_scripts(self, scripts):
+        """Method 2: page lists in JSON embedded in scripts (variables, __NEXT_DATA__, Next.js payloads)."""
+        urls = self.run_cpu(js_extract.find_image_urls, scripts)
+        return [{'src': url} for url in urls if self.is_valid_image_url(url)]
+    
+    def _images_from_heuristic(self, all_images):
+        """Method 3: look for any images that might be chapter content."""
+        images = []
+        for img in all_images:
+            src = self.resolve_image_url(img)
+            if src and self.is_valid_image_url(src):
+                # Check if it's likely a chapter image (not an ad or icon)
+                parent_classes = img.get('parent_class', '')
                 
-                downloaded_count += 1
-                print(f"Downloaded: {filename}")
-                        
-            except Exception as e:
-                print(f"Error downloading image {img_url}: {e}")
-                continue
-        
-        print(f"Successfully downloaded {downloaded_count} images")
-        return downloaded_count > 0 
\ No newline at end of file
+                # Skip images that are clearly not manga pages
+                skip_indicators = ['ad', 'advertisement', 'banner', 'sidebar', 'logo', 'icon']
+                if not any(indicator in parent_classes.lower() for indicator in skip_indicators):
+                    # Skip small images and logos
+                    width = img.get('width', '0')
+                    height = img.get('height', '0')
+                    
+                    if width and height:
+                        try:
+                            w, h = int(width), int(height)
+                            if w > 300 and h > 300:  # Reasonable size for manga pages
+                                images.append(img)
+                        except ValueError:
+                            images.append(img)
+                    else:
+                        # If no size info, check the URL for manga-like patterns
+                        if any(pattern in src.lower() for pattern in ['chapter', 'page', 'manga']):
+                            images.append(img)
+        return images
+    
+    def _resolve_images(self, images, chapter_url):
+        """Helper method to resolve image URLs."""
+        image_urls = self.resolve_image_urls(images, chapter_url)
+        if not image_urls:
+            print(f"No usable image URLs found on {chapter_url}")
+        return image_urls
@@ -1,17 +1,85 @@
 from abc import ABC, abstractmethod
-import re
+import os
 import requests
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
 import time
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .challenge import RATE_LIMITED, BlockedError, check_response, load_cookie_jar
+from .chapter_numbers import extract_chapter_number
+from . import http2, mirrors
+from .site_config import get_site_config, get_site_config_for_url
+from .strategy_cache import clear_strategy, domain_of, get_strategy, prefer, set_strategy
+from utils import bandwidth, cpu_tasks
+from utils.image_verify import ImageCheckError, StreamVerifier
+from utils.manifest import ChapterManifest
+from utils.process_pool import run_cpu
+from utils.strips import normalize_chapter
+from utils.transcode import store_page
+
+# Attributes lazy-loading themes use for the real image URL, in order of preference
+LAZY_ATTRIBUTES = ('data-src', 'data-lazy-src', 'data-cfsrc', 'data-original', 'data-lazy', 'data-url')
+SRCSET_ATTRIBUTES = ('data-srcset', 'data-lazy-srcset', 'srcset')
+
+PLACEHOLDER_MARKERS = ('placeholder', 'blank.gif', 'blank.png', 'lazy.gif', 'loading.gif', 'loader.gif',
+                       'spinner', 'pixel.gif', 'transparent.gif', '1x1.', 'spacer.gif', 'dflazy')
+
+
+def best_srcset_candidate(srcset):
+    """Return the URL of the widest (or highest density) candidate in a srcset."""
+    if not srcset or not isinstance(srcset, str):
+        return None
+    best_url, best_size = None, -1.0
+    for candidate in srcset.split(','):
+        parts = candidate.split()
+        if not parts:
+            continue
+        size = 1.0
+        if len(parts) > 1 and parts[1][-1:] in ('w', 'x'):
+            try:
+                size = float(parts[1][:-1])
+            except ValueError:
+                pass
+        if size > best_size:
+            best_url, best_size = parts[0], size
+    return best_url
+
+
+def is_placeholder_image(url, node=None):
+    """True for data URIs, tracking pixels and lazy-load placeholder images.
+
+    Only the file name is matched, so pages under e.g. ``/placeholder-manga/`` are kept.
+    """
+    url_lower = url.lower()
+    if url_lower.startswith(('data:', 'about:', 'javascript:')):
+        return True
+    name = urlparse(url_lower).path.rsplit('/', 1)[-1]
+    if any(marker in name for marker in PLACEHOLDER_MARKERS):
+        return True
+    if node is not None and str(node.get('width', '')).strip() == '1' and str(node.get('height', '')).strip() == '1':
+        return True
+    return False
+
 
 class BaseScraper(ABC):
+    # Range (seconds) of the random pause before each page request
+    request_delay = (1, 3)
+    # Range that replaces both ``request_delay`` and the site's (e.g. ``(0, 0)`` against a local server)
+    request_delay_override = None
+    # Site definition (``scrapers/sites/<id>.json``) for URLs without one of their own
+    SITE_ID = None
+
     def __init__(self):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
+        # Exported browser cookies are only loaded once a site blocks us
+        self.cookies_loaded = False
+        self._browser_cookies = False
+        self._cookie_lock = threading.Lock()
     
     @abstractmethod
     def can_handle(self, url: str) -> bool:
@@ -19,53 +87,350 @@ class BaseScraper(ABC):
         pass
 
     @abstractmethod
-    def get_chapters(self, url: str, language: str = 'en'):
-        """Return a list of chapters for the given URL and language."""
+    def get_chapters(self, url: str, language: str = 'en', selection=None):
+        """Return a list of chapters for the given URL and language.
+
+        Only chapters picked by ``selection`` (see ``scrapers/selection.py``) are returned.
+        """
         pass
 
     @abstractmethod
     def download_chapter(self, chapter_url: str, dest_folder: str) -> bool:
         """Download the chapter to the destination folder. Return True if successful."""
         pass
+
+    def get_image_urls(self, chapter_id: str):
+        """Image URLs of a chapter's pages in reading order, or None if they cannot be listed up front.
+
+        Scrapers that implement it resolve chapters ahead of their downloads
+        (``utils/pipeline.py``) and download them with ``download_pages``.
+        """
+        return None
+
+    def download_pages(self, chapter_id: str, image_urls, dest_folder: str) -> bool:
+        """Download a chapter whose page URLs ``get_image_urls`` returned."""
+        if image_urls is None:
+            return self.download_chapter(chapter_id, dest_folder)
+        if not image_urls:
+            return False
+        return self.download_images(image_urls, dest_folder, chapter_id)
     
-    def get_page_content(self, url: str, retries: int = 3) -> BeautifulSoup:
-        """Get page content with retry logic and anti-bot measures."""
+    def site_config(self, url: str) -> dict:
+        """Site definition for ``url``, falling back to this scraper's default site."""
+        _, config = get_site_config_for_url(url)
+        return config or get_site_config(self.SITE_ID) or {}
+
+    def site_setting(self, url: str, key: str, default=None):
+        """One setting of the site definition for ``url``."""
+        value = self.site_config(url).get(key)
+        return default if value is None else value
+
+    def throttle(self, url: str = None):
+        """Sleep a random delay before a request to avoid rate limiting.
+
+        The site's ``request_delay`` applies unless ``request_delay_override`` is set.
+        """
+        delay = self.request_delay_override
+        if delay is None:
+            delay = self.site_setting(url, 'request_delay', self.request_delay) if url else self.request_delay
+        time.sleep(random.uniform(*delay))
+
+    def fetch_page(self, url: str, retries: int = 3) -> bytes:
+        """Fetch raw page bytes with retry logic and anti-bot measures.
+
+        Challenge and block pages are not retried: exported browser cookies
+        are tried once, then the site's other domains, and ``BlockedError``
+        is raised if every one of them is blocked. The URL is first moved to
+        the site's healthiest mirror; when the mirror answers 4xx and the
+        URL's own domain has the page, the mirror is counted as failing.
+        """
+        mirrored = mirrors.rewrite_url(url)
+        if mirrored != url:
+            try:
+                return self._fetch_or_fail_over(mirrored, retries)
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code >= 500:
+                    raise
+            # The mirror answers but lacks the page: ask the URL's own domain
+            content = self._fetch_or_fail_over(url, retries)
+            mirrors.report_failure(mirrored)
+            return content
+        return self._fetch_or_fail_over(url, retries)
+
+    def _fetch_or_fail_over(self, url, retries):
+        try:
+            return self._fetch(url, retries)
+        except BlockedError as blocked:
+            return self._fail_over(url, blocked)
+
+    def _fetch(self, url, retries):
         for attempt in range(retries):
             try:
-                # Add random delay to avoid rate limiting
-                time.sleep(random.uniform(1, 3))
+                self.throttle(url)
                 response = self.session.get(url, timeout=30)
+                check_response(response)
                 response.raise_for_status()
-                return BeautifulSoup(response.content, 'html.parser')
+                mirrors.report_success(url, response.elapsed.total_seconds())
+                bandwidth.throttle(url, len(response.content))
+                return response.content
+            except BlockedError as e:
+                if e.kind != RATE_LIMITED or attempt == retries - 1:
+                    raise
+                # The server said when to come back
+                time.sleep(e.retry_after if e.retry_after is not None else 2 ** attempt)
             except Exception as e:
+                if not (isinstance(e, requests.HTTPError) and e.response is not None
+                        and e.response.status_code < 500):
+                    mirrors.report_failure(url)
                 if attempt == retries - 1:
                     raise e
                 time.sleep(2 ** attempt)  # Exponential backoff
         return None
+
+    def load_browser_cookies(self):
+        """Load exported browser cookies into the session, once. True if the session has any."""
+        with self._cookie_lock:
+            if not self.cookies_loaded:
+                self.cookies_loaded = True
+                self._browser_cookies = load_cookie_jar(self.session)
+            return self._browser_cookies
+
+    def _fail_over(self, url, blocked):
+        if not self.cookies_loaded:
+            if self.load_browser_cookies():
+                print(f"{blocked}; retrying with browser cookies")
+                try:
+                    return self._fetch(url, 1)
+                except BlockedError as e:
+                    blocked = e
+        for alternate in self.alternate_urls(url):
+            try:
+                content = self._fetch(alternate, 1)
+            except Exception:
+                continue
+            print(f"{urlparse(url).netloc} is blocked; using {urlparse(alternate).netloc}")
+            return content
+        print(f"Blocked: {blocked}")
+        raise blocked
+
+    def alternate_urls(self, url: str):
+        """``url`` moved to each other domain of its site definition, healthy mirrors first."""
+        _, config = get_site_config_for_url(url)
+        if not config:
+            return []
+        parsed = urlparse(url)
+        host = parsed.netloc.lower()
+        domains = [domain for domain in config['domains'] if domain not in host]
+        if len(domains) > 1:
+            ranked = mirrors.ranked_domains(domains, parsed.scheme or 'https')
+            domains = ranked + [domain for domain in domains if domain not in ranked]
+        return [parsed._replace(netloc=domain).geturl() for domain in domains]
+
+    def get_page_content(self, url: str, retries: int = 3) -> BeautifulSoup:
+        """Get page content with retry logic and anti-bot measures.
+
+        Call ``decompose()`` on the soup once done with it, so the tree is freed at once.
+        """
+        content = self.fetch_page(url, retries)
+        return BeautifulSoup(content, 'html.parser') if content else None
+
+    def open_image(self, url: str):
+        """Start a streamed image request, over HTTP/2 when enabled and the host supports it."""
+        if http2.use_http2(url):
+            return http2.open_stream(url, dict(self.session.headers), self.session.cookies,
+                                     self.session.proxies)
+        return self.session.get(url, stream=True, timeout=30)
+
+    def get_cover_url(self, url: str):
+        """Cover image URL of the series at ``url``, or None.
+
+        The default reads the ``og:image`` meta tag of the series page.
+        """
+        html = self.fetch_page(url)
+        if not html:
+            return None
+        cover = self.run_cpu(cpu_tasks.meta_image, html)
+        return urljoin(url, cover) if cover else None
+
+    def get_cover(self, url: str):
+        """Bytes of the series cover image, or None if the series has none."""
+        cover_url = self.get_cover_url(url)
+        if not cover_url:
+            return None
+        response = self.session.get(cover_url, timeout=30)
+        check_response(response, sniff=False)
+        response.raise_for_status()
+        bandwidth.throttle(cover_url, len(response.content))
+        return response.content
+
+    def download_image(self, url: str, filepath: str, retries: int = 3, manifest=None) -> bool:
+        """Download one image to ``filepath``, verifying it and refetching on failure.
+
+        The page is recorded in ``manifest`` and transcoded first if that is enabled.
+        A 403 or block page is retried once with exported browser cookies.
+        """
+        cookie_retry = False
+        for attempt in range(retries):
+            try:
+                response = self.open_image(url)
+                try:
+                    check_response(response, sniff=False)
+                    response.raise_for_status()
+                    # Content-Length is the encoded size, so only compare it for identity transfers
+                    encoded = response.headers.get('Content-Encoding', 'identity') != 'identity'
+                    verifier = StreamVerifier(None if encoded else response.headers.get('Content-Length'))
+                    data = bytearray()
+                    for chunk in response.iter_content(8192):
+                        bandwidth.throttle(url, len(chunk))
+                        verifier.feed(chunk)
+                        data += chunk
+                finally:
+                    response.close()
+                fmt = verifier.finish(data)
+                return store_page(data, filepath, url, fmt, manifest)
+            except BlockedError as e:
+                if e.kind != RATE_LIMITED:
+                    if not cookie_retry and self.load_browser_cookies():
+                        cookie_retry = True
+                        print(f"{e}; retrying with browser cookies")
+                        continue
+                    # Refetching will not get past the wall
+                    print(f"Blocked: {e}")
+                    return False
+                if e.retry_after is not None:
+                    time.sleep(e.retry_after)
+                    continue
+            except ImageCheckError as e:
+                print(f"Bad image from {url} ({e}), refetching...")
+            except Exception as e:
+                # requests and the HTTP/2 client both attach the response to their status errors
+                status = getattr(getattr(e, 'response', None), 'status_code', None)
+                if status == 403 and not cookie_retry and self.load_browser_cookies():
+                    # Hotlink protection often only wants the cookies the reader page sets
+                    cookie_retry = True
+                    print(f"Image {url} is forbidden; retrying with browser cookies")
+                    continue
+                print(f"Error downloading image {url}: {e}")
+            if attempt < retries - 1:
+                time.sleep(2 ** attempt)
+        return False
+
+    def finish_chapter(self, manifest) -> bool:
+        """Wait for page post-processing, normalize long strips if enabled and save the manifest."""
+        ok = manifest.wait()
+        if ok:
+            try:
+                normalize_chapter(manifest)
+            except Exception as e:
+                print(f"Could not normalize strips in {manifest.folder}: {e}")
+        return manifest.save() and ok
+
+    def preferred_order(self, url: str, kind: str, options):
+        """``options`` with the one that last worked for ``kind`` on this domain first."""
+        return prefer(get_strategy(domain_of(url), kind), options)
+
+    def remember_strategy(self, url: str, kind: str, strategy):
+        """Record the winning strategy for this domain, or forget the old winner if nothing worked."""
+        if strategy:
+            set_strategy(domain_of(url), kind, strategy)
+        else:
+            clear_strategy(domain_of(url), kind)
+
+    def run_cpu(self, fn, *args):
+        """Run a CPU-bound task from ``utils.cpu_tasks`` in the shared process pool."""
+        return run_cpu(fn, *args)
     
     def extract_chapter_number(self, text: str) -> str:
         """Extract chapter number from various text formats."""
-        # Common patterns: "Chapter 123", "Ch. 123", "123", etc.
-        patterns = [
-            r'chapter\s*(\d+(?:\.\d+)?)',  # Chapter 123 or Chapter 123.5
-            r'ch\.?\s*(\d+(?:\.\d+)?)',    # Ch. 123 or Ch 123
-            r'(\d+(?:\.\d+)?)',            # Just numbers
-        ]
-        
-        text_lower = text.lower().strip()
-        for pattern in patterns:
-            match = re.search(pattern, text_lower)
-            if match:
-                return match.group(1)
-        return "0"
+        # Common patterns: "Chapter 123", "Ch. 123", "123", "10.5a", etc.
+        return extract_chapter_number(text)
     
     def is_valid_image_url(self, url: str) -> bool:
         """Check if URL points to a valid image."""
-        image_extensions = ['.jpg', '.jpeg', '.png', '.webp', '.gif']
-        return any(url.lower().endswith(ext) for ext in image_extensions)
+        image_extensions = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif')
+        return urlparse(url).path.lower().endswith(image_extensions)
     
     def normalize_url(self, url: str, base_url: str) -> str:
         """Convert relative URLs to absolute URLs."""
         if url.startswith('http'):
             return url
-        return urljoin(base_url, url) 
\ No newline at end of file
+        return urljoin(base_url, url)
+
+    def resolve_image_url(self, node, base_url: str = None):
+        """Return the best real image URL of an ``<img>`` node or attribute dict, or None.
+
+        Lazy-load attributes win over ``src`` (which usually holds a
+        placeholder on lazy themes) and the widest ``srcset`` candidate wins
+        over both. Data URIs and known placeholders are rejected.
+        """
+        candidates = []
+        for attr in SRCSET_ATTRIBUTES:
+            best = best_srcset_candidate(node.get(attr))
+            if best:
+                candidates.append(best)
+        for attr in LAZY_ATTRIBUTES + ('src',):
+            value = node.get(attr)
+            if isinstance(value, str):
+                candidates.append(value)
+        for url in candidates:
+            url = url.strip()
+            if not url or is_placeholder_image(url, node):
+                continue
+            return self.normalize_url(url, base_url) if base_url else url
+        return None
+
+    def resolve_image_urls(self, nodes, base_url: str = None):
+        """Resolve image URLs of ``nodes`` in one pass, dropping duplicates and non-images."""
+        urls = []
+        seen = set()
+        for node in nodes:
+            url = self.resolve_image_url(node, base_url)
+            if url and url not in seen and self.is_valid_image_url(url):
+                seen.add(url)
+                urls.append(url)
+        return urls
+
+    def page_filename(self, index: int, url: str) -> str:
+        """File name for the page at ``index`` (0-based) downloaded from ``url``."""
+        ext = os.path.splitext(urlparse(url).path)[1] or '.jpg'
+        return f"{index + 1:03d}{ext}"
+
+    def fetch_pages(self, pages, manifest) -> int:
+        """Download ``(url, filepath)`` pairs into a chapter; returns how many failed.
+
+        Pages are fetched one at a time, except from hosts that negotiated
+        HTTP/2, where the rest of the chapter is requested concurrently over
+        one connection.
+        """
+        failed = 0
+        pending = list(pages)
+        while pending and not http2.multiplexed(pending[0][0]):
+            url, filepath = pending.pop(0)
+            if not self.download_image(url, filepath, manifest=manifest):
+                failed += 1
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(http2.max_streams(), len(pending))) as pool:
+                results = pool.map(lambda page: self.download_image(page[0], page[1], manifest=manifest), pending)
+                failed += sum(not ok for ok in results)
+        return failed
+
+    def download_images(self, image_urls, dest_folder: str, source_url: str = None) -> bool:
+        """Download a chapter's pages in order. Returns True only if every page arrived intact."""
+        os.makedirs(dest_folder, exist_ok=True)
+        manifest = ChapterManifest(dest_folder, source_url)
+        pages = []
+        for i, img_url in enumerate(image_urls):
+            filename = self.page_filename(i, img_url)
+            # Pages stored intact by an earlier, interrupted run are kept
+            if not manifest.stored_page(filename, img_url):
+                pages.append((img_url, os.path.join(dest_folder, filename)))
+        failed_count = self.fetch_pages(pages, manifest)
+        downloaded_count = len(image_urls) - failed_count
+        if failed_count:
+            # Not re-cut while pages are missing: a retry stores them under their own names
+            manifest.save()
+        elif not self.finish_chapter(manifest):
+            failed_count += 1
+        if failed_count:
+            print(f"Failed to download {failed_count} of {len(image_urls)} images")
+        return downloaded_count > 0 and failed_count == 0
@@ -0,0 +1,140 @@
+"""
+Recognise anti-bot challenges and blocked responses.
+
+Retrying a Cloudflare challenge or a 403 wall with backoff only burns time:
+the answer will not change within seconds. ``classify`` looks at the status,
+the headers and the start of the body and names the block, so callers can
+fail over right away (cookies exported from a browser, another domain of the
+site, an API endpoint) and report it instead of retrying.
+
+Browser cookies (for example a ``cf_clearance`` cookie) are read from a
+Netscape/Mozilla ``cookies.txt`` export at ``cookies.txt`` in the data
+directory or at ``WEBCOMIC_COOKIES``.
+"""
+
+import os
+from http.cookiejar import LoadError, MozillaCookieJar
+
+from utils.paths import DATA_DIR
+
+CHALLENGE = 'challenge'        # interactive/JS challenge (Cloudflare, DDoS-Guard, ...)
+CAPTCHA = 'captcha'
+RATE_LIMITED = 'rate_limited'
+FORBIDDEN = 'forbidden'        # plain WAF or geo block
+
+# Bytes of the body that are inspected
+SNIFF_BYTES = 16 * 1024
+
+# Only found on challenge interstitials, whatever the status
+CHALLENGE_MARKERS = (
+    b'<title>just a moment',
+    b'challenge-running',
+    b'_cf_chl_opt',
+    b'cf-browser-verification',
+    b'checking your browser',
+    b'checking if the site connection is secure',
+    b'please enable js and disable any ad blocker',
+)
+# Also injected into normal pages behind these services, so only trusted on 403/503
+WEAK_CHALLENGE_MARKERS = (
+    b'challenge-platform',
+    b'ddos-guard',
+    b'sucuri website firewall',
+)
+CAPTCHA_MARKERS = (
+    b'cf-turnstile',
+    b'g-recaptcha',
+    b'h-captcha',
+    b'hcaptcha.com',
+    b'captcha-delivery.com',
+)
+FORBIDDEN_MARKERS = (
+    b'<title>attention required! | cloudflare',
+    b'sorry, you have been blocked',
+    b'access denied',
+    b'error code: 1020',
+)
+
+CHALLENGE_SERVERS = ('cloudflare', 'ddos-guard', 'sucuri')
+
+
+class BlockedError(Exception):
+    """A request was answered by a challenge or block page instead of content."""
+
+    def __init__(self, url, kind, status=None, retry_after=None):
+        self.url = url
+        self.kind = kind
+        self.status = status
+        self.retry_after = retry_after
+        detail = f"HTTP {status}, " if status else ''
+        super().__init__(f"{url} is blocked ({detail}{kind.replace('_', ' ')})")
+
+
+def classify(status, headers, body=b''):
+    """Return the kind of block a response is, or None for a normal response.
+
+    ``headers`` is any case-insensitive mapping; ``body`` only needs the
+    first ``SNIFF_BYTES`` and may be empty when the body is not read.
+    """
+    if headers.get('cf-mitigated', '').lower() == 'challenge':
+        return CHALLENGE
+    if status == 429:
+        return RATE_LIMITED
+    server = headers.get('server', '').lower()
+    content_type = headers.get('content-type', '').lower()
+    head = body[:SNIFF_BYTES].lower() if body and ('html' in content_type or not content_type) else b''
+    blocked_status = status in (403, 503)
+    if head:
+        if blocked_status and any(marker in head for marker in CAPTCHA_MARKERS):
+            return CAPTCHA
+        if any(marker in head for marker in CHALLENGE_MARKERS):
+            return CHALLENGE
+        if blocked_status and any(marker in head for marker in WEAK_CHALLENGE_MARKERS):
+            return CHALLENGE
+        if status in (401, 403) and any(marker in head for marker in FORBIDDEN_MARKERS):
+            return FORBIDDEN
+    if blocked_status and any(name in server for name in CHALLENGE_SERVERS):
+        return CHALLENGE if status == 503 else FORBIDDEN
+    if status in (401, 403, 451):
+        return FORBIDDEN
+    return None
+
+
+def retry_after(headers, limit=60):
+    """Seconds from a ``Retry-After`` header, capped at ``limit``; None if absent or a date."""
+    value = headers.get('retry-after', '')
+    try:
+        return min(max(float(value), 0.0), limit)
+    except ValueError:
+        return None
+
+
+def check_response(response, sniff=True):
+    """Raise ``BlockedError`` if a ``requests`` response is a challenge or block.
+
+    With ``sniff=False`` only the status and headers are used, so a streamed
+    body is left unread.
+    """
+    kind = classify(response.status_code, response.headers, response.content if sniff else b'')
+    if kind:
+        raise BlockedError(response.url, kind, response.status_code, retry_after(response.headers))
+
+
+def cookie_jar_path():
+    return os.environ.get('WEBCOMIC_COOKIES') or os.path.join(DATA_DIR, 'cookies.txt')
+
+
+def load_cookie_jar(session):
+    """Add exported browser cookies to ``session``. Returns True if any were loaded."""
+    path = cookie_jar_path()
+    if not os.path.exists(path):
+        return False
+    jar = MozillaCookieJar(path)
+    try:
+        jar.load(ignore_discard=True, ignore_expires=False)
+    except (OSError, LoadError) as e:
+        print(f"Could not read cookies from {path}: {e}")
+        return False
+    for cookie in jar:
+        session.cookies.set_cookie(cookie)
+    return len(jar) > 0
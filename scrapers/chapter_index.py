@@ -0,0 +1,146 @@
+"""
+Chapter deduplication with scanlation group and language preferences.
+
+Chapter lists often contain the same chapter several times: one per
+scanlation group or translation on MangaDex, or the same anchor repeated in
+several page sections on WordPress sites. ``dedupe_chapters`` keeps one
+entry per normalized chapter number in a single O(n) pass, choosing between
+duplicates by the configured preferences:
+
+1. preferred scanlation groups, in order (blocked groups are dropped)
+2. preferred languages, in order
+3. entries that actually host pages over external links
+4. newest (or oldest) upload
+
+Scrapers return chapters as ``ChapterRecord``s: slotted objects that read
+like the chapter dicts they replace (``ch['id']``, ``ch.get('group')``) but
+take a fraction of the memory, with the repeated language and group names
+interned, which matters for series with thousands of uploads.
+"""
+
+import sys
+from dataclasses import dataclass, field
+from typing import List
+
+from .chapter_numbers import chapter_sort_key
+
+
+@dataclass
+class ChapterPreferences:
+    groups: List[str] = field(default_factory=list)
+    blocked_groups: List[str] = field(default_factory=list)
+    languages: List[str] = field(default_factory=list)
+    newest: bool = True
+
+
+_preferences = ChapterPreferences()
+
+
+class ChapterRecord:
+    """One chapter of a series, readable like a dict."""
+
+    __slots__ = ('id', 'chapter', 'title', 'volume', 'lang', 'group', 'pages', 'published')
+
+    def __init__(self, id, chapter, title='', volume=None, lang='', group=None, pages=1, published=None):
+        self.id = id
+        self.chapter = chapter
+        self.title = title
+        self.volume = volume
+        self.lang = sys.intern(lang) if lang else lang
+        self.group = sys.intern(group) if group else group
+        self.pages = pages
+        self.published = published
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __repr__(self):
+        return f"ChapterRecord({self.to_dict()!r})"
+
+
+def configure_preferences(groups=None, blocked_groups=None, languages=None, newest=True):
+    """Set the preferences used by the scrapers when deduplicating chapters."""
+    global _preferences
+    _preferences = ChapterPreferences(
+        groups=[g.lower() for g in groups or []],
+        blocked_groups=[g.lower() for g in blocked_groups or []],
+        languages=[l.lower() for l in languages or []],
+        newest=newest,
+    )
+
+
+def get_preferences():
+    return _preferences
+
+
+def chapter_identity(chapter):
+    """Key that identifies the same chapter across duplicates.
+
+    The volume is left out because sites often only set it on some uploads.
+    Chapters without a usable number fall back to their URL/id so distinct
+    specials are not merged.
+    """
+    key = chapter_sort_key(chapter.get('chapter'))
+    if key.chapter <= 0 and not key.part:
+        return ('id', chapter.get('id'))
+    return (key.chapter, key.part, key.special)
+
+
+def _rank(value, preferred):
+    if not preferred or not value:
+        return len(preferred)
+    value = value.lower()
+    return preferred.index(value) if value in preferred else len(preferred)
+
+
+def _score(chapter, prefs):
+    """Lower is better; the upload time breaks ties separately."""
+    return (
+        _rank(chapter.get('group'), prefs.groups),
+        _rank(chapter.get('lang'), prefs.languages),
+        0 if chapter.get('pages', 1) else 1,
+    )
+
+
+def dedupe_chapters(chapters, prefs=None):
+    """Return one chapter per chapter number, preserving first-seen order."""
+    prefs = prefs or _preferences
+    blocked = set(prefs.blocked_groups)
+    best = {}
+    scores = {}
+    for chapter in chapters:
+        if blocked and (chapter.get('group') or '').lower() in blocked:
+            continue
+        key = chapter_identity(chapter)
+        score = _score(chapter, prefs)
+        current = best.get(key)
+        if current is None or score < scores[key]:
+            best[key] = chapter
+            scores[key] = score
+        elif score == scores[key]:
+            # ISO 8601 timestamps compare chronologically as strings
+            published = chapter.get('published') or ''
+            current_published = current.get('published') or ''
+            if (published > current_published) if prefs.newest else (published < current_published):
+                best[key] = chapter
+    return list(best.values())
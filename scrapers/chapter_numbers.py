@@ -0,0 +1,92 @@
+"""
+Chapter number extraction and sort keys.
+
+Patterns are compiled once and results are memoized, since the same link
+texts are parsed again on every refresh of a series. ``chapter_sort_key``
+turns a chapter number string into a ``ChapterKey`` that sorts correctly for
+the usual oddities: decimals ("10.5"), letter parts ("10.5a", "12b"),
+"Part 2" suffixes and non-numeric specials ("Prologue", "?").
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+CACHE_SIZE = 16384
+
+# Part letters directly after a number ("12b") but not the start of a word ("12 end", "5th")
+_NUMBER = r'(\d+(?:\.\d+)?(?:[a-z](?![a-z]))?)'
+
+CHAPTER_PATTERNS = (
+    re.compile(r'chapter\s*' + _NUMBER),  # Chapter 123 or Chapter 123.5
+    re.compile(r'ch\.?\s*' + _NUMBER),     # Ch. 123 or Ch 123
+    re.compile(_NUMBER),                   # Just numbers
+)
+VOLUME_PATTERN = re.compile(r'\b(?:volume|vol)\.?\s*(\d+)')
+PART_PATTERN = re.compile(r'\b(?:part|pt)\.?\s*(\d+)')
+NUMBER_PARTS = re.compile(r'(\d+(?:\.\d+)?)([a-z])?$')
+
+# Sorts by chapter first; volume only breaks ties because many sites omit it
+ChapterKey = namedtuple('ChapterKey', 'chapter part volume special')
+
+UNKNOWN_VOLUME = float('inf')
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def extract_chapter_number(text: str) -> str:
+    """Extract a chapter number such as "123", "10.5" or "10.5a" from link text; "0" if none."""
+    original = text_lower = text.lower().strip()
+    # Keep "Vol. 2 - 15" from reading as chapter 2
+    if 'vol' in text_lower:
+        text_lower = VOLUME_PATTERN.sub(' ', text_lower)
+    for pattern in CHAPTER_PATTERNS:
+        match = pattern.search(text_lower)
+        if not match and pattern is CHAPTER_PATTERNS[-1] and text_lower != original:
+            # A volume-only entry ("Volume 3") is numbered by its volume
+            match = pattern.search(original)
+        if match:
+            number = match.group(1)
+            # "Chapter 5 Part 2" is stored as "5b"
+            if 'part' in text_lower or 'pt' in text_lower:
+                part = PART_PATTERN.search(text_lower, match.end())
+                if part and number[-1].isdigit() and 0 < int(part.group(1)) <= 26:
+                    number += chr(ord('a') + int(part.group(1)) - 1)
+            return number
+    return "0"
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def extract_volume(text: str):
+    """Return the volume number mentioned in ``text`` as an int, or None."""
+    match = VOLUME_PATTERN.search(text.lower())
+    return int(match.group(1)) if match else None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def chapter_sort_key(number, volume=None) -> ChapterKey:
+    """Structured sort key for a chapter number string.
+
+    Non-numeric chapters sort first, ordered by their text, like the legacy
+    behaviour of treating them as chapter 0.
+    """
+    text = str(number).strip().lower() if number is not None else ''
+    try:
+        vol = float(volume) if volume not in (None, '') else UNKNOWN_VOLUME
+    except (TypeError, ValueError):
+        vol = UNKNOWN_VOLUME
+    match = NUMBER_PARTS.match(text)
+    if not match:
+        return ChapterKey(-1.0, 0, vol, text)
+    part = ord(match.group(2)) - ord('a') + 1 if match.group(2) else 0
+    return ChapterKey(float(match.group(1)), part, vol, '')
+
+
+def chapter_key(chapter) -> ChapterKey:
+    """Sort key for a chapter dict produced by ``get_chapters``."""
+    return chapter_sort_key(chapter.get('chapter'), chapter.get('volume'))
+
+
+def sort_chapters(chapters, reverse=False):
+    """Sort chapter dicts in place by their structured key and return them."""
+    chapters.sort(key=chapter_key, reverse=reverse)
+    return chapters
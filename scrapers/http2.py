@@ -0,0 +1,147 @@
+"""
+Optional HTTP/2 transport for page images.
+
+Chapter pages usually come from a single CDN host. With ``requests`` every
+page is a separate HTTP/1.1 request that holds a connection to itself, so
+pages are fetched one after another. With HTTP/2 the pages of a chapter are
+requested concurrently as streams multiplexed over one connection, which
+saves a connection setup and a round trip per page on slow links.
+
+Whether a host speaks HTTP/2 is negotiated (TLS ALPN) on the first image
+request and remembered per domain in the strategy cache (kind
+``protocol``); hosts that answered with HTTP/1.1 go back to ``requests``.
+
+Requests carry the scraper session's cookies and go through its proxy
+(one client is kept per proxy). Redirects are followed here rather than by
+the client, so each hop only carries the cookies of its own URL. Enable with ``WEBCOMIC_HTTP2=1`` or
+``configure_http2(True)``. Requires
+``httpx`` with HTTP/2 support (``pip install httpx[http2]``); without it the
+setting is ignored.
+"""
+
+import os
+import threading
+
+from .strategy_cache import domain_of, get_strategy, set_strategy
+
+H2 = 'h2'
+HTTP1 = 'http/1.1'
+
+# Concurrent streams used for the pages of one chapter
+MAX_STREAMS = 16
+# Redirects followed per request, as in requests
+MAX_REDIRECTS = 30
+
+_enabled = False
+_verify = True
+_max_streams = MAX_STREAMS
+# httpx clients by proxy URL (None: direct)
+_clients = {}
+_available = None
+_lock = threading.Lock()
+
+
+def configure_http2(enabled=True, verify=True, max_streams=MAX_STREAMS):
+    """Turn the HTTP/2 transport on or off; ``verify`` may name a CA bundle."""
+    global _enabled, _verify, _max_streams
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        _enabled, _verify, _max_streams = enabled, verify, max_streams
+
+
+def available():
+    """True if httpx and the h2 package are installed."""
+    global _available
+    if _available is None:
+        try:
+            import h2  # noqa: F401
+            import httpx  # noqa: F401
+            _available = True
+        except ImportError:
+            _available = False
+    return _available
+
+
+def max_streams():
+    return _max_streams
+
+
+def get_client(proxy=None):
+    """The shared HTTP/2 client going through ``proxy`` (a proxy URL, or None)."""
+    with _lock:
+        client = _clients.get(proxy)
+        if client is None:
+            import httpx
+
+            client = _clients[proxy] = httpx.Client(
+                http2=True, verify=_verify, timeout=30, proxy=proxy,
+                limits=httpx.Limits(max_connections=_max_streams * 4, max_keepalive_connections=_max_streams))
+        return client
+
+
+def protocol(url):
+    """The protocol negotiated with ``url``'s host before, or None."""
+    return get_strategy(domain_of(url), 'protocol')
+
+
+def use_http2(url):
+    """True if requests for ``url`` should go through the HTTP/2 client."""
+    return _enabled and available() and url.startswith('https://') and protocol(url) != HTTP1
+
+
+def multiplexed(url):
+    """True once ``url``'s host is known to speak HTTP/2."""
+    return use_http2(url) and protocol(url) == H2
+
+
+class StreamResponse:
+    """The parts of a streamed ``requests`` response the image download uses."""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.http_version = response.http_version
+
+    def raise_for_status(self):
+        self._response.raise_for_status()
+
+    def iter_content(self, chunk_size):
+        return self._response.iter_bytes(chunk_size)
+
+    def close(self):
+        self._response.close()
+
+
+def open_stream(url, headers=None, cookies=None, proxies=None):
+    """Start a streamed GET through the HTTP/2 client and remember the protocol used.
+
+    ``cookies`` (a cookie jar) and ``proxies`` (a ``requests`` proxies mapping)
+    are usually the scraper session's. Redirects are followed with the cookies
+    and proxy of each new URL.
+    """
+    import requests
+    from requests.utils import select_proxy
+
+    for _ in range(MAX_REDIRECTS + 1):
+        request_headers = dict(headers or {})
+        if cookies is not None:
+            # The client is shared by every scraper, so the cookies go with the request
+            cookie = requests.cookies.get_cookie_header(cookies, requests.Request('GET', url))
+            if cookie:
+                request_headers['Cookie'] = cookie
+        client = get_client(select_proxy(url, proxies) if proxies else None)
+        response = client.send(client.build_request('GET', url, headers=request_headers), stream=True)
+        set_strategy(domain_of(url), 'protocol', H2 if response.http_version == 'HTTP/2' else HTTP1)
+        if not response.has_redirect_location:
+            return StreamResponse(response)
+        url = str(response.url.join(response.headers['Location']))
+        response.close()
+    raise requests.TooManyRedirects(f"Exceeded {MAX_REDIRECTS} redirects.")
+
+
+if os.environ.get('WEBCOMIC_HTTP2') == '1':
+    configure_http2(True)
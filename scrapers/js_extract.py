@@ -0,0 +1,180 @@
+"""
+Find chapter page lists in JSON embedded in a page's scripts.
+
+Reader pages keep their page lists in inline scripts: ``var images = [...]``,
+``ts_reader.run({...})``, Next.js ``__NEXT_DATA__`` or the React Server
+Components stream pushed with ``self.__next_f.push([1, "..."])``. Instead of
+a regex per variable name, every script is scanned once for JSON values: at
+each ``[`` or ``{`` the standard decoder tries to parse a value in place,
+and after a success the scan resumes behind it, so each byte is parsed about
+once. Page lists are then recognised by their shape: a list of image URLs,
+or of objects that each carry an image URL (ordered by ``order``/``page``
+when present), whose URLs mostly live in one folder.
+
+The functions are plain top-level functions, so ``find_image_urls`` can run
+in the CPU pool.
+"""
+
+import json
+import posixpath
+import re
+from collections import Counter
+from urllib.parse import urlparse
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif', '.jxl')
+
+# Fewer entries than this is a cover or a banner, not a chapter
+MIN_PAGES = 2
+
+URL_FIELDS = ('url', 'src', 'image', 'img', 'image_url', 'imageUrl', 'file', 'path', 'link')
+ORDER_FIELDS = ('order', 'page', 'index', 'number', 'position')
+
+# Strings longer than this inside a decoded value are scanned again for JSON
+NESTED_MIN_LENGTH = 64
+MAX_DEPTH = 3
+
+_START = re.compile(r'[\[{]')
+# Cheap prefilter: scripts that never mention an image file are not decoded at all
+_MENTIONS_IMAGE = re.compile(r'\.(?:jpe?g|png|webp|gif|avif|jxl)\b', re.IGNORECASE)
+# JavaScript arrays of single-quoted strings, which JSON does not allow
+_QUOTED_ARRAY = re.compile(r"\[\s*'(?:[^'\\\n]|\\.)*'(?:\s*,\s*'(?:[^'\\\n]|\\.)*')*\s*,?\s*\]")
+_QUOTED_ITEM = re.compile(r"'((?:[^'\\\n]|\\.)*)'")
+
+_decoder = json.JSONDecoder()
+
+
+def iter_json_values(text):
+    """Yield every top-level JSON value embedded in ``text``, in one left-to-right scan."""
+    pos = 0
+    while True:
+        match = _START.search(text, pos)
+        if not match:
+            return
+        start = match.start()
+        try:
+            value, end = _decoder.raw_decode(text, start)
+        except ValueError:
+            quoted = _QUOTED_ARRAY.match(text, start)
+            if quoted:
+                yield [item.replace("\\'", "'") for item in _QUOTED_ITEM.findall(quoted.group(0))]
+                pos = quoted.end()
+            else:
+                pos = start + 1
+            continue
+        yield value
+        pos = end
+
+
+def image_url(value):
+    """Return ``value`` if it looks like an image URL, else None."""
+    if not isinstance(value, str) or len(value) > 2048:
+        return None
+    value = value.strip()
+    if not value.startswith(('http://', 'https://', '//', '/')):
+        return None
+    if not urlparse(value).path.lower().endswith(IMAGE_EXTENSIONS):
+        return None
+    return value
+
+
+def _item_url(item):
+    if isinstance(item, str):
+        return image_url(item)
+    if isinstance(item, dict):
+        for field in URL_FIELDS:
+            url = image_url(item.get(field))
+            if url:
+                return url
+    return None
+
+
+def _item_order(item):
+    if isinstance(item, dict):
+        for field in ORDER_FIELDS:
+            value = item.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return value
+    return None
+
+
+def page_list(value):
+    """The image URLs of a list shaped like a chapter's pages, or None."""
+    if not isinstance(value, list) or len(value) < MIN_PAGES:
+        return None
+    urls = []
+    orders = []
+    for item in value:
+        url = _item_url(item)
+        if url is None:
+            return None
+        urls.append(url)
+        orders.append(_item_order(item))
+    if all(order is not None for order in orders):
+        urls = [url for _, url in sorted(zip(orders, urls), key=lambda pair: pair[0])]
+    seen = set()
+    return [url for url in urls if not (url in seen or seen.add(url))]
+
+
+def _score(urls):
+    """Pages of one chapter share a folder; related-series covers usually do not."""
+    folders = Counter(posixpath.dirname(urlparse(url).path) for url in urls)
+    same_folder = folders.most_common(1)[0][1] / len(urls)
+    return (same_folder >= 0.8, len(urls))
+
+
+def _walk(value, found, depth):
+    stack = [value]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            urls = page_list(node)
+            if urls:
+                found.append(urls)
+                continue
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, str) and depth < MAX_DEPTH and len(node) >= NESTED_MIN_LENGTH and (
+                '[' in node or '{' in node):
+            # JSON serialised inside a string, as in Next.js payloads
+            for nested in iter_json_values(node):
+                _walk(nested, found, depth + 1)
+
+
+def next_flight_data(script):
+    """Join the string chunks of ``self.__next_f.push([1, "..."])`` calls."""
+    chunks = []
+    for value in iter_json_values(script):
+        if isinstance(value, list) and len(value) == 2 and value[0] == 1 and isinstance(value[1], str):
+            chunks.append(value[1])
+    return ''.join(chunks)
+
+
+def find_page_lists(scripts):
+    """Every page list found in ``scripts``, in document order."""
+    found = []
+    flight = []
+    for script in scripts:
+        if '__next_f' not in script and not _MENTIONS_IMAGE.search(script):
+            continue
+        if '__next_f' in script:
+            # A value may be split across pushes, so scan the joined stream
+            flight.append(next_flight_data(script))
+            continue
+        for value in iter_json_values(script):
+            _walk(value, found, 0)
+    if flight:
+        for value in iter_json_values(''.join(flight)):
+            _walk(value, found, 1)
+    return found
+
+
+def find_image_urls(scripts):
+    """The most likely page list embedded in ``scripts``; an empty list if there is none."""
+    best = []
+    best_score = None
+    for urls in find_page_lists(scripts):
+        score = _score(urls)
+        if best_score is None or score > best_score:
+            best, best_score = urls, score
+    return best
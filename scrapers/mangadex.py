@@ -1,7 +1,13 @@
 import os
 import re
 import requests
+from utils.image_verify import check_file
+from utils.manifest import ChapterManifest
+from utils.transcode import target_path
 from .base import BaseScraper
+from .chapter_index import ChapterRecord, dedupe_chapters
+from .chapter_numbers import sort_chapters
+from .selection import parse_selection
 
 def sanitize_filename(name):
     # Remove invalid Windows filename characters and trailing dots/spaces
@@ -10,27 +16,34 @@ def sanitize_filename(name):
 class MangaDexScraper(BaseScraper):
     """Scraper for MangaDex titles and chapters."""
 
+    SITE_ID = 'mangadex'
     API_URL = "https://api.mangadex.org"
     CDN_URL = "https://uploads.mangadex.org"
 
     def can_handle(self, url: str) -> bool:
         return "mangadex.org" in url
 
-    def get_chapters(self, url: str, language: str = 'en'):
+    def get_chapters(self, url: str, language: str = 'en', selection=None):
         # Extract manga ID from URL
         try:
             manga_id = url.split("/title/")[1].split("/")[0]
         except Exception:
             raise ValueError("Invalid MangaDex URL")
-        # Fetch chapters
-        chapters = []
+        # A selection is pushed into the query: explicit chapters are filtered by
+        # the API, ranges and "latest N" page in the order that reaches them
+        # first and stop as soon as no further chapter can be selected
+        selection = parse_selection(selection)
+        descending = bool(selection and selection.descending())
+        numbers = selection.chapter_numbers() if selection else None
         offset = 0
         all_chapters = []
         while True:
             params = {
                 "manga": manga_id,
                 "translatedLanguage[]": [language] if language != 'all' else None,
-                "order[chapter]": "asc",
+                "chapter[]": numbers,
+                "includes[]": ["scanlation_group"],
+                "order[chapter]": "desc" if descending else "asc",
                 "limit": 100,
                 "offset": offset
             }
@@ -40,48 +53,77 @@ class MangaDexScraper(BaseScraper):
             resp.raise_for_status()
             data = resp.json()
             for ch in data["data"]:
-                all_chapters.append({
-                    "id": ch["id"],
-                    "chapter": ch["attributes"].get("chapter", "?"),
-                    "title": ch["attributes"].get("title", ""),
-                    "lang": ch["attributes"].get("translatedLanguage", "")
-                })
+                attrs = ch["attributes"]
+                group = next((rel.get("attributes", {}).get("name") for rel in ch.get("relationships", [])
+                              if rel["type"] == "scanlation_group"), None)
+                all_chapters.append(ChapterRecord(
+                    id=ch["id"],
+                    chapter=attrs.get("chapter") or "?",
+                    title=attrs.get("title", ""),
+                    volume=attrs.get("volume"),
+                    lang=attrs.get("translatedLanguage", ""),
+                    group=group,
+                    pages=attrs.get("pages", 1),
+                    published=attrs.get("publishAt") or attrs.get("readableAt")
+                ))
             if len(data["data"]) < 100:
                 break
+            if selection and selection.listing_done([ch["chapter"] for ch in all_chapters], descending):
+                break
             offset += 100
-        # Deduplicate: only one translation per chapter number
-        seen = set()
-        for ch in all_chapters:
-            ch_num = ch["chapter"]
-            if ch_num in seen:
-                continue
-            seen.add(ch_num)
-            chapters.append(ch)
+        # Deduplicate: one upload per chapter number, picked by group/language/upload preferences
+        chapters = dedupe_chapters(all_chapters)
+        if selection:
+            chapters = selection.apply(chapters)
+            if descending:
+                sort_chapters(chapters)
         return chapters
 
-    def download_chapter(self, chapter_id: str, dest_folder: str) -> bool:
+    def get_cover_url(self, url: str):
+        """The ``cover_art`` of the title, as the CDN's 256 px wide rendition."""
+        try:
+            manga_id = url.split("/title/")[1].split("/")[0]
+        except Exception:
+            raise ValueError("Invalid MangaDex URL")
+        resp = requests.get(f"{self.API_URL}/manga/{manga_id}", params={"includes[]": ["cover_art"]})
+        resp.raise_for_status()
+        file_name = next((rel.get("attributes", {}).get("fileName")
+                          for rel in resp.json()["data"].get("relationships", [])
+                          if rel["type"] == "cover_art"), None)
+        return f"{self.CDN_URL}/covers/{manga_id}/{file_name}.256.jpg" if file_name else None
+
+    def get_image_urls(self, chapter_id: str):
         # Get server info
         resp = requests.get(f"{self.API_URL}/at-home/server/{chapter_id}")
         if resp.status_code != 200:
-            return False
+            return []
         data = resp.json()
         base_url = data["baseUrl"]
         chapter = data["chapter"]
         hash_ = chapter["hash"]
-        pages = chapter["data"]
+        return [f"{base_url}/data/{hash_}/{page}" for page in chapter["data"]]
+
+    def download_chapter(self, chapter_id: str, dest_folder: str) -> bool:
+        return self.download_pages(chapter_id, self.get_image_urls(chapter_id), dest_folder)
+
+    def download_pages(self, chapter_id, image_urls, dest_folder):
+        if image_urls is None:
+            return self.download_chapter(chapter_id, dest_folder)
+        if not image_urls:
+            return False
         # Sanitize dest_folder
         safe_folder = os.path.sep.join(sanitize_filename(part) for part in dest_folder.split(os.path.sep))
         os.makedirs(safe_folder, exist_ok=True)
-        for i, page in enumerate(pages):
-            img_url = f"{base_url}/data/{hash_}/{page}"
+        manifest = ChapterManifest(safe_folder, chapter_id)
+        missing = []
+        for i, img_url in enumerate(image_urls):
+            page = img_url.rsplit("/", 1)[1]
             img_path = os.path.join(safe_folder, f"{i+1:03d}_{page}")
-            if os.path.exists(img_path):
-                continue  # Skip duplicates
-            img_resp = requests.get(img_url, stream=True)
-            if img_resp.status_code == 200:
-                with open(img_path, "wb") as f:
-                    for chunk in img_resp.iter_content(1024):
-                        f.write(chunk)
-            else:
-                return False
-        return True 
\ No newline at end of file
+            if manifest.stored_page(os.path.basename(img_path)) or any(
+                    os.path.exists(p) and check_file(p) for p in {img_path, target_path(img_path)}):
+                continue  # Skip pages already downloaded intact
+            missing.append((img_url, img_path))
+        if self.fetch_pages(missing, manifest):
+            manifest.save()
+            return False
+        return self.finish_chapter(manifest)
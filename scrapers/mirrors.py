@@ -0,0 +1,234 @@
+"""
+Mirror health tracking and fastest-mirror selection.
+
+Many sites answer on several domains (see ``domains`` in the site
+definitions). The first time a site is used, and again once the results are
+older than ``MIRROR_TTL``, all of its domains are probed in parallel in the
+background; requests do not wait for the probes and keep using the domain
+they name (or the last known ranking) until the results are in. The latency
+and liveness of each domain are kept in ``mirrors.json`` in the data
+directory. ``rewrite_url`` moves series, chapter and API URLs to the
+healthiest domain. A domain is only alive when its front page answers 2xx
+without redirecting to another host, so parked domains and domains that
+forward to the main site do not win the ranking.
+
+Real requests keep the numbers current: ``report_success`` folds response
+times into the latency estimate and ``report_failure`` counts consecutive
+errors (including 4xx answers to rewritten URLs, see ``fetch_page``), so a domain that degrades in the middle of a job is marked down and
+the next request moves to another mirror.
+
+Set ``WEBCOMIC_MIRRORS=0`` (or call ``configure_mirrors(False)``) to always
+use the domain from the URL.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from utils.paths import atomic_write, data_path
+
+MIRRORS_FILE = 'mirrors.json'
+MIRROR_TTL = 3600
+PROBE_TIMEOUT = 5
+# Consecutive request failures after which a mirror counts as down
+DEGRADED_AFTER = 3
+# Weight of a new sample in the latency average
+LATENCY_WEIGHT = 0.3
+# A mirror must be this much faster before URLs move off the one they name
+SWITCH_MARGIN = 0.8
+
+_enabled = True
+_ttl = MIRROR_TTL
+_health = None
+_lock = threading.RLock()
+# Domains being probed in the background
+_probing = set()
+
+
+def configure_mirrors(enabled=True, ttl=MIRROR_TTL):
+    global _enabled, _ttl
+    _enabled = enabled
+    _ttl = ttl
+
+
+def _entries():
+    global _health
+    if _health is None:
+        _health = {}
+        try:
+            with open(data_path(MIRRORS_FILE), encoding='utf-8') as f:
+                _health = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable mirror cache: {e}")
+    return _health
+
+
+def _save():
+    try:
+        atomic_write(data_path(MIRRORS_FILE), json.dumps(_health, indent=2, sort_keys=True))
+    except OSError as e:
+        print(f"Could not save mirror cache: {e}")
+
+
+def probe(domain, scheme='https', timeout=PROBE_TIMEOUT):
+    """Time a request to a domain's front page. Returns ``(alive, latency)``."""
+    import requests
+
+    from .challenge import classify
+
+    start = time.monotonic()
+    try:
+        response = requests.get(f"{scheme}://{domain}/", timeout=timeout, stream=True, headers={
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        })
+        latency = time.monotonic() - start
+        response.close()
+    except Exception:
+        return False, None
+    # A redirect to another host (parking page, the main domain) does not make this one a mirror
+    host = urlparse(response.url).netloc.lower()
+    same_host = host == domain or host == f"www.{domain}" or f"www.{host}" == domain
+    alive = (200 <= response.status_code < 300 and same_host
+             and classify(response.status_code, response.headers) is None)
+    return alive, latency
+
+
+def probe_domains(domains, scheme='https'):
+    """Probe ``domains`` in parallel and record the results."""
+    if not domains:
+        return
+    with ThreadPoolExecutor(max_workers=min(len(domains), 8)) as pool:
+        results = list(pool.map(lambda d: probe(d, scheme), domains))
+    now = time.time()
+    with _lock:
+        health = _entries()
+        for domain, (alive, latency) in zip(domains, results):
+            health[domain] = {'alive': alive, 'latency': latency, 'checked': now, 'failures': 0}
+        _save()
+
+
+def _is_stale(entry):
+    return entry is None or time.time() - entry.get('checked', 0) > _ttl
+
+
+def warm(domains, scheme='https'):
+    """Start probing the stale ``domains`` in the background; returns at once."""
+    with _lock:
+        health = _entries()
+        stale = [d for d in domains if _is_stale(health.get(d)) and d not in _probing]
+        if not stale:
+            return None
+        _probing.update(stale)
+
+    def run():
+        try:
+            probe_domains(stale, scheme)
+        finally:
+            with _lock:
+                _probing.difference_update(stale)
+    thread = threading.Thread(target=run, name='mirror-probe', daemon=True)
+    thread.start()
+    return thread
+
+
+def ranked_domains(domains, scheme='https'):
+    """``domains`` that are up, fastest first, as far as is known now.
+
+    Stale domains are probed in the background; domains never probed are
+    left out until their results are in.
+    """
+    warm(domains, scheme)
+    with _lock:
+        health = _entries()
+        up = [d for d in domains if health.get(d, {}).get('alive')]
+        return sorted(up, key=lambda d: health[d].get('latency') or float('inf'))
+
+
+def _site_domains(url):
+    from .site_config import get_site_config_for_url
+
+    _, config = get_site_config_for_url(url)
+    return config['domains'] if config else []
+
+
+def rewrite_url(url):
+    """Move ``url`` to the healthiest mirror of its site, if that is a different domain."""
+    if not _enabled:
+        return url
+    domains = _site_domains(url)
+    if len(domains) < 2:
+        return url
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    ranked = ranked_domains(domains, parsed.scheme or 'https')
+    if not ranked:
+        return url
+    current = next((d for d in domains if d in host), None)
+    best = ranked[0]
+    if current == best:
+        return url
+    if current in ranked:
+        # Stay on a healthy domain unless the best one is clearly faster
+        with _lock:
+            health = _entries()
+            if (health[best].get('latency') or 0) > (health[current].get('latency') or 0) * SWITCH_MARGIN:
+                return url
+    return parsed._replace(netloc=best).geturl()
+
+
+def _domain_for(url):
+    host = urlparse(url).netloc.lower()
+    for domain in _site_domains(url):
+        if domain in host:
+            return domain
+    return None
+
+
+def report_success(url, latency):
+    """Fold a real response time into a mirror's health."""
+    domain = _domain_for(url) if _enabled else None
+    if domain is None:
+        return
+    with _lock:
+        entry = _entries().get(domain)
+        if entry is None:
+            return
+        entry['failures'] = 0
+        if not entry.get('alive'):
+            entry['alive'] = True
+            _save()
+        old = entry.get('latency')
+        entry['latency'] = latency if old is None else (1 - LATENCY_WEIGHT) * old + LATENCY_WEIGHT * latency
+
+
+def report_failure(url):
+    """Count a failed request; a mirror that keeps failing is marked down."""
+    domain = _domain_for(url) if _enabled else None
+    if domain is None:
+        return
+    with _lock:
+        entry = _entries().setdefault(domain, {'alive': True, 'latency': None, 'checked': time.time()})
+        entry['failures'] = entry.get('failures', 0) + 1
+        if entry['alive'] and entry['failures'] >= DEGRADED_AFTER:
+            entry['alive'] = False
+            entry['checked'] = time.time()
+            print(f"Mirror {domain} is failing; switching to another domain")
+            _save()
+
+
+def domains_changed(domains):
+    """Drop health data of changed domains so they are probed again."""
+    with _lock:
+        health = _entries()
+        for domain in domains:
+            health.pop(domain, None)
+        _save()
+
+
+if os.environ.get('WEBCOMIC_MIRRORS') == '0':
+    configure_mirrors(False)
@@ -0,0 +1,171 @@
+"""
+Chapter selection: ranges, explicit chapters and the latest N.
+
+A selection is written as a comma-separated list of chapter numbers
+(``7.5``), ranges (``150-200``, ``150-`` or ``-20``) and ``latest N``::
+
+    150-200
+    1,3,7.5,10-12
+    latest 10
+    100-, latest 5
+
+Scrapers take it as the ``selection`` argument of ``get_chapters`` and only
+return the chapters it selects, so unselected chapters are never resolved
+or downloaded. Scrapers whose chapter list is paged (the MangaDex API) also
+use it to pick the listing order and stop paging once nothing further can
+be selected. ``latest N`` applies after the other parts: the N highest
+numbered chapters among those they select.
+"""
+
+import inspect
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from .chapter_numbers import chapter_sort_key
+
+_LATEST = re.compile(r'^(?:latest|last)\s*:?\s*(\d+)$')
+_RANGE = re.compile(r'^([^-]*)-([^-]*)$')
+
+
+def _key(number):
+    """Comparable (chapter, part) of a chapter number; specials compare below every number."""
+    key = chapter_sort_key(number)
+    return key.chapter, key.part
+
+
+def _text(key):
+    number, part = key
+    text = str(int(number)) if number.is_integer() else str(number)
+    return text + chr(ord('a') + part - 1) if part else text
+
+
+def _number_key(text, spec):
+    text = text.strip()
+    key = chapter_sort_key(text)
+    if not text or key.special or key.chapter < 0:
+        raise ValueError(f"invalid chapter number '{text}' in '{spec}'")
+    return key.chapter, key.part
+
+
+@dataclass
+class ChapterSelection:
+    text: str = ''
+    # (low, high) keys, either side None for an open end
+    ranges: List[Tuple] = field(default_factory=list)
+    numbers: set = field(default_factory=set)
+    latest: Optional[int] = None
+
+    def __str__(self):
+        return self.text
+
+    @property
+    def filtered(self):
+        """True if chapters are picked by number, not only by ``latest``."""
+        return bool(self.ranges or self.numbers)
+
+    def _selects(self, key):
+        if not self.filtered or key in self.numbers:
+            return True
+        # Ranges only cover numbered chapters
+        return key[0] >= 0 and any((low is None or key >= low) and (high is None or key <= high) for low, high in self.ranges)
+
+    def matches(self, chapter):
+        """True if ``chapter`` passes the ranges and numbers (``latest`` is applied by ``apply``)."""
+        return self._selects(_key(chapter.get('chapter')))
+
+    def apply(self, chapters):
+        """The selected chapters, in their original order."""
+        selected = [ch for ch in chapters if self.matches(ch)]
+        if self.latest is not None:
+            keep = set(sorted({_key(ch.get('chapter')) for ch in selected}, reverse=True)[:self.latest])
+            selected = [ch for ch in selected if _key(ch.get('chapter')) in keep]
+        return selected
+
+    def descending(self):
+        """True if a paged listing should run from the newest chapter down."""
+        if self.latest is not None:
+            return True
+        # Only open-ended "N-" ranges: everything selected is at the top
+        return bool(self.ranges) and not self.numbers and all(high is None for _, high in self.ranges)
+
+    def chapter_numbers(self):
+        """The chapter numbers as text if the selection is only an explicit list, else None."""
+        if self.ranges or self.latest is not None or not self.numbers:
+            return None
+        return [_text(key) for key in sorted(self.numbers)]
+
+    def listing_done(self, seen, descending):
+        """True once a listing in this order cannot yield further selected chapters.
+
+        ``seen`` are the chapter numbers listed so far, in listing order.
+        """
+        keys = [_key(number) for number in seen]
+        keys = [key for key in keys if key[0] >= 0]  # specials are listed out of order
+        if not keys:
+            return False
+        last = keys[-1]
+        if descending:
+            if self.latest is not None:
+                # Every upload of the N-th newest selected chapter has to be seen
+                selected = sorted({key for key in keys if self._selects(key)}, reverse=True)
+                if len(selected) >= self.latest and last < selected[self.latest - 1]:
+                    return True
+            if not self.filtered:
+                return False
+            lows = [low for low, _ in self.ranges] + list(self.numbers)
+            return None not in lows and last < min(lows)
+        if not self.filtered or self.latest is not None:
+            return False
+        highs = [high for _, high in self.ranges] + list(self.numbers)
+        return None not in highs and last > max(highs)
+
+
+def parse_selection(spec):
+    """Parse a selection such as ``"150-200"`` or ``"latest 10"``; None for an empty one.
+
+    Raises ``ValueError`` for text that is not a selection.
+    """
+    if spec is None or isinstance(spec, ChapterSelection):
+        return spec
+    spec = spec.strip()
+    if not spec or spec.lower() == 'all':
+        return None
+    selection = ChapterSelection(text=spec)
+    for part in spec.split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        latest = _LATEST.match(part)
+        if latest:
+            selection.latest = int(latest.group(1))
+            continue
+        match = _RANGE.match(part)
+        if match:
+            low, high = match.groups()
+            if not low.strip() and not high.strip():
+                raise ValueError(f"empty range in '{spec}'")
+            low = _number_key(low, spec) if low.strip() else None
+            high = _number_key(high, spec) if high.strip() else None
+            if low is not None and high is not None and low > high:
+                low, high = high, low
+            selection.ranges.append((low, high))
+        else:
+            selection.numbers.add(_number_key(part, spec))
+    return selection
+
+
+def apply_selection(chapters, selection):
+    """Filter ``chapters`` by ``selection`` (a ``ChapterSelection``, its text or None)."""
+    selection = parse_selection(selection)
+    return selection.apply(chapters) if selection else chapters
+
+
+def list_chapters(scraper, url, language='en', selection=None):
+    """``scraper.get_chapters`` with a selection, also for plugin scrapers that take none."""
+    selection = parse_selection(selection)
+    if selection is None:
+        return scraper.get_chapters(url, language)
+    if 'selection' in inspect.signature(scraper.get_chapters).parameters:
+        return scraper.get_chapters(url, language, selection=selection)
+    return selection.apply(scraper.get_chapters(url, language))
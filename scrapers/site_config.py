@@ -1,165 +1,274 @@
 """
 Configuration for different scanlation sites and their domains.
 This makes it easy to add new sites and handle domain changes.
+
+Sites are defined in JSON (or YAML, with PyYAML installed) files, one per
+site, named after the site id:
+
+- ``scrapers/sites/`` ships the built-in definitions
+- ``sites/`` in the data directory and ``WEBCOMIC_SITES_DIR`` are read
+  afterwards, so a file there can add a site or override single keys of a
+  shipped one (new domains, selectors, rate limits, ``max_connections``)
+  without a code change
+
+A definition may ``extend`` another site to inherit its selectors. Every
+definition is validated, which includes parsing each selector so a typo is
+reported at load time rather than on the first chapter (the scrapers pass
+the selector strings on; soupsieve keeps its own cache of compiled
+selectors). The validated result is cached in ``site_cache.json`` in the data directory with the
+source files' sizes and modification times, so later startups skip parsing
+and validation until a file changes.
 """
 
-# Configuration for different scanlation sites
-SITE_CONFIGS = {
-    "asura_scans": {
-        "name": "Asura Scans",
-        "domains": [
-            "asurascanlation.com",
-            "asurascans.com",
-            "asura.gg",
-            "asura.xyz",
-            "asurascans.net",
-            "asurascans.org"
-        ],
-        "scraper_class": "AsuraScansScraper",
-        "chapter_selectors": [
-            '.wp-manga-chapter-list a',
-            '.chapter-item a',
-            '.chapters a',
-            '.manga-chapters a',
-            '.chapter-list a',
-            '.wp-manga-chapter-list-item a',
-            '.manga-chapter-list a',
-            '.chapter-list-item a',
-            '.chapter-name a',
-            '.chapter-title a',
-            '.chapter-link',
-            '.wp-manga-chapter-name a',
-            '.wp-manga-chapter a',
-            '.manga-chapter a',
-            '.chapter a',
-            '.wp-manga-chapter-list .chapter a',
-            '.manga-chapter-list .chapter a'
-        ],
-        "image_selectors": [
-            '.reading-content img',
-            '.chapter-content img',
-            '.manga-chapter-content img',
-            '.wp-manga-chapter-content img',
-            '.reading-content .page-break img',
-            '.chapter-content .page-break img',
-            '.manga-chapter-content img',
-            '.chapter-images img',
-            '.manga-images img',
-            '.wp-manga-chapter-content .page-break img',
-            '.manga-chapter-content .page-break img'
-        ]
-    },
-    
-    "reaper_scans": {
-        "name": "Reaper Scans",
-        "domains": [
-            "reaperscans.com",
-            "reaperscans.net",
-            "reaperscans.org"
-        ],
-        "scraper_class": "WordPressMangaScraper",
-        "chapter_selectors": [
-            '.wp-manga-chapter-list a',
-            '.chapter-item a',
-            '.chapters a',
-            '.manga-chapters a',
-            '.chapter-list a',
-            '.wp-manga-chapter-list-item a',
-            '.manga-chapter-list a',
-            '.chapter-list-item a',
-            '.chapter-name a',
-            '.chapter-title a',
-            '.chapter-link',
-            '.wp-manga-chapter-name a'
-        ],
-        "image_selectors": [
-            '.reading-content img',
-            '.chapter-content img',
-            '.manga-chapter-content img',
-            '.wp-manga-chapter-content img',
-            '.reading-content .page-break img',
-            '.chapter-content .page-break img'
-        ]
-    },
-    
-    "flame_scans": {
-        "name": "Flame Scans",
-        "domains": [
-            "flamescans.org",
-            "flamescans.com",
-            "flamescans.net"
-        ],
-        "scraper_class": "WordPressMangaScraper",
-        "chapter_selectors": [
-            '.wp-manga-chapter-list a',
-            '.chapter-item a',
-            '.chapters a',
-            '.manga-chapters a',
-            '.chapter-list a',
-            '.wp-manga-chapter-list-item a',
-            '.manga-chapter-list a',
-            '.chapter-list-item a',
-            '.chapter-name a',
-            '.chapter-title a',
-            '.chapter-link',
-            '.wp-manga-chapter-name a'
-        ],
-        "image_selectors": [
-            '.reading-content img',
-            '.chapter-content img',
-            '.manga-chapter-content img',
-            '.wp-manga-chapter-content img',
-            '.reading-content .page-break img',
-            '.chapter-content .page-break img'
-        ]
-    }
+import json
+import os
+import re
+from urllib.parse import urlparse
+
+from utils.paths import DATA_DIR, atomic_write, data_path
+
+SITES_DIR = os.path.join(os.path.dirname(__file__), 'sites')
+CACHE_NAME = 'site_cache.json'
+CACHE_VERSION = 1
+SITE_EXTENSIONS = ('.json', '.yaml', '.yml')
+
+# Site used for WordPress sites without a definition of their own
+DEFAULT_SITE = 'wordpress'
+
+CHAPTER_API_STRATEGIES = ('ajax', 'rest', 'admin-ajax')
+IMAGE_API_STRATEGIES = ('rest',)
+
+DEFAULTS = {
+    'name': None,
+    'domains': [],
+    'scraper_class': 'WordPressMangaScraper',
+    'extends': None,
+    'chapter_selectors': [],
+    'image_selectors': [],
+    'chapter_api': list(CHAPTER_API_STRATEGIES),
+    'image_api': list(IMAGE_API_STRATEGIES),
+    'request_delay': None,
+    'max_connections': None,
 }
 
+
+class SiteConfigError(ValueError):
+    """A site definition that cannot be used."""
+
+
+# Configuration for different scanlation sites, filled by load_site_configs()
+SITE_CONFIGS = {}
+
+_domain_pattern = None
+_domain_sites = {}
+
+
+def site_dirs():
+    """Directories searched for site definitions, in override order."""
+    dirs = [SITES_DIR, os.path.join(DATA_DIR, 'sites')]
+    if os.environ.get('WEBCOMIC_SITES_DIR'):
+        dirs.append(os.environ['WEBCOMIC_SITES_DIR'])
+    return dirs
+
+
+def site_files():
+    files = []
+    for folder in site_dirs():
+        if os.path.isdir(folder):
+            files += [os.path.join(folder, name) for name in sorted(os.listdir(folder))
+                      if name.lower().endswith(SITE_EXTENSIONS)]
+    return files
+
+
+def read_site_file(path):
+    with open(path, encoding='utf-8') as f:
+        if path.lower().endswith('.json'):
+            data = json.load(f)
+        else:
+            try:
+                import yaml
+            except ImportError:
+                raise SiteConfigError("PyYAML is required for YAML site definitions")
+            data = yaml.safe_load(f)
+    if not isinstance(data, dict):
+        raise SiteConfigError("a site definition must be a mapping")
+    return data
+
+
+def _string_list(site_id, key, value):
+    if not isinstance(value, list) or not all(isinstance(v, str) and v.strip() for v in value):
+        raise SiteConfigError(f"{site_id}: '{key}' must be a list of non-empty strings")
+    return [v.strip() for v in value]
+
+
+def validate_site(site_id, config):
+    """Check a merged definition, including that its selectors parse. Returns the normalized config."""
+    import soupsieve
+
+    unknown = set(config) - set(DEFAULTS)
+    if unknown:
+        raise SiteConfigError(f"{site_id}: unknown keys {', '.join(sorted(unknown))}")
+    site = dict(config)
+    site['name'] = site['name'] or site_id
+    if not isinstance(site['name'], str) or not isinstance(site['scraper_class'], str):
+        raise SiteConfigError(f"{site_id}: 'name' and 'scraper_class' must be strings")
+    site['domains'] = [d.lower() for d in _string_list(site_id, 'domains', site['domains'])]
+    for key in ('chapter_selectors', 'image_selectors'):
+        site[key] = _string_list(site_id, key, site[key])
+        for selector in site[key]:
+            try:
+                soupsieve.compile(selector)
+            except Exception as e:
+                raise SiteConfigError(f"{site_id}: invalid selector '{selector}': {e}")
+    for key, known in (('chapter_api', CHAPTER_API_STRATEGIES), ('image_api', IMAGE_API_STRATEGIES)):
+        site[key] = _string_list(site_id, key, site[key])
+        bad = [s for s in site[key] if s not in known]
+        if bad:
+            raise SiteConfigError(f"{site_id}: unknown {key} strategies {', '.join(bad)}")
+    delay = site['request_delay']
+    if delay is not None:
+        if (not isinstance(delay, list) or len(delay) != 2
+                or not all(isinstance(d, (int, float)) for d in delay) or not 0 <= delay[0] <= delay[1]):
+            raise SiteConfigError(f"{site_id}: 'request_delay' must be [min, max] seconds")
+    limit = site['max_connections']
+    if limit is not None and (not isinstance(limit, int) or limit < 1):
+        raise SiteConfigError(f"{site_id}: 'max_connections' must be a positive integer")
+    return site
+
+
+def compile_sites(files):
+    """Read, merge and validate definitions; broken sites are reported and skipped."""
+    raw = {}
+    for path in files:
+        site_id = os.path.splitext(os.path.basename(path))[0]
+        try:
+            data = read_site_file(path)
+        except (OSError, ValueError) as e:
+            print(f"Skipping site definition {path}: {e}")
+            continue
+        # Later directories override single keys of earlier definitions
+        raw.setdefault(data.pop('id', site_id), {}).update(data)
+
+    sites = {}
+
+    def resolve(site_id, seen=()):
+        if site_id in sites:
+            return sites[site_id]
+        if site_id in seen:
+            raise SiteConfigError(f"{site_id}: circular 'extends'")
+        config = raw[site_id]
+        base = dict(DEFAULTS)
+        parent = config.get('extends')
+        if parent:
+            if parent not in raw:
+                raise SiteConfigError(f"{site_id}: extends unknown site '{parent}'")
+            inherited = resolve(parent, seen + (site_id,))
+            base.update({k: inherited[k] for k in ('chapter_selectors', 'image_selectors', 'chapter_api',
+                                                    'image_api', 'request_delay', 'scraper_class')})
+        base.update(config)
+        sites[site_id] = validate_site(site_id, base)
+        return sites[site_id]
+
+    for site_id in raw:
+        try:
+            resolve(site_id)
+        except SiteConfigError as e:
+            print(f"Skipping site definition: {e}")
+    return sites
+
+
+def _fingerprint(files):
+    stamps = []
+    for path in files:
+        stat = os.stat(path)
+        stamps.append([path, stat.st_mtime_ns, stat.st_size])
+    return stamps
+
+
+def load_site_configs(use_cache=True):
+    """(Re)load every site definition into ``SITE_CONFIGS``."""
+    files = site_files()
+    fingerprint = [CACHE_VERSION] + _fingerprint(files)
+    sites = None
+    cache_path = os.path.join(DATA_DIR, CACHE_NAME)
+    if use_cache:
+        try:
+            with open(cache_path, encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('fingerprint') == fingerprint:
+                sites = cached['sites']
+        except (OSError, ValueError, KeyError):
+            pass
+    if sites is None:
+        sites = compile_sites(files)
+        if use_cache:
+            try:
+                atomic_write(data_path(CACHE_NAME), json.dumps({'fingerprint': fingerprint, 'sites': sites}))
+            except OSError as e:
+                print(f"Could not cache site definitions: {e}")
+    SITE_CONFIGS.clear()
+    SITE_CONFIGS.update(sites)
+    _index_domains()
+    return SITE_CONFIGS
+
+
+def _index_domains():
+    """Compile all known domains into one pattern; longer domains win over their suffixes."""
+    global _domain_pattern, _domain_sites
+    domain_sites = {}
+    for site_id, config in SITE_CONFIGS.items():
+        for domain in config['domains']:
+            domain_sites.setdefault(domain, site_id)
+    domains = sorted(domain_sites, key=len, reverse=True)
+    _domain_sites = domain_sites
+    _domain_pattern = re.compile('|'.join(map(re.escape, domains))) if domains else None
+
+
 def get_site_config_for_url(url: str):
     """Get the site configuration for a given URL."""
-    from urllib.parse import urlparse
-    
-    parsed_url = urlparse(url)
-    domain = parsed_url.netloc.lower()
-    
-    for site_id, config in SITE_CONFIGS.items():
-        for known_domain in config["domains"]:
-            if known_domain in domain:
-                return site_id, config
-    
-    return None, None
+    domain = urlparse(url).netloc.lower()
+    match = _domain_pattern.search(domain) if _domain_pattern and domain else None
+    if not match:
+        return None, None
+    site_id = _domain_sites[match.group(0)]
+    return site_id, SITE_CONFIGS[site_id]
+
+
+def get_site_config(site_id: str):
+    """Get the configuration of a site by id, or None."""
+    return SITE_CONFIGS.get(site_id)
+
+
+def host_limits():
+    """Per-domain concurrency caps for the batch queue."""
+    limits = {}
+    for config in SITE_CONFIGS.values():
+        if config.get('max_connections'):
+            for domain in config['domains']:
+                limits.setdefault(domain, config['max_connections'])
+    return limits
+
 
 def add_site_config(site_id: str, name: str, domains: list, scraper_class: str = "WordPressMangaScraper"):
     """Add a new site configuration."""
-    SITE_CONFIGS[site_id] = {
-        "name": name,
-        "domains": domains,
-        "scraper_class": scraper_class,
-        "chapter_selectors": [
-            '.wp-manga-chapter-list a',
-            '.chapter-item a',
-            '.chapters a',
-            '.manga-chapters a',
-            '.chapter-list a',
-            '.wp-manga-chapter-list-item a',
-            '.manga-chapter-list a',
-            '.chapter-list-item a',
-            '.chapter-name a',
-            '.chapter-title a',
-            '.chapter-link',
-            '.wp-manga-chapter-name a'
-        ],
-        "image_selectors": [
-            '.reading-content img',
-            '.chapter-content img',
-            '.manga-chapter-content img',
-            '.wp-manga-chapter-content img',
-            '.reading-content .page-break img',
-            '.chapter-content .page-break img'
-        ]
-    }
+    config = dict(DEFAULTS, name=name, domains=domains, scraper_class=scraper_class)
+    default = SITE_CONFIGS.get(DEFAULT_SITE)
+    if default:
+        config.update(extends=DEFAULT_SITE, chapter_selectors=default['chapter_selectors'],
+                      image_selectors=default['image_selectors'])
+    SITE_CONFIGS[site_id] = validate_site(site_id, config)
+    _index_domains()
+
 
 def update_site_domains(site_id: str, new_domains: list):
-    """Update domains for an existing site."""
+    """Update domains for an existing site; the mirror manager probes them afresh."""
     if site_id in SITE_CONFIGS:
-        SITE_CONFIGS[site_id]["domains"] = new_domains 
\ No newline at end of file
+        from .mirrors import domains_changed
+
+        old_domains = SITE_CONFIGS[site_id]["domains"]
+        SITE_CONFIGS[site_id]["domains"] = [d.lower() for d in new_domains]
+        _index_domains()
+        domains_changed(set(old_domains) ^ set(SITE_CONFIGS[site_id]["domains"]))
+
+
+load_site_configs()
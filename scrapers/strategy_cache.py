@@ -0,0 +1,92 @@
+"""
+Persistent per-domain memory of which scraping strategy worked.
+
+Scrapers fall back through chains of strategies: API endpoints, CSS
+selectors, script regexes, heuristics. Sites rarely change between chapters,
+so the winner for each domain and kind (``chapter_api``, ``image_selector``,
+``image_method``, ...) is stored here, tried first next time and cleared as
+soon as it fails. The cache is kept in ``strategies.json`` in the data
+directory so it survives restarts; it is only written when a winner changes.
+"""
+
+import json
+import threading
+from urllib.parse import urlparse
+
+from utils.paths import atomic_write, data_path
+
+STRATEGY_FILE = 'strategies.json'
+
+_path = None
+_persist = True
+_cache = None
+_lock = threading.RLock()
+
+
+def configure_strategy_cache(path=None, persist=True):
+    """Use ``path`` (default: the data directory) or keep the cache in memory only."""
+    global _path, _persist, _cache
+    with _lock:
+        _path = path
+        _persist = persist
+        _cache = None
+
+
+def _entries():
+    global _cache
+    if _cache is None:
+        _cache = {}
+        if _persist:
+            try:
+                with open(_path or data_path(STRATEGY_FILE), encoding='utf-8') as f:
+                    _cache = json.load(f)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable strategy cache: {e}")
+    return _cache
+
+
+def _save():
+    if not _persist:
+        return
+    try:
+        atomic_write(_path or data_path(STRATEGY_FILE), json.dumps(_cache, indent=2, sort_keys=True))
+    except OSError as e:
+        print(f"Could not save strategy cache: {e}")
+
+
+def get_strategy(domain, kind):
+    """The strategy that last worked for ``kind`` on ``domain``, or None."""
+    with _lock:
+        return _entries().get(domain, {}).get(kind)
+
+
+def set_strategy(domain, kind, strategy):
+    """Record the winning strategy; only writes the file when it changed."""
+    with _lock:
+        entries = _entries().setdefault(domain, {})
+        if entries.get(kind) != strategy:
+            entries[kind] = strategy
+            _save()
+
+
+def clear_strategy(domain, kind):
+    """Forget a winner that just failed."""
+    with _lock:
+        entries = _entries().get(domain)
+        if entries and entries.pop(kind, None) is not None:
+            if not entries:
+                del _cache[domain]
+            _save()
+
+
+def prefer(strategy, options):
+    """``options`` with ``strategy`` moved to the front when it is one of them."""
+    if strategy in options:
+        return [strategy] + [o for o in options if o != strategy]
+    return list(options)
+
+
+def domain_of(url):
+    return urlparse(url).netloc.lower()
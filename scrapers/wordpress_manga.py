@@ -1,201 +1,164 @@
-import os
 import re
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from utils import cpu_tasks
 from .base import BaseScraper
+from .challenge import BlockedError
+from .chapter_index import ChapterRecord, dedupe_chapters
+from . import js_extract
+from .chapter_numbers import sort_chapters
+from .selection import apply_selection
+from .wp_api import WordPressAPI
 
 class WordPressMangaScraper(BaseScraper):
     """Generic scraper for WordPress-based manga sites using common patterns."""
     
+    SITE_ID = 'wordpress'
+    
     def can_handle(self, url: str) -> bool:
         """Check if this is a WordPress-based manga site."""
         try:
-            soup = self.get_page_content(url)
-            if not soup:
+            html = self.fetch_page(url)
+            if not html:
                 return False
             
-            # Check for common WordPress indicators
-            wp_indicators = [
-                'wp-content',
-                'wp-includes', 
-                'wordpress',
-                'wp-manga',
-                'madara'
-            ]
-            
-            # Check for manga-specific indicators
-            manga_indicators = [
-                'chapter',
-                'manga',
-                'manhwa',
-                'manhua'
-            ]
-            
-            page_text = soup.get_text().lower()
-            html_content = str(soup).lower()
-            
-            has_wp = any(indicator in html_content for indicator in wp_indicators)
-            has_manga = any(indicator in page_text for indicator in manga_indicators)
-            
-            return has_wp and has_manga
+            # Look for WordPress and manga-specific indicators
+            return self.run_cpu(cpu_tasks.looks_like_wp_manga, html)
             
         except Exception:
             return False
     
-    def get_chapters(self, url: str, language: str = 'en'):
+    def get_chapters(self, url: str, language: str = 'en', selection=None):
         """Extract chapters from WordPress manga site."""
         try:
-            soup = self.get_page_content(url)
-            if not soup:
+            chapters = []
+            
+            # Madara ajax/REST endpoints answer without rendering the series page
+            api = WordPressAPI(self)
+            chapter_links, html = api.chapter_links_or_page(url)
+            all_links = []
+            if chapter_links is None and not html:
                 return []
             
-            chapters = []
+            # Selectors of the site definition (scrapers/sites/*.json)
+            chapter_selectors = self.site_setting(url, 'chapter_selectors', [])
             
-            # Realistic selectors used by common WordPress manga themes
-            chapter_selectors = [
-                'a[href*="chapter"]',
-                '.wp-manga-chapter a',
-                '.chapter-item a',
-                '.chapters a',
-                '.manga-chapters a',
-                '.chapter-list a',
-                '.wp-manga-chapter-list a',
-                '.manga-chapter-list a',
-                '.chapter-list-item a',
-                '.wp-manga-chapter-list-item a',
-                '.chapter-name a',
-                '.chapter-title a',
-                '.chapter-link',
-                '.wp-manga-chapter-name a',
-                '.manga-chapter a',
-                '.chapter a',
-                '.wp-manga-chapter-list .chapter a',
-                '.manga-chapter-list .chapter a'
-            ]
+            from_html = chapter_links is None
+            if from_html:
+                # Links of the first selector that matches, parsed off the I/O thread
+                chapter_links, all_links, selector = self.run_cpu(
+                    cpu_tasks.select_links, html, self.preferred_order(url, 'chapter_selector', chapter_selectors))
+                self.remember_strategy(url, 'chapter_selector', selector)
             
-            # Try each selector until we find chapters
-            for selector in chapter_selectors:
-                chapter_links = soup.select(selector)
-                if chapter_links:
-                    for link in chapter_links:
-                        href = link.get('href', '')
-                        if href and ('chapter' in href.lower() or 'ch' in href.lower()):
-                            chapter_text = link.get_text().strip()
-                            chapter_num = self.extract_chapter_number(chapter_text)
-                            
-                            chapters.append({
-                                'id': href,
-                                'chapter': chapter_num,
-                                'title': chapter_text,
-                                'lang': language
-                            })
-                    break
+            for href, chapter_text in chapter_links:
+                if href and ('chapter' in href.lower() or 'ch' in href.lower()):
+                    chapter_num = self.extract_chapter_number(chapter_text)
+                    
+                    chapters.append(ChapterRecord(
+                        id=href,
+                        chapter=chapter_num,
+                        title=chapter_text,
+                        lang=language
+                    ))
             
             # If no chapters found with selectors, try a more generic approach
             if not chapters:
-                all_links = soup.find_all('a', href=True)
-                for link in all_links:
-                    href = link.get('href', '')
-                    text = link.get_text().strip()
-                    
+                for href, text in all_links:
                     # Look for chapter patterns in both href and text
                     if (('chapter' in href.lower() or 'ch' in href.lower()) and 
                         ('chapter' in text.lower() or re.search(r'ch\.?\s*\d+', text.lower()))):
                         
                         chapter_num = self.extract_chapter_number(text)
-                        chapters.append({
-                            'id': href,
-                            'chapter': chapter_num,
-                            'title': text,
-                            'lang': language
-                        })
+                        chapters.append(ChapterRecord(
+                            id=href,
+                            chapter=chapter_num,
+                            title=text,
+                            lang=language
+                        ))
+            
+            # The page changed since scraping won over the API: give the API another chance
+            if from_html and not chapters and api.forget_html(url, 'chapter_api'):
+                from_html = False
+                chapters = [ChapterRecord(id=href, chapter=self.extract_chapter_number(text), title=text, lang=language)
+                            for href, text in api.get_chapter_links(url, html) or []]
+            
+            # Skip the API on later refreshes when only the page works
+            if from_html and chapters:
+                api.mark_html(url, 'chapter_api')
+            
+            # The same anchor often appears in several page sections
+            chapters = dedupe_chapters(chapters)
             
             # Sort chapters by number
-            chapters.sort(key=lambda x: float(x['chapter']) if x['chapter'].replace('.', '').isdigit() else 0)
+            sort_chapters(chapters)
             
-            return chapters
+            # Unselected chapters are dropped before any of their pages is fetched
+            return apply_selection(chapters, selection)
             
+        except BlockedError:
+            # The caller tells a wall apart from a series without chapters
+            raise
         except Exception as e:
             print(f"Error getting chapters: {e}")
             return []
     
+    def get_image_urls(self, chapter_url: str):
+        """Resolve the page image URLs of a WordPress manga chapter."""
+        # Sites that publish chapters as posts serve just the content over the REST API
+        api = WordPressAPI(self)
+        content = api.get_chapter_content(chapter_url)
+        if content:
+            images = self.run_cpu(cpu_tasks.select_images, content, ['img'])[0]
+            image_urls = self.resolve_image_urls(images, chapter_url)
+            if image_urls:
+                return image_urls
+        
+        try:
+            html = self.fetch_page(chapter_url)
+        except BlockedError:
+            # The reader page is walled off; the REST API often is not
+            content = api.get_chapter_content(chapter_url, ignore_html=True)
+            if not content:
+                raise
+            html = content
+        if not html:
+            return []
+        
+        # Find image containers
+        image_selectors = self.site_setting(chapter_url, 'image_selectors', [])
+        
+        # The selector that matched on earlier chapters of this site is tried first
+        images, all_images, scripts, selector = self.run_cpu(
+            cpu_tasks.select_images, html, self.preferred_order(chapter_url, 'image_selector', image_selectors),
+            True)
+        self.remember_strategy(chapter_url, 'image_selector', selector)
+        
+        # Script-rendered readers (Next.js builds, ts_reader) keep the page list in embedded JSON
+        if not images:
+            images = [{'src': url} for url in self.run_cpu(js_extract.find_image_urls, scripts)]
+        
+        # If no images found with selectors, try a more generic approach
+        if not images:
+            # Look for any images that might be chapter content
+            for img in all_images:
+                # Check if it's likely a chapter image (not an ad or icon)
+                parent_classes = img.get('parent_class', '')
+                if not any(ad_indicator in parent_classes.lower() for ad_indicator in ['ad', 'advertisement', 'banner', 'sidebar']):
+                    images.append(img)
+        
+        # Resolve lazy-load attributes and srcsets, dropping placeholders, in one pass
+        image_urls = self.resolve_image_urls(images, chapter_url)
+        if image_urls:
+            api.mark_html(chapter_url, 'image_api')
+        elif api.forget_html(chapter_url, 'image_api'):
+            content = api.get_chapter_content(chapter_url)
+            if content:
+                images = self.run_cpu(cpu_tasks.select_images, content, ['img'])[0]
+                image_urls = self.resolve_image_urls(images, chapter_url)
+        return image_urls
+    
     def download_chapter(self, chapter_url: str, dest_folder: str) -> bool:
         """Download chapter images from WordPress manga site."""
         try:
-            soup = self.get_page_content(chapter_url)
-            if not soup:
-                return False
-            
-            # Create destination folder
-            os.makedirs(dest_folder, exist_ok=True)
-            
-            # Find image containers
-            image_selectors = [
-                '.reading-content img',
-                '.chapter-content img',
-                '.manga-chapter-content img',
-                '.wp-manga-chapter-content img',
-                '.chapter-images img',
-                '.manga-images img',
-                '.reading-content .page-break img',
-                '.chapter-content .page-break img',
-                '.manga-chapter-content img',
-                '.wp-manga-chapter-content .page-break img',
-                '.manga-chapter-content .page-break img'
-            ]
-            
-            images = []
-            for selector in image_selectors:
-                images = soup.select(selector)
-                if images:
-                    break
-            
-            # If no images found with selectors, try a more generic approach
-            if not images:
-                # Look for any images that might be chapter content
-                all_images = soup.find_all('img')
-                for img in all_images:
-                    src = img.get('src') or img.get('data-src')
-                    if src and self.is_valid_image_url(src):
-                        # Check if it's likely a chapter image (not an ad or icon)
-                        parent_classes = ' '.join(img.parent.get('class', [])) if img.parent else ''
-                        if not any(ad_indicator in parent_classes.lower() for ad_indicator in ['ad', 'advertisement', 'banner', 'sidebar']):
-                            images.append(img)
-            
-            if not images:
-                return False
-            
-            # Download each image
-            for i, img in enumerate(images):
-                img_url = img.get('src') or img.get('data-src')
-                if not img_url:
-                    continue
-                
-                img_url = self.normalize_url(img_url, chapter_url)
-                
-                if not self.is_valid_image_url(img_url):
-                    continue
-                
-                # Generate filename
-                ext = os.path.splitext(img_url)[1] or '.jpg'
-                filename = f"{i+1:03d}{ext}"
-                filepath = os.path.join(dest_folder, filename)
-                
-                # Download image
-                try:
-                    response = self.session.get(img_url, stream=True, timeout=30)
-                    response.raise_for_status()
-                    
-                    with open(filepath, 'wb') as f:
-                        for chunk in response.iter_content(8192):
-                            f.write(chunk)
-                            
-                except Exception as e:
-                    print(f"Error downloading image {img_url}: {e}")
-                    continue
-            
-            return len(images) > 0
+            return self.download_pages(chapter_url, self.get_image_urls(chapter_url), dest_folder)
             
         except Exception as e:
             print(f"Error downloading chapter: {e}")
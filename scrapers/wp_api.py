@@ -0,0 +1,244 @@
+"""
+Shared API client for WordPress/Madara manga sites.
+
+Most WordPress manga themes can answer chapter lists and chapter content
+without rendering a full HTML page:
+
+- ``ajax``: Madara 1.7+ posts to ``<series url>/ajax/chapters/``
+- ``admin-ajax``: older Madara posts ``action=manga_get_chapters`` with the
+  series post id to ``/wp-admin/admin-ajax.php``
+- ``rest``: sites that publish every chapter as a post answer
+  ``/wp-json/wp/v2/posts``; only the needed fields are requested with
+  ``_fields=`` so responses stay small
+
+Which strategy worked is remembered per domain in the strategy cache, so
+later calls (and later runs) try it first and skip the ones that failed.
+``html`` records that a site only works with page scraping, in which case
+the API is not tried at all until scraping stops finding anything.
+"""
+
+import html as html_lib
+import re
+from urllib.parse import urlparse
+
+import requests
+
+from utils import cpu_tasks
+from . import mirrors
+from .challenge import BlockedError, check_response
+from .site_config import CHAPTER_API_STRATEGIES as CHAPTER_STRATEGIES
+from .strategy_cache import clear_strategy, domain_of, get_strategy, prefer, set_strategy
+
+HTML = 'html'
+
+# Chapter links inside the fragments returned by the Madara ajax endpoints; a fragment
+# without any is not a chapter list (other anchors there are volume toggles, sort links, ads)
+CHAPTER_LINK_SELECTORS = ['li.wp-manga-chapter a', '.wp-manga-chapter a', '.chapter-link', 'a[href*="chapter"]']
+
+REST_PAGE_SIZE = 100
+REST_MAX_PAGES = 50
+
+POST_ID_PATTERNS = (
+    re.compile(rb'id="manga-chapters-holder"[^>]*data-id="(\d+)"'),
+    re.compile(rb'class="rating-post-id"[^>]*value="(\d+)"'),
+    re.compile(rb'value="(\d+)"[^>]*class="rating-post-id"'),
+    re.compile(rb'\bpostid-(\d+)\b'),
+)
+
+def site_root(url):
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def url_slug(url):
+    """Last path segment of a URL (``/series/foo-bar/`` -> ``foo-bar``)."""
+    return urlparse(url).path.rstrip('/').rsplit('/', 1)[-1]
+
+
+def find_post_id(page):
+    """Madara series post id from a series page, or None."""
+    if isinstance(page, str):
+        page = page.encode('utf-8', 'replace')
+    for pattern in POST_ID_PATTERNS:
+        match = pattern.search(page or b'')
+        if match:
+            return match.group(1).decode()
+    return None
+
+
+class WordPressAPI:
+    """Chapter lists and chapter content through a scraper's session."""
+
+    def __init__(self, scraper):
+        self.scraper = scraper
+        self.session = scraper.session
+
+    def get_chapter_links(self, series_url, series_html=None, strategies=None, ignore_html=False):
+        """Return ``[(href, text)]`` for a series, or None when no API strategy works.
+
+        Only the site's configured ``chapter_api`` strategies are tried.
+        ``admin-ajax`` needs the series page for the post id, so it is only
+        tried when ``series_html`` is given; when it is the known winner and
+        the page has not been fetched yet, nothing else is tried.
+        ``ignore_html`` tries the API even on sites marked as scraping-only.
+        """
+        allowed = self.scraper.site_setting(series_url, 'chapter_api', CHAPTER_STRATEGIES)
+        strategies = [s for s in (strategies or allowed) if s in allowed]
+        domain = domain_of(series_url)
+        preferred = get_strategy(domain, 'chapter_api')
+        if preferred == HTML and ignore_html:
+            preferred = None
+        if preferred == HTML or (preferred == 'admin-ajax' and series_html is None):
+            return None
+        for strategy in prefer(preferred, strategies):
+            if strategy == 'admin-ajax' and series_html is None:
+                continue
+            try:
+                links = self._chapter_links(strategy, series_url, series_html)
+            except Exception as e:
+                print(f"Chapter API '{strategy}' failed for {domain}: {e}")
+                links = None
+            if links:
+                set_strategy(domain, 'chapter_api', strategy)
+                return links
+            if strategy == preferred:
+                clear_strategy(domain, 'chapter_api')
+        return None
+
+    def get_chapter_content(self, chapter_url, ignore_html=False):
+        """Return the rendered HTML of a chapter post, or None when the API has no such post."""
+        domain = domain_of(chapter_url)
+        preferred = get_strategy(domain, 'image_api')
+        if preferred == HTML and ignore_html:
+            preferred = None
+        if preferred == HTML or 'rest' not in self.scraper.site_setting(chapter_url, 'image_api', ('rest',)):
+            return None
+        try:
+            posts = self._get_json(f"{site_root(chapter_url)}/wp-json/wp/v2/posts",
+                                   {'slug': url_slug(chapter_url), '_fields': 'content'})
+            content = posts[0]['content']['rendered'] if posts else None
+        except Exception as e:
+            print(f"Chapter content API failed for {domain}: {e}")
+            content = None
+        if content:
+            set_strategy(domain, 'image_api', 'rest')
+        elif preferred:
+            clear_strategy(domain, 'image_api')
+        return content
+
+    def chapter_links_or_page(self, series_url):
+        """Return ``(links, None)`` from the API or ``(None, html)`` of the series page to scrape.
+
+        When the series page is blocked, API strategies skipped because the
+        site was marked as scraping-only are tried before giving up.
+        """
+        links = self.get_chapter_links(series_url)
+        if links is not None:
+            return links, None
+        try:
+            html = self.scraper.fetch_page(series_url)
+        except BlockedError:
+            if get_strategy(domain_of(series_url), 'chapter_api') == HTML:
+                links = self.get_chapter_links(series_url, ignore_html=True)
+                if links:
+                    return links, None
+            raise
+        # Older Madara themes need the post id from the series page
+        links = self.get_chapter_links(series_url, html, strategies=('admin-ajax',))
+        return (links, None) if links else (None, html)
+
+    def mark_html(self, url, kind):
+        """Record that page scraping, not the API, worked for ``kind`` ('chapter_api' or 'image_api')."""
+        set_strategy(domain_of(url), kind, HTML)
+
+    def forget_html(self, url, kind):
+        """Drop the scraping-only mark after scraping found nothing; True if there was one.
+
+        The caller then tries the API again, once.
+        """
+        domain = domain_of(url)
+        if get_strategy(domain, kind) != HTML:
+            return False
+        clear_strategy(domain, kind)
+        return True
+
+    def _chapter_links(self, strategy, series_url, series_html):
+        if strategy == 'ajax':
+            fragment = self._post(series_url.rstrip('/') + '/ajax/chapters/')
+            return self.scraper.run_cpu(cpu_tasks.select_links, fragment, CHAPTER_LINK_SELECTORS)[0]
+        if strategy == 'admin-ajax':
+            post_id = find_post_id(series_html)
+            if not post_id:
+                return None
+            fragment = self._post(f"{site_root(series_url)}/wp-admin/admin-ajax.php",
+                                  {'action': 'manga_get_chapters', 'manga': post_id})
+            return self.scraper.run_cpu(cpu_tasks.select_links, fragment, CHAPTER_LINK_SELECTORS)[0]
+        return self._rest_chapter_links(series_url)
+
+    def _rest_chapter_links(self, series_url):
+        """Chapter posts whose slug starts with ``<series slug>-chapter-``."""
+        slug = url_slug(series_url)
+        prefix = f"{slug}-chapter-"
+        links = []
+        page = 1
+        while page <= REST_MAX_PAGES:
+            response = self._get(f"{site_root(series_url)}/wp-json/wp/v2/posts", {
+                'search': slug.replace('-', ' '),
+                'per_page': REST_PAGE_SIZE,
+                'page': page,
+                '_fields': 'slug,link,title',
+            })
+            if response.status_code != 200:
+                break
+            posts = response.json()
+            for post in posts:
+                if post.get('slug', '').startswith(prefix):
+                    links.append((post['link'], html_lib.unescape(post['title']['rendered'])))
+            if page >= int(response.headers.get('X-WP-TotalPages', 1)):
+                break
+            page += 1
+        return links
+
+    def _get(self, url, params=None):
+        mirrored = mirrors.rewrite_url(url)
+        response = self._get_from(mirrored, params)
+        if mirrored != url and 400 <= response.status_code < 500:
+            # The mirror lacks the endpoint; it only counts against the mirror if the URL's own domain has it
+            response = self._get_from(url, params)
+            if response.ok:
+                mirrors.report_failure(mirrored)
+        return response
+
+    def _get_from(self, url, params=None):
+        self.scraper.throttle(url)
+        response = self.session.get(url, params=params, timeout=30)
+        check_response(response)
+        return response
+
+    def _get_json(self, url, params=None):
+        response = self._get(url, params)
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+    def _post(self, url, data=None):
+        mirrored = mirrors.rewrite_url(url)
+        if mirrored != url:
+            try:
+                return self._post_to(mirrored, data)
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code >= 500:
+                    raise
+            # As in _get: fall back to the URL's own domain
+            content = self._post_to(url, data)
+            mirrors.report_failure(mirrored)
+            return content
+        return self._post_to(url, data)
+
+    def _post_to(self, url, data=None):
+        self.scraper.throttle(url)
+        response = self.session.post(url, data=data or {},
+                                     headers={'X-Requested-With': 'XMLHttpRequest'}, timeout=30)
+        check_response(response)
+        response.raise_for_status()
+        return response.content
@@ -1,10 +1,42 @@
 import os
+import threading
 from PySide6.QtWidgets import (
-    QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QComboBox, QPushButton, QListWidget, QLabel, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QProgressBar, QFrame, QScrollArea
+    QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QComboBox, QPushButton, QListWidget, QLabel, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QProgressBar, QFrame, QScrollArea,
+    QInputDialog, QFileDialog
 )
-from PySide6.QtCore import Qt, QThread, Signal, QObject, QPropertyAnimation, QRect, QPropertyAnimation, QEasingCurve
+from PySide6.QtCore import Qt, QThread, QTimer, Signal, QObject, QPropertyAnimation, QRect, QPropertyAnimation, QEasingCurve
 from PySide6.QtGui import QFont, QMovie, QPixmap, QIcon
 from scrapers import get_scraper_for_url
+from scrapers.selection import list_chapters, parse_selection
+from utils.batch_queue import BatchQueue, read_url_file, record_chapter, record_series, series_title_from_url
+from utils.journal import DONE, PENDING, JobJournal, journaled_download
+from utils.memory import memory_report
+from utils.paths import data_path
+from utils.pipeline import ChapterPipeline
+from utils.thumbnails import get_thumbnail_cache
+
+# Lines kept in the status log; older ones are dropped
+MAX_LOG_LINES = 2000
+# Height of chapter thumbnails in the progress table and of the series cover
+ROW_THUMBNAIL_HEIGHT = 48
+COVER_HEIGHT = 120
+# Pause after scrolling before thumbnails of the rows in view are loaded, in ms
+THUMBNAIL_DELAY_MS = 100
+
+_journal = None
+
+
+def gui_journal():
+    """Job journal of single-series downloads started from the GUI."""
+    global _journal
+    if _journal is None:
+        _journal = JobJournal(data_path('gui_jobs.json'))
+        # Finished series are only kept for the session that downloaded them
+        for url in [u for u, e in _journal.series.items() if e['status'] == DONE]:
+            _journal.record('remove', url)
+        _journal.compact()
+    return _journal
+
 
 class DownloadWorker(QObject):
     chapters_fetched = Signal(list, str)
@@ -14,17 +46,22 @@ class DownloadWorker(QObject):
     log = Signal(str)
     finished = Signal()
 
-    def __init__(self, url, lang):
+    def __init__(self, url, lang, selection=None):
         super().__init__()
         self.url = url
         self.lang = lang
+        self.selection = selection or None
         self.scraper = None
         self.chapters = []
         self.title = None
+        self.journal = gui_journal()
+        self.pipeline = None
         self._should_stop = False
 
     def stop(self):
         self._should_stop = True
+        if self.pipeline:
+            self.pipeline.stop()
 
     def run(self):
         self.scraper = get_scraper_for_url(self.url)
@@ -33,50 +70,84 @@ class DownloadWorker(QObject):
             self.finished.emit()
             return
         try:
-            chapters = self.scraper.get_chapters(self.url, self.lang)
-            if not chapters:
-                self.log.emit("No chapters found.")
-                self.finished.emit()
-                return
+            self.title = series_title_from_url(self.url)
+            entry = self.journal.series.get(self.url)
+            if (entry and entry['chapters'] and entry['status'] == PENDING
+                    and entry.get('selection') == self.selection and entry.get('lang') == self.lang):
+                # An earlier run was interrupted: resume it instead of fetching the list again
+                self.log.emit("Resuming the interrupted download of this series.")
+            else:
+                chapters = list_chapters(self.scraper, self.url, self.lang, self.selection)
+                if not chapters:
+                    self.log.emit("No chapters found.")
+                    self.finished.emit()
+                    return
+                record_series(self.url, self.title, chapters)
+                self.journal.record('series', self.url, lang=self.lang, title=self.title, selection=self.selection)
+                if self.journal.series[self.url].get('selection') != self.selection:
+                    self.journal.record('select', self.url, selection=self.selection)
+                self.journal.record('status', self.url, status=PENDING)
+                self.journal.record('chapters', self.url, chapters=[
+                    {'id': ch['id'], 'chapter': str(ch['chapter'])} for ch in chapters])
+            chapters = self.journal.series[self.url]['chapters']
             self.chapters = chapters
-            self.title = chapters[0].get("title") or self.url.split("/title/")[-1].split("/")[1] if "/title/" in self.url else "manga"
             self.chapters_fetched.emit(chapters, self.title)
             total = len(chapters)
             completed = 0
+            jobs = []
             for i, ch in enumerate(chapters):
-                if self._should_stop:
-                    break
-                chapter_id = ch["id"]
-                chapter_num = ch["chapter"]
-                folder = os.path.join("downloads", self.title, f"Chapter_{chapter_num}")
+                if ch["status"] == DONE:
+                    self.chapter_status.emit(i, "Completed")
+                    completed += 1
+                else:
+                    jobs.append(i)
+            self.progress.emit(int(completed / total * 100))
+
+            def download(i, image_urls):
+                folder = self.chapter_folder(i)
                 self.chapter_status.emit(i, "Downloading...")
-                try:
-                    ok = self.scraper.download_chapter(chapter_id, folder)
-                    if ok:
-                        self.chapter_status.emit(i, "Completed")
-                        self.chapter_retry_enabled.emit(i, False)
-                    else:
-                        self.chapter_status.emit(i, "Failed")
-                        self.chapter_retry_enabled.emit(i, True)
-                except Exception as e:
-                    self.chapter_status.emit(i, "Failed")
-                    self.chapter_retry_enabled.emit(i, True)
-                    self.log.emit(f"Error downloading chapter {chapter_num}: {e}")
-                completed += 1
-                self.progress.emit(int(completed / total * 100))
+                ok = self.download(i, folder, image_urls)
+                record_chapter(self.url, chapters[i], folder, ok, self.title)
+                return ok
+
+            lock = threading.Lock()
+
+            def finished(i, ok, error):
+                nonlocal completed
+                if error is not None:
+                    self.log.emit(f"Error downloading chapter {chapters[i]['chapter']}: {error}")
+                self.chapter_status.emit(i, "Completed" if ok else "Failed")
+                self.chapter_retry_enabled.emit(i, not ok)
+                with lock:
+                    completed += 1
+                    self.progress.emit(int(completed / total * 100))
+
+            # Chapter pages are resolved ahead while earlier chapters' images download
+            self.pipeline = ChapterPipeline(self.scraper)
+            if not self._should_stop:
+                self.pipeline.run(jobs, lambda i: chapters[i]["id"], download, finished)
             self.log.emit("All downloads attempted.")
+            self.journal.compact()
         except Exception as e:
             self.log.emit(f"Error fetching chapters: {e}")
         self.finished.emit()
 
+    def chapter_folder(self, index):
+        return os.path.join("downloads", self.title, f"Chapter_{self.chapters[index]['chapter']}")
+
+    def download(self, index, folder, image_urls=None):
+        chapter_id = self.chapters[index]["id"]
+        return journaled_download(self.journal, self.url, index, folder,
+                                  lambda: self.scraper.download_pages(chapter_id, image_urls, folder))
+
     def retry_chapter(self, row):
         ch = self.chapters[row]
-        chapter_id = ch["id"]
         chapter_num = ch["chapter"]
-        folder = os.path.join("downloads", self.title, f"Chapter_{chapter_num}")
+        folder = self.chapter_folder(row)
         self.chapter_status.emit(row, "Retrying...")
         try:
-            ok = self.scraper.download_chapter(chapter_id, folder)
+            ok = self.download(row, folder)
+            record_chapter(self.url, ch, folder, ok, self.title)
             if ok:
                 self.chapter_status.emit(row, "Completed")
                 self.chapter_retry_enabled.emit(row, False)
@@ -88,6 +159,44 @@ class DownloadWorker(QObject):
             self.chapter_retry_enabled.emit(row, True)
             self.log.emit(f"Error retrying chapter {chapter_num}: {e}")
 
+class ThumbnailLoader(QObject):
+    """Hands thumbnails made by the background cache workers to the UI thread."""
+    ready = Signal(object, str)
+
+    def watch(self, key, future):
+        """Emit ``ready(key, path)`` once ``future`` (from ``utils.thumbnails``) is done."""
+        future.add_done_callback(lambda f: self.ready.emit(key, f.result() or ''))
+
+
+class QueueWorker(QObject):
+    """Runs the persistent batch queue in a background thread."""
+    progress = Signal(int)
+    log = Signal(str)
+    finished = Signal()
+
+    def __init__(self, queue):
+        super().__init__()
+        self.queue = queue
+        self.queue.log = self.on_log
+
+    def stop(self):
+        self.queue.stop()
+
+    def on_log(self, msg):
+        self.log.emit(msg)
+        status = self.queue.status().values()
+        total = sum(t for _, _, t in status)
+        if total:
+            self.progress.emit(int(sum(d for _, d, _ in status) / total * 100))
+
+    def run(self):
+        try:
+            self.queue.run()
+            self.log.emit("Queue finished.")
+        except Exception as e:
+            self.log.emit(f"Queue error: {e}")
+        self.finished.emit()
+
 class CollapsibleSection(QWidget):
     def __init__(self, title, parent=None):
         super().__init__(parent)
@@ -223,6 +332,18 @@ class MainWindow(QMainWindow):
         lang_layout.addWidget(self.lang_combo)
         main_layout.addLayout(lang_layout)
 
+        # Chapter selection
+        chapters_layout = QHBoxLayout()
+        chapters_label = QLabel("Chapters:")
+        chapters_label.setFont(QFont("Segoe UI", 12, QFont.Bold))
+        chapters_label.setStyleSheet("color: #f4f4f4;")
+        self.chapters_input = QLineEdit()
+        self.chapters_input.setPlaceholderText("All chapters, or e.g. 150-200, 1,3,7.5, latest 10")
+        self.chapters_input.setStyleSheet("padding: 8px; border-radius: 8px; border: 1px solid #393e6e; background: #232946; color: #fff;")
+        chapters_layout.addWidget(chapters_label)
+        chapters_layout.addWidget(self.chapters_input)
+        main_layout.addLayout(chapters_layout)
+
         # Supported websites section
         self.supported_sites_section = CollapsibleSection("▶ Supported Websites")
         self.setup_supported_sites_content()
@@ -233,15 +354,34 @@ class MainWindow(QMainWindow):
         self.download_btn.setStyleSheet("background: #ffb6c1; color: #232946; font-weight: bold; border-radius: 10px; padding: 10px 0; font-size: 16px;")
         main_layout.addWidget(self.download_btn)
 
+        # Batch queue buttons
+        queue_layout = QHBoxLayout()
+        queue_btn_style = "background: #393e6e; color: #fff; font-weight: bold; border-radius: 10px; padding: 8px 0;"
+        self.queue_urls_btn = QPushButton("Queue URLs...")
+        self.queue_file_btn = QPushButton("Queue From File...")
+        self.run_queue_btn = QPushButton("Run Queue")
+        self.memory_btn = QPushButton("Memory Report")
+        for btn in (self.queue_urls_btn, self.queue_file_btn, self.run_queue_btn, self.memory_btn):
+            btn.setStyleSheet(queue_btn_style)
+            queue_layout.addWidget(btn)
+        main_layout.addLayout(queue_layout)
+
         # Chapter progress table
-        self.chapter_table = QTableWidget(0, 3)
-        self.chapter_table.setHorizontalHeaderLabels(["Chapter", "Status", "Action"])
+        self.chapter_table = QTableWidget(0, 4)
+        self.chapter_table.setHorizontalHeaderLabels(["Chapter", "Status", "Action", "Preview"])
+        self.chapter_table.verticalHeader().setDefaultSectionSize(ROW_THUMBNAIL_HEIGHT + 4)
         self.chapter_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.chapter_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.chapter_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.chapter_table.setStyleSheet("background: #393e6e; color: #fff; border-radius: 10px; font-size: 14px;")
         main_layout.addWidget(QLabel("<span style='color:#f4f4f4;'>Chapter Progress:</span>"))
-        main_layout.addWidget(self.chapter_table)
+        table_layout = QHBoxLayout()
+        self.cover_label = QLabel()
+        self.cover_label.setAlignment(Qt.AlignTop)
+        self.cover_label.hide()
+        table_layout.addWidget(self.cover_label)
+        table_layout.addWidget(self.chapter_table)
+        main_layout.addLayout(table_layout)
 
         # Standard progress bar (replaces animated GIF)
         self.progress_bar = QProgressBar()
@@ -279,6 +419,21 @@ class MainWindow(QMainWindow):
 
         # Connect button
         self.download_btn.clicked.connect(self.on_start_download)
+        self.queue_urls_btn.clicked.connect(self.on_queue_urls)
+        self.queue_file_btn.clicked.connect(self.on_queue_file)
+        self.run_queue_btn.clicked.connect(self.on_run_queue)
+        self.memory_btn.clicked.connect(self.on_memory_report)
+
+        # Thumbnails are made in the background and only for rows in view
+        self.thumbnails = ThumbnailLoader()
+        self.thumbnails.ready.connect(self.on_thumbnail_ready)
+        self.thumbnail_timer = QTimer(self)
+        self.thumbnail_timer.setSingleShot(True)
+        self.thumbnail_timer.setInterval(THUMBNAIL_DELAY_MS)
+        self.thumbnail_timer.timeout.connect(self.load_visible_thumbnails)
+        self.chapter_table.verticalScrollBar().valueChanged.connect(self.thumbnail_timer.start)
+        self.thumbnail_rows = set()
+        self.thumbnail_generation = 0
 
         # Store chapters and worker
         self.chapters = []
@@ -286,6 +441,9 @@ class MainWindow(QMainWindow):
         self.worker_thread = None
         self.title = None
         self._progress = 0
+        self.batch_queue = None
+        self.queue_worker = None
+        self.queue_thread = None
 
     def setup_supported_sites_content(self):
         """Setup the content for the supported websites section."""
@@ -377,15 +535,29 @@ class MainWindow(QMainWindow):
         except Exception as e:
             print(f"Could not create fallback icon: {e}")
 
+    def chapter_selection(self):
+        """The chapter selection text, or False (after logging why) if it is invalid."""
+        text = self.chapters_input.text().strip()
+        try:
+            return str(parse_selection(text) or '')
+        except ValueError as e:
+            self.log(f"Invalid chapter selection: {e}")
+            return False
+
     def on_start_download(self):
         url = self.url_input.text().strip()
         lang = self.lang_combo.currentData()
-        self.status_list.addItem(f"Starting download for: {url} (Language: {lang})")
+        selection = self.chapter_selection()
+        if selection is False:
+            return
+        self.status_list.addItem(f"Starting download for: {url} (Language: {lang})"
+                                 + (f" (Chapters: {selection})" if selection else ""))
         self.download_btn.setEnabled(False)
         self.chapter_table.setRowCount(0)
+        self.cover_label.hide()
         self.set_progress(0)
         # Start worker thread
-        self.worker = DownloadWorker(url, lang)
+        self.worker = DownloadWorker(url, lang, selection)
         self.worker_thread = QThread()
         self.worker.moveToThread(self.worker_thread)
         self.worker_thread.started.connect(self.worker.run)
@@ -398,6 +570,45 @@ class MainWindow(QMainWindow):
         self.worker.finished.connect(self.worker_thread.quit)
         self.worker_thread.start()
 
+    def get_batch_queue(self):
+        if self.batch_queue is None:
+            self.batch_queue = BatchQueue()
+        return self.batch_queue
+
+    def on_queue_urls(self):
+        text, ok = QInputDialog.getMultiLineText(self, "Queue URLs", "Series URLs (one per line):")
+        selection = self.chapter_selection()
+        if ok and text.strip() and selection is not False:
+            added = self.get_batch_queue().add_series(text.splitlines(), self.lang_combo.currentData(),
+                                                      selection or None)
+            self.log(f"Queued {added} series.")
+
+    def on_queue_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Queue From File", "", "Text files (*.txt);;All files (*)")
+        selection = self.chapter_selection()
+        if path and selection is not False:
+            added = self.get_batch_queue().add_series(read_url_file(path), self.lang_combo.currentData(),
+                                                      selection or None)
+            self.log(f"Queued {added} series from {os.path.basename(path)}.")
+
+    def on_run_queue(self):
+        queue = self.get_batch_queue()
+        if not queue.series:
+            self.log("The queue is empty.")
+            return
+        self.log(f"Running queue with {len(queue.series)} series...")
+        self.run_queue_btn.setEnabled(False)
+        self.set_progress(0)
+        self.queue_worker = QueueWorker(queue)
+        self.queue_thread = QThread()
+        self.queue_worker.moveToThread(self.queue_thread)
+        self.queue_thread.started.connect(self.queue_worker.run)
+        self.queue_worker.progress.connect(self.set_progress)
+        self.queue_worker.log.connect(self.log)
+        self.queue_worker.finished.connect(lambda: self.run_queue_btn.setEnabled(True))
+        self.queue_worker.finished.connect(self.queue_thread.quit)
+        self.queue_thread.start()
+
     def set_progress(self, percent):
         self._progress = percent
         self.progress_bar.setValue(percent)
@@ -407,6 +618,7 @@ class MainWindow(QMainWindow):
         new_width = max(300, self.width() - 300)
         # self.progress_bg.setFixedWidth(new_width) # This line is removed as progress_bg is removed
         self.set_progress(self._progress)
+        self.thumbnail_timer.start()
         super().resizeEvent(event)
 
     def populate_chapter_table(self, chapters, title):
@@ -422,9 +634,50 @@ class MainWindow(QMainWindow):
             retry_btn.setStyleSheet("background: #87cefa; color: #fff; border-radius: 8px; font-weight: bold;")
             self.chapter_table.setCellWidget(i, 2, retry_btn)
             retry_btn.setEnabled(False)
+        # Thumbnails still on their way belong to the previous table
+        self.thumbnail_generation += 1
+        self.thumbnail_rows = set()
+        if self.worker:
+            self.thumbnails.watch(('cover', self.thumbnail_generation),
+                                  get_thumbnail_cache().cover_thumbnail(self.worker.url, self.worker.scraper))
+        self.thumbnail_timer.start()
 
     def update_chapter_status(self, row, status):
         self.chapter_table.setItem(row, 1, QTableWidgetItem(status))
+        if status == "Completed":
+            self.thumbnail_rows.discard(row)
+            self.thumbnail_timer.start()
+
+    def visible_rows(self):
+        """Rows of the chapter table currently in view."""
+        first = self.chapter_table.rowAt(0)
+        if first < 0:
+            return range(0)
+        last = self.chapter_table.rowAt(self.chapter_table.viewport().height() - 1)
+        return range(first, (last if last >= 0 else self.chapter_table.rowCount() - 1) + 1)
+
+    def load_visible_thumbnails(self):
+        if not self.worker or not self.worker.chapters:
+            return
+        cache = get_thumbnail_cache()
+        for row in self.visible_rows():
+            status = self.chapter_table.item(row, 1)
+            if row in self.thumbnail_rows or status is None or status.text() != "Completed":
+                continue
+            self.thumbnail_rows.add(row)
+            future = cache.chapter_thumbnail(self.worker.chapter_folder(row))
+            self.thumbnails.watch(('chapter', self.thumbnail_generation, row), future)
+
+    def on_thumbnail_ready(self, key, path):
+        if key[1] != self.thumbnail_generation or not path:
+            return
+        if key[0] == 'cover':
+            self.cover_label.setPixmap(QPixmap(path).scaledToHeight(COVER_HEIGHT, Qt.SmoothTransformation))
+            self.cover_label.show()
+            return
+        item = QTableWidgetItem()
+        item.setData(Qt.DecorationRole, QPixmap(path).scaledToHeight(ROW_THUMBNAIL_HEIGHT, Qt.SmoothTransformation))
+        self.chapter_table.setItem(key[2], 3, item)
 
     def enable_retry(self, row, enabled):
         btn = self.chapter_table.cellWidget(row, 2)
@@ -437,6 +690,12 @@ class MainWindow(QMainWindow):
 
     def log(self, msg):
         self.status_list.addItem(str(msg))
+        while self.status_list.count() > MAX_LOG_LINES:
+            self.status_list.takeItem(0)
+
+    def on_memory_report(self):
+        for line in memory_report().splitlines():
+            self.log(line)
 
     def on_worker_finished(self):
         self.download_btn.setEnabled(True) 
\ No newline at end of file
@@ -0,0 +1,289 @@
+"""
+Bandwidth shaping for downloads.
+
+Image streams (and fetched pages) are paced by token buckets: one for all
+traffic and one per host, each refilled at its cap in KB/s. Every chunk
+read from the network takes its size out of both buckets and waits while
+either is empty, so downloads share the link evenly instead of saturating
+it. A cap of 0 means unlimited.
+
+Caps can be set per time of day: a window ``"HH:MM-HH:MM"`` (wrapping past
+midnight when the end is earlier) with its own global and per-host caps
+replaces the base caps while it is active, e.g. full speed at night and
+512 KB/s during office hours.
+
+The settings come from ``bandwidth.json`` in the data directory (written by
+``cli.py bandwidth``), which running downloads re-read when it changes, so
+limits can be adjusted without a restart, or from ``configure_bandwidth``.
+``WEBCOMIC_BANDWIDTH_KBPS``, ``WEBCOMIC_HOST_BANDWIDTH_KBPS`` and
+``WEBCOMIC_BANDWIDTH_WINDOWS`` set the caps of a single run instead: when
+any of them is set, ``bandwidth.json`` is not read.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+from urllib.parse import urlparse
+
+from .paths import atomic_write, data_path
+
+SETTINGS_FILE = 'bandwidth.json'
+# How often the settings file and the active window are checked, in seconds
+CHECK_INTERVAL = 5.0
+# Longest single sleep, so changed caps take effect promptly
+MAX_WAIT = 0.25
+
+_WINDOW = re.compile(r'^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})$')
+
+
+class TokenBucket:
+    """Allows ``rate`` bytes per second with bursts of up to one second's worth."""
+
+    def __init__(self, rate=0):
+        self._lock = threading.Lock()
+        self._rate = 0
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self.set_rate(rate)
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def set_rate(self, rate):
+        """Change the rate in bytes per second; 0 removes the limit."""
+        with self._lock:
+            self._rate = max(0, int(rate or 0))
+            self._tokens = min(self._tokens, self._rate)
+
+    def consume(self, size):
+        """Take ``size`` bytes from the bucket, waiting until they are available."""
+        while True:
+            with self._lock:
+                if not self._rate:
+                    return
+                now = time.monotonic()
+                self._tokens = min(self._rate, self._tokens + (now - self._last) * self._rate)
+                self._last = now
+                # Chunks larger than the burst go through once the bucket is full, leaving a debt
+                if self._tokens >= min(size, self._rate):
+                    self._tokens -= size
+                    return
+                wait = (min(size, self._rate) - self._tokens) / self._rate
+            time.sleep(min(wait, MAX_WAIT))
+
+
+@dataclass
+class Window:
+    start: int  # minutes after midnight
+    end: int
+    global_kbps: int = 0
+    per_host_kbps: int = 0
+
+    def active(self, minute):
+        if self.start <= self.end:
+            return self.start <= minute < self.end
+        return minute >= self.start or minute < self.end
+
+
+@dataclass
+class BandwidthSettings:
+    global_kbps: int = 0
+    per_host_kbps: int = 0
+    # Per-host caps overriding per_host_kbps, matched like the batch queue's host limits
+    hosts: Dict[str, int] = field(default_factory=dict)
+    windows: List[Window] = field(default_factory=list)
+
+    def caps(self, minute):
+        """``(global_kbps, per_host_kbps)`` at ``minute`` after midnight."""
+        for window in self.windows:
+            if window.active(minute):
+                return window.global_kbps, window.per_host_kbps
+        return self.global_kbps, self.per_host_kbps
+
+    def host_cap(self, host, per_host_kbps):
+        for known, kbps in self.hosts.items():
+            if known in host:
+                return kbps
+        return per_host_kbps
+
+    @property
+    def limited(self):
+        return bool(self.global_kbps or self.per_host_kbps or self.hosts
+                    or any(w.global_kbps or w.per_host_kbps for w in self.windows))
+
+    def to_dict(self):
+        return {
+            'global_kbps': self.global_kbps,
+            'per_host_kbps': self.per_host_kbps,
+            'hosts': self.hosts,
+            'windows': [format_window(w) for w in self.windows],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(int(data.get('global_kbps') or 0), int(data.get('per_host_kbps') or 0),
+                   {h: int(k) for h, k in (data.get('hosts') or {}).items()},
+                   [parse_window(w) for w in data.get('windows') or []])
+
+
+def parse_window(spec):
+    """Parse ``"HH:MM-HH:MM=GLOBAL[/PER_HOST]"`` (caps in KB/s, 0 = unlimited)."""
+    times, _, caps = spec.strip().partition('=')
+    match = _WINDOW.match(times.strip())
+    if not match or not caps.strip():
+        raise ValueError(f"invalid bandwidth window '{spec}', expected HH:MM-HH:MM=KBPS[/HOST_KBPS]")
+    h1, m1, h2, m2 = (int(g) for g in match.groups())
+    if h1 > 24 or h2 > 24 or m1 > 59 or m2 > 59:
+        raise ValueError(f"invalid time in bandwidth window '{spec}'")
+    global_kbps, _, per_host_kbps = caps.partition('/')
+    try:
+        return Window(h1 * 60 + m1, h2 * 60 + m2, int(global_kbps), int(per_host_kbps or 0))
+    except ValueError:
+        raise ValueError(f"invalid caps in bandwidth window '{spec}'") from None
+
+
+def format_window(window):
+    text = (f"{window.start // 60:02d}:{window.start % 60:02d}-{window.end // 60:02d}:{window.end % 60:02d}"
+            f"={window.global_kbps}")
+    return f"{text}/{window.per_host_kbps}" if window.per_host_kbps else text
+
+
+class BandwidthShaper:
+    """Global and per-host token buckets following the current settings."""
+
+    def __init__(self, settings=None, settings_path=None):
+        self.settings = settings or BandwidthSettings()
+        self.settings_path = settings_path
+        self._lock = threading.Lock()
+        self._global = TokenBucket()
+        self._hosts = {}
+        self._caps = None
+        self._limited = False
+        self._next_check = 0.0
+        self._mtime = None
+        self._refresh(force=True)
+
+    def update(self, settings):
+        """Replace the settings; transfers in progress follow the new caps."""
+        with self._lock:
+            self.settings = settings
+        self._refresh(force=True)
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        with self._lock:
+            self._next_check = now + CHECK_INTERVAL
+            if self.settings_path:
+                self._reload()
+            local = time.localtime()
+            minute = local.tm_hour * 60 + local.tm_min
+            self._limited = self.settings.limited
+            global_kbps, per_host_kbps = self.settings.caps(minute)
+            caps = (global_kbps, per_host_kbps, tuple(sorted(self.settings.hosts.items())))
+            if caps == self._caps and not force:
+                return
+            self._caps = caps
+            self._global.set_rate(global_kbps * 1024)
+            for host, bucket in self._hosts.items():
+                bucket.set_rate(self.settings.host_cap(host, per_host_kbps) * 1024)
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.settings_path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            with open(self.settings_path, encoding='utf-8') as f:
+                self.settings = BandwidthSettings.from_dict(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Could not read bandwidth settings: {e}")
+
+    def _bucket(self, host):
+        bucket = self._hosts.get(host)
+        if bucket is None:
+            with self._lock:
+                bucket = self._hosts.get(host)
+                if bucket is None:
+                    per_host_kbps = self._caps[1] if self._caps else self.settings.per_host_kbps
+                    bucket = self._hosts[host] = TokenBucket(self.settings.host_cap(host, per_host_kbps) * 1024)
+        return bucket
+
+    def throttle(self, host, size):
+        """Account ``size`` bytes received from ``host``, waiting for the caps."""
+        self._refresh()
+        if not self._limited:
+            return
+        self._bucket(host).consume(size)
+        self._global.consume(size)
+
+
+_shaper = None
+_shaper_lock = threading.Lock()
+
+
+ENV_VARS = ('WEBCOMIC_BANDWIDTH_KBPS', 'WEBCOMIC_HOST_BANDWIDTH_KBPS', 'WEBCOMIC_BANDWIDTH_WINDOWS')
+
+
+def _env_settings():
+    """Settings from the environment, or None when none of ``ENV_VARS`` is set."""
+    if not any(os.environ.get(name) for name in ENV_VARS):
+        return None
+    windows = os.environ.get('WEBCOMIC_BANDWIDTH_WINDOWS', '')
+    return BandwidthSettings(int(os.environ.get('WEBCOMIC_BANDWIDTH_KBPS') or 0),
+                             int(os.environ.get('WEBCOMIC_HOST_BANDWIDTH_KBPS') or 0),
+                             windows=[parse_window(w) for w in windows.split(',') if w.strip()])
+
+
+def configure_bandwidth(global_kbps=0, per_host_kbps=0, hosts=None, windows=None, persistent=True):
+    """Set the caps in KB/s (0 = unlimited); ``windows`` are ``Window``s or their text.
+
+    With ``persistent`` the shaper still follows later changes to ``bandwidth.json``.
+    """
+    settings = BandwidthSettings(global_kbps, per_host_kbps, dict(hosts or {}),
+                                 [w if isinstance(w, Window) else parse_window(w) for w in windows or []])
+    shaper = get_shaper()
+    path = data_path(SETTINGS_FILE)
+    with shaper._lock:
+        shaper.settings_path = path if persistent else None
+        # The file as it is now is overridden; a later change to it applies again
+        shaper._mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    shaper.update(settings)
+
+
+def get_shaper():
+    global _shaper
+    with _shaper_lock:
+        if _shaper is None:
+            settings = _env_settings()
+            # Caps given for this run win: bandwidth.json is not read, so it cannot replace them
+            _shaper = BandwidthShaper(settings, data_path(SETTINGS_FILE) if settings is None else None)
+        return _shaper
+
+
+def throttle(url, size):
+    """Account ``size`` bytes downloaded from ``url`` against the caps."""
+    get_shaper().throttle(urlparse(url).netloc.lower(), size)
+
+
+def load_settings():
+    """The settings in ``bandwidth.json``, or empty ones."""
+    try:
+        with open(data_path(SETTINGS_FILE), encoding='utf-8') as f:
+            return BandwidthSettings.from_dict(json.load(f))
+    except (OSError, ValueError):
+        return BandwidthSettings()
+
+
+def save_settings(settings):
+    """Write ``bandwidth.json``; running downloads pick it up within ``CHECK_INTERVAL`` seconds."""
+    atomic_write(data_path(SETTINGS_FILE), json.dumps(settings.to_dict(), indent=2))
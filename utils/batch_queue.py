@@ -0,0 +1,331 @@
+"""
+Persistent multi-series download queue.
+
+Series URLs are discovered (``get_chapters``) and their chapters downloaded
+by a single pool of worker threads. The pool size is the global concurrency
+budget; each host additionally has its own cap so a slow site only ties up
+its own share of the workers. Hosts are served round-robin.
+
+Every state change goes through a write-ahead job journal
+(``utils/journal.py``) next to the queue state in the data directory, so an
+interrupted run - even a crashed one - picks up where it stopped: finished
+chapters are skipped and chapters that were running keep the pages they had
+already stored.
+"""
+
+import os
+import threading
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+
+from .catalog import get_catalog
+from .journal import ACTIVE, DONE, FAILED, PENDING, JobJournal, journaled_download
+from .paths import DOWNLOADS_DIR, data_path, safe_name
+
+# Scrapers (each with its own HTTP session) kept for the most recently active series
+MAX_SCRAPERS = 32
+
+
+def series_title_from_url(url: str) -> str:
+    """Derive a folder name for a series from its URL."""
+    parts = [p for p in urlparse(url).path.split('/') if p]
+    if 'title' in parts:
+        # MangaDex: /title/<id>/<slug>
+        rest = parts[parts.index('title') + 1:]
+        parts = rest[-1:] if rest else parts
+    return safe_name(parts[-1]) if parts else urlparse(url).netloc
+
+
+def record_series(url, title, chapters):
+    """Add a discovered series to the catalog; a catalog error never stops a download."""
+    catalog = get_catalog()
+    if catalog is not None:
+        try:
+            catalog.record_series(url, title, chapters)
+        except Exception as e:
+            print(f"Could not update the catalog for {title}: {e}")
+
+
+def record_chapter(url, chapter, folder, ok, title=None):
+    """Add a chapter download and its pages to the catalog."""
+    catalog = get_catalog()
+    if catalog is not None:
+        try:
+            catalog.record_chapter(url, chapter, folder, ok, title)
+        except Exception as e:
+            print(f"Could not update the catalog for {folder}: {e}")
+
+
+def read_url_file(path):
+    """Read series URLs from a text file, one per line; ``#`` starts a comment."""
+    urls = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                urls.append(line)
+    return urls
+
+
+class BatchQueue:
+    """Queue of series whose chapters share one concurrency budget."""
+
+    def __init__(self, state_path=None, max_workers=8, per_host=2, host_limits=None,
+                 downloads_dir=DOWNLOADS_DIR, log=print):
+        self.state_path = state_path or data_path('queue.json')
+        self.max_workers = max_workers
+        self.per_host = per_host
+        # Caps from the site definitions (max_connections), overridden by the caller's
+        from scrapers.site_config import host_limits as site_host_limits
+        self.host_limits = {**site_host_limits(), **(host_limits or {})}
+        self.downloads_dir = downloads_dir
+        self.log = log
+        self.journal = JobJournal(self.state_path)
+        self._scrapers = OrderedDict()
+        # Scheduler and journal share one lock so the state never changes mid-read
+        self._cond = threading.Condition(self.journal.lock)
+        self._jobs = {}
+        self._hosts = deque()
+        self._inflight = {}
+        # Queued and running jobs per series, and changes to its listing waiting for them to finish
+        self._outstanding = {}
+        self._deferred = {}
+        self._stop = threading.Event()
+
+    @property
+    def series(self):
+        return self.journal.series
+
+    # Persistence
+
+    def load(self):
+        self.journal.load()
+
+    def save(self, force=False):
+        """Compact the journal into the state file; only needed when ``force`` is set."""
+        if force:
+            self.journal.compact()
+
+    # Queue management
+
+    def add_series(self, urls, lang=None, selection=None):
+        """Add series URLs; returns how many were new or changed.
+
+        ``lang`` defaults to English for new series and to the current language
+        for queued ones. ``selection`` limits the chapters (e.g. ``"150-200"``);
+        giving another language or selection for a queued series lists it again.
+        While ``run`` has jobs of that series queued or running, the change waits
+        until they are finished (the jobs refer to the current chapter list); it
+        is lost if the process stops before then.
+        """
+        added = 0
+        with self._cond:
+            for url in urls:
+                url = url.strip()
+                if not url:
+                    continue
+                entry = self.series.get(url)
+                if entry is None:
+                    self.journal.record('series', url, lang=lang or 'en', title=series_title_from_url(url),
+                                        selection=selection)
+                    added += 1
+                    continue
+                changes = []
+                if lang and lang != entry.get('lang'):
+                    changes.append(('series', {'lang': lang, 'title': entry['title']}))
+                if selection and selection != entry.get('selection'):
+                    changes.append(('select', {'selection': selection}))
+                if not changes:
+                    continue
+                if self._outstanding.get(url):
+                    self._deferred.setdefault(url, []).extend(changes)
+                    self.log(f"[{entry['title']}] The change applies once the chapters being downloaded "
+                             f"are finished.")
+                else:
+                    for op, fields in changes:
+                        self.journal.record(op, url, **fields)
+                added += 1
+        self.save(force=True)
+        return added
+
+    def add_from_file(self, path, lang=None, selection=None):
+        return self.add_series(read_url_file(path), lang, selection)
+
+    def remove_finished(self):
+        """Drop series whose chapters all completed."""
+        with self._cond:
+            for url in [u for u, e in self.series.items() if e['status'] == DONE]:
+                self.journal.record('remove', url)
+        self.save(force=True)
+
+    def status(self):
+        """Return ``{series_url: (status, done_chapters, total_chapters)}``."""
+        with self._cond:
+            return {
+                url: (e['status'], sum(ch['status'] == DONE for ch in e['chapters']), len(e['chapters']))
+                for url, e in self.series.items()
+            }
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    # Scheduling
+
+    def host_cap(self, host):
+        for known, limit in self.host_limits.items():
+            if known in host:
+                return limit
+        return self.per_host
+
+    def _push(self, host, job, front=False):
+        self._outstanding[job[1]] = self._outstanding.get(job[1], 0) + 1
+        if host not in self._jobs:
+            self._jobs[host] = deque()
+            self._hosts.append(host)
+            self._inflight.setdefault(host, 0)
+        if front:
+            self._jobs[host].appendleft(job)
+        else:
+            self._jobs[host].append(job)
+
+    def _schedule_series(self, url):
+        entry = self.series[url]
+        host = urlparse(url).netloc
+        if not entry['chapters']:
+            # Discovery runs before any queued chapter on the same host
+            self._push(host, ('discover', url), front=True)
+            return
+        for index, ch in enumerate(entry['chapters']):
+            if ch['status'] in (PENDING, FAILED):
+                self._push(host, ('chapter', url, index))
+
+    def _next_job(self):
+        """Block until a job is runnable under the caps; None when all work is done."""
+        with self._cond:
+            while not self._stop.is_set():
+                for _ in range(len(self._hosts)):
+                    host = self._hosts[0]
+                    self._hosts.rotate(-1)
+                    if self._jobs[host] and self._inflight[host] < self.host_cap(host):
+                        self._inflight[host] += 1
+                        return host, self._jobs[host].popleft()
+                if not any(self._inflight.values()):
+                    return None
+                self._cond.wait()
+            return None
+
+    def _job_done(self, host, url):
+        with self._cond:
+            self._inflight[host] -= 1
+            self._outstanding[url] -= 1
+            if not self._outstanding[url] and url in self._deferred and url in self.series:
+                # The series is idle: the deferred changes list it again
+                for op, fields in self._deferred.pop(url):
+                    self.journal.record(op, url, **fields)
+                if not self._stop.is_set():
+                    self._schedule_series(url)
+            self._cond.notify_all()
+
+    def _scraper_for(self, url):
+        from scrapers import get_scraper_for_url
+
+        with self._cond:
+            scraper = self._scrapers.get(url)
+            if scraper is not None:
+                self._scrapers.move_to_end(url)
+        if scraper is None:
+            scraper = get_scraper_for_url(url)
+            with self._cond:
+                self._scrapers[url] = scraper
+                while len(self._scrapers) > MAX_SCRAPERS:
+                    self._scrapers.popitem(last=False)
+        return scraper
+
+    def _discover(self, host, url):
+        from scrapers.selection import list_chapters
+
+        entry = self.series[url]
+        with self._cond:
+            self.journal.record('status', url, status=ACTIVE)
+        scraper = self._scraper_for(url)
+        if not scraper:
+            self.journal.record('status', url, status=FAILED, error="No scraper found for this URL.")
+            self.log(f"[{entry['title']}] No scraper found for this URL.")
+            return
+        try:
+            chapters = list_chapters(scraper, url, entry['lang'], entry.get('selection'))
+        except Exception as e:
+            self.journal.record('status', url, status=FAILED, error=str(e))
+            self.log(f"[{entry['title']}] Error fetching chapters: {e}")
+            return
+        if not chapters:
+            self.journal.record('status', url, status=FAILED, error="No chapters found.")
+            self.log(f"[{entry['title']}] No chapters found.")
+            return
+        with self._cond:
+            self.journal.record('chapters', url, chapters=[
+                {'id': ch['id'], 'chapter': str(ch['chapter'])} for ch in chapters
+            ])
+            self._schedule_series(url)
+            self._cond.notify_all()
+        self.log(f"[{entry['title']}] Found {len(chapters)} chapters.")
+        record_series(url, entry['title'], chapters)
+
+    def _download(self, host, url, index):
+        entry = self.series[url]
+        ch = entry['chapters'][index]
+        folder = os.path.join(self.downloads_dir, entry['title'], f"Chapter_{ch['chapter']}")
+        scraper = self._scraper_for(url)
+        try:
+            ok = journaled_download(self.journal, url, index, folder,
+                                    lambda: scraper.download_chapter(ch['id'], folder))
+        except Exception as e:
+            ok = False
+            self.log(f"[{entry['title']}] Error downloading chapter {ch['chapter']}: {e}")
+        record_chapter(url, ch, folder, ok, entry['title'])
+        self.log(f"[{entry['title']}] Chapter {ch['chapter']}: {'Completed' if ok else 'Failed'}")
+
+    def _worker(self):
+        while True:
+            picked = self._next_job()
+            if picked is None:
+                return
+            host, job = picked
+            try:
+                if job[0] == 'discover':
+                    self._discover(host, job[1])
+                else:
+                    self._download(host, job[1], job[2])
+            finally:
+                self._job_done(host, job[1])
+
+    def run(self):
+        """Download everything that is still pending. Blocks until done or stopped."""
+        if self.max_workers < 1 or self.per_host < 1 or any(limit < 1 for limit in self.host_limits.values()):
+            raise ValueError("worker and per-host limits must be at least 1")
+        self._stop.clear()
+        with self._cond:
+            self._jobs.clear()
+            self._hosts.clear()
+            self._inflight.clear()
+            self._outstanding.clear()
+            for url, entry in self.series.items():
+                if entry['status'] != DONE:
+                    entry['status'] = PENDING
+                    self._schedule_series(url)
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.max_workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with self._cond:
+            # Jobs left queued by a stop no longer hold back a change
+            self._outstanding.clear()
+            for url, changes in self._deferred.items():
+                if url in self.series:
+                    for op, fields in changes:
+                        self.journal.record(op, url, **fields)
+            self._deferred.clear()
+        self.save(force=True)
@@ -0,0 +1,227 @@
+"""
+SQLite catalog of downloaded series, chapters and pages.
+
+``catalog.sqlite3`` in the data directory records every series that was
+discovered, its chapters (with their download status and time) and the pages
+of each finished chapter (source URL, size, format and SHA-256), so questions
+like "which chapters are missing" or "how much do we have per site" are
+answered from indexed tables instead of walking ``downloads/``.
+
+The download pipeline (batch queue and GUI worker) writes it: a discovered
+series and its chapter list, then each chapter with its pages from the
+chapter manifest, each in one transaction. Set ``WEBCOMIC_CATALOG=0`` (or call
+``configure_catalog(enabled=False)``) to turn it off.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+from .manifest import ChapterManifest
+from .paths import data_path
+
+CATALOG_FILE = 'catalog.sqlite3'
+SCHEMA_VERSION = 1
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    site TEXT NOT NULL,
+    title TEXT NOT NULL,
+    chapter_count INTEGER NOT NULL DEFAULT 0,
+    checked_at REAL,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS chapters (
+    id INTEGER PRIMARY KEY,
+    series_id INTEGER NOT NULL REFERENCES series(id) ON DELETE CASCADE,
+    source_id TEXT NOT NULL,
+    number TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    folder TEXT,
+    source_url TEXT,
+    pages INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    downloaded_at REAL,
+    UNIQUE (series_id, source_id)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    chapter_id INTEGER NOT NULL REFERENCES chapters(id) ON DELETE CASCADE,
+    file TEXT NOT NULL,
+    source_url TEXT,
+    bytes INTEGER NOT NULL,
+    format TEXT,
+    sha256 TEXT,
+    PRIMARY KEY (chapter_id, file)
+);
+CREATE INDEX IF NOT EXISTS chapters_missing ON chapters (series_id, status);
+CREATE INDEX IF NOT EXISTS series_site ON series (site);
+CREATE INDEX IF NOT EXISTS series_checked ON series (checked_at);
+CREATE INDEX IF NOT EXISTS pages_sha256 ON pages (sha256);
+"""
+
+_enabled = True
+_path = None
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def configure_catalog(path=None, enabled=True):
+    """Use the catalog at ``path`` (default: in the data directory), or none at all."""
+    global _enabled, _path, _catalog
+    with _catalog_lock:
+        if _catalog is not None:
+            _catalog.close()
+        _enabled, _path, _catalog = enabled, path, None
+
+
+def get_catalog():
+    """The shared catalog, or None when it is disabled or cannot be opened."""
+    global _catalog, _enabled
+    with _catalog_lock:
+        if _catalog is None and _enabled:
+            try:
+                _catalog = Catalog(_path)
+            except sqlite3.Error as e:
+                print(f"Could not open the catalog: {e}")
+                _enabled = False
+        return _catalog
+
+
+def site_of(url):
+    """Site id of a series URL, or its host when no site definition matches."""
+    try:
+        from scrapers.site_config import get_site_config_for_url
+        site_id, _ = get_site_config_for_url(url)
+    except ImportError:
+        site_id = None
+    return site_id or urlparse(url).netloc.lower()
+
+
+class Catalog:
+    """Thread-safe access to the catalog database."""
+
+    def __init__(self, path=None):
+        self.path = path or data_path(CATALOG_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('PRAGMA foreign_keys=ON')
+            self._conn.executescript(SCHEMA)
+            self._conn.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _series_id(self, url, title=None):
+        row = self._conn.execute('SELECT id FROM series WHERE url = ?', (url,)).fetchone()
+        if row:
+            return row['id']
+        cursor = self._conn.execute(
+            'INSERT INTO series (url, site, title) VALUES (?, ?, ?)', (url, site_of(url), title or url))
+        return cursor.lastrowid
+
+    # Writes
+
+    def record_series(self, url, title, chapters):
+        """Record a discovered series and its chapter list (dicts with ``id`` and ``chapter``)."""
+        now = time.time()
+        with self._lock, self._conn:
+            series_id = self._series_id(url, title)
+            self._conn.execute('UPDATE series SET title = ?, chapter_count = ?, checked_at = ? WHERE id = ?',
+                               (title, len(chapters), now, series_id))
+            self._conn.executemany(
+                'INSERT INTO chapters (series_id, source_id, number) VALUES (?, ?, ?) '
+                'ON CONFLICT (series_id, source_id) DO UPDATE SET number = excluded.number',
+                [(series_id, str(ch['id']), str(ch['chapter'])) for ch in chapters])
+
+    def record_chapter(self, series_url, chapter, folder, ok, title=None):
+        """Record a chapter download and, if it finished, the pages listed in its manifest."""
+        manifest = ChapterManifest(folder) if ok and os.path.isdir(folder) else None
+        pages = manifest.pages.values() if manifest else []
+        now = time.time()
+        with self._lock, self._conn:
+            series_id = self._series_id(series_url, title)
+            key = (series_id, str(chapter['id']))
+            self._conn.execute(
+                'INSERT INTO chapters (series_id, source_id, number) VALUES (?, ?, ?) '
+                'ON CONFLICT (series_id, source_id) DO UPDATE SET number = excluded.number',
+                key + (str(chapter['chapter']),))
+            chapter_id = self._conn.execute('SELECT id FROM chapters WHERE series_id = ? AND source_id = ?',
+                                            key).fetchone()['id']
+            if not ok:
+                self._conn.execute("UPDATE chapters SET status = ? WHERE id = ? AND status != ?",
+                                   (FAILED, chapter_id, DONE))
+                return
+            self._conn.execute('DELETE FROM pages WHERE chapter_id = ?', (chapter_id,))
+            self._conn.executemany(
+                'INSERT INTO pages (chapter_id, file, source_url, bytes, format, sha256) VALUES (?, ?, ?, ?, ?, ?)',
+                [(chapter_id, p['file'], p.get('source'), p['bytes'], p.get('format'), p.get('sha256'))
+                 for p in pages])
+            self._conn.execute(
+                'UPDATE chapters SET status = ?, folder = ?, source_url = ?, pages = ?, bytes = ?, '
+                'downloaded_at = ? WHERE id = ?',
+                (DONE, os.path.abspath(folder), manifest.source_url if manifest else None, len(pages),
+                 sum(p['bytes'] for p in pages), now, chapter_id))
+            self._conn.execute('UPDATE series SET updated_at = ? WHERE id = ?', (now, series_id))
+
+    def forget_series(self, url):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM series WHERE url = ?', (url,))
+
+    # Queries
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def series(self):
+        """Every series with its chapter counts."""
+        return self._query(
+            'SELECT s.url, s.site, s.title, s.chapter_count, s.checked_at, s.updated_at, '
+            "COALESCE(SUM(c.status = 'done'), 0) AS downloaded "
+            'FROM series s LEFT JOIN chapters c ON c.series_id = s.id GROUP BY s.id ORDER BY s.title')
+
+    def missing_chapters(self, series_url=None):
+        """Chapters that are known but not downloaded, optionally of one series."""
+        sql = ('SELECT s.url AS series_url, s.title, c.source_id AS id, c.number AS chapter, c.status '
+               'FROM chapters c JOIN series s ON s.id = c.series_id WHERE c.status != ?')
+        params = [DONE]
+        if series_url:
+            sql += ' AND s.url = ?'
+            params.append(series_url)
+        return self._query(sql + ' ORDER BY s.title, c.id', params)
+
+    def site_totals(self):
+        """Series, chapters, pages and bytes downloaded per site."""
+        return self._query(
+            'SELECT s.site, COUNT(DISTINCT s.id) AS series, COUNT(c.id) AS chapters, '
+            'COALESCE(SUM(c.pages), 0) AS pages, COALESCE(SUM(c.bytes), 0) AS bytes '
+            "FROM series s LEFT JOIN chapters c ON c.series_id = s.id AND c.status = 'done' "
+            'GROUP BY s.site ORDER BY s.site')
+
+    def stale_series(self, older_than=7 * 24 * 3600):
+        """Series whose chapter list was not checked in ``older_than`` seconds."""
+        cutoff = time.time() - older_than
+        return self._query('SELECT url, title, site, checked_at FROM series '
+                           'WHERE checked_at IS NULL OR checked_at < ? ORDER BY checked_at', (cutoff,))
+
+    def find_page(self, sha256):
+        """Pages already stored with this content hash."""
+        return self._query('SELECT c.folder, p.file, p.source_url FROM pages p '
+                           'JOIN chapters c ON c.id = p.chapter_id WHERE p.sha256 = ?', (sha256,))
+
+
+if os.environ.get('WEBCOMIC_CATALOG') == '0':
+    configure_catalog(enabled=False)
@@ -0,0 +1,192 @@
+"""
+CPU-bound tasks that can run in the shared process pool.
+
+Every function here takes bytes/strings and plain containers and returns
+plain data, so it can be pickled to a worker process by
+``utils.process_pool.run_cpu``. Parsed trees and decoded images never leave
+the worker, and trees are torn down as soon as their data is extracted: a
+soup is a web of parent/child reference cycles that would otherwise wait for
+the cyclic garbage collector, which on a long run lets them pile up.
+"""
+
+import io
+from contextlib import contextmanager
+
+WP_INDICATORS = ['wp-content', 'wp-includes', 'wordpress', 'wp-manga', 'madara']
+MANGA_INDICATORS = ['chapter', 'manga', 'manhwa', 'manhua']
+
+
+def parse_html(html):
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(html, 'html.parser')
+
+
+@contextmanager
+def parsed(html):
+    """Parse ``html`` and decompose the tree when the block ends."""
+    soup = parse_html(html)
+    try:
+        yield soup
+    finally:
+        soup.decompose()
+
+
+def node_attrs(node):
+    """Flatten a tag into a dict of its attributes plus its parent's classes."""
+    attrs = dict(node.attrs)
+    parent = node.parent
+    attrs['parent_class'] = ' '.join(parent.get('class', [])) if parent is not None else ''
+    return attrs
+
+
+# HTML
+
+def looks_like_wp_manga(html):
+    """True if the page looks like a WordPress manga site."""
+    with parsed(html) as soup:
+        page_text = soup.get_text().lower()
+        html_content = str(soup).lower()
+    has_wp = any(indicator in html_content for indicator in WP_INDICATORS)
+    has_manga = any(indicator in page_text for indicator in MANGA_INDICATORS)
+    return has_wp and has_manga
+
+
+def select_links(html, selectors):
+    """Return ``(selected, all_links, selector)``; links are ``(href, text)`` pairs.
+
+    ``selected`` holds the links of the first selector that matched anything
+    and ``selector`` is that selector (or None); ``all_links`` every anchor
+    with an href, for generic fallbacks.
+    """
+    selected = []
+    matched = None
+    with parsed(html) as soup:
+        for selector in selectors:
+            links = soup.select(selector)
+            if links:
+                selected = [(str(link.get('href', '')), link.get_text().strip()) for link in links]
+                matched = selector
+                break
+        all_links = [(str(link.get('href', '')), link.get_text().strip())
+                     for link in soup.find_all('a', href=True)]
+    return selected, all_links, matched
+
+
+def select_images(html, selectors, scripts_if_empty=False):
+    """Return ``(selected, all_images, scripts, selector)`` for a chapter page.
+
+    Images are attribute dicts (see ``node_attrs``). ``selected`` comes from the
+    first selector that matched, which is returned as ``selector``;
+    ``scripts`` holds the text of every ``<script>`` but only when no selector
+    matched and it was asked for.
+    """
+    selected = []
+    matched = None
+    scripts = []
+    with parsed(html) as soup:
+        for selector in selectors:
+            images = soup.select(selector)
+            if images:
+                selected = [node_attrs(img) for img in images]
+                matched = selector
+                break
+        all_images = [node_attrs(img) for img in soup.find_all('img')]
+        if scripts_if_empty and not selected:
+            scripts = [script.get_text() for script in soup.find_all('script')]
+    return selected, all_images, scripts, matched
+
+
+# Meta tags naming a page's representative image, best first
+COVER_META = [
+    ('property', 'og:image'),
+    ('property', 'og:image:url'),
+    ('name', 'twitter:image'),
+]
+
+
+def meta_image(html):
+    """The page's cover image URL from its ``og:image`` style meta tags, or None."""
+    with parsed(html) as soup:
+        for attr, value in COVER_META:
+            tag = soup.find('meta', attrs={attr: value})
+            if tag is not None and tag.get('content', '').strip():
+                return tag['content'].strip()
+        link = soup.find('link', rel='image_src')
+        return link.get('href') if link is not None else None
+
+
+# Images
+
+def verify_image(data):
+    """Decode the image header; returns ``(format, width, height)`` or raises."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.verify()
+        return img.format, img.width, img.height
+
+
+# Optional Pillow plugins that register extra encoders when imported
+FORMAT_PLUGINS = {
+    'AVIF': 'pillow_avif',
+    'JXL': 'pillow_jxl',
+}
+
+
+def load_format_plugin(fmt):
+    """Import the encoder plugin for ``fmt`` if Pillow lacks native support."""
+    from PIL import Image
+
+    fmt = fmt.upper()
+    Image.init()
+    if fmt not in Image.SAVE and fmt in FORMAT_PLUGINS:
+        try:
+            __import__(FORMAT_PLUGINS[fmt])
+        except ImportError:
+            pass
+    return fmt in Image.SAVE
+
+
+def convert_image(data, fmt, quality=85):
+    """Re-encode image bytes to ``fmt`` (e.g. 'WEBP') and return the new bytes."""
+    from PIL import Image
+
+    fmt = fmt.upper().replace('JPG', 'JPEG')
+    if not load_format_plugin(fmt):
+        raise ValueError(f"Pillow cannot encode {fmt}")
+    with Image.open(io.BytesIO(data)) as img:
+        if fmt == 'JPEG' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        elif img.mode == 'P':
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+        out = io.BytesIO()
+        img.save(out, format=fmt, quality=quality)
+        return out.getvalue()
+
+
+def transcode_image(data, fmt, quality=85):
+    """Re-encode to ``fmt``; returns None when that would not make the image smaller."""
+    converted = convert_image(data, fmt, quality)
+    return converted if len(converted) < len(data) else None
+
+
+def make_thumbnail(data, width, height, quality=80):
+    """JPEG bytes of the image scaled to fit ``width`` x ``height``.
+
+    Long strips are cropped to their top first, so a webtoon chapter shows
+    its opening panel instead of a sliver. JPEGs are decoded at a reduced
+    scale, never at full size.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft('RGB', (width, height))
+        tallest = img.width * height // width
+        if img.height > tallest:
+            img = img.crop((0, 0, img.width, tallest))
+        img = img.convert('RGB')
+        img.thumbnail((width, height))
+        out = io.BytesIO()
+        img.save(out, format='JPEG', quality=quality, optimize=True)
+        return out.getvalue()
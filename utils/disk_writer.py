@@ -0,0 +1,138 @@
+"""
+Background writer for downloaded pages.
+
+Downloader threads hand finished page buffers to ``submit_write`` and go
+back to the network; a writer thread puts them on disk. The queue is bounded
+by bytes (``WEBCOMIC_WRITE_QUEUE_MB``, default 64), so when the disk falls
+behind, ``submit_write`` blocks and the downloaders slow down to its pace
+instead of buffering without limit.
+
+Each file is written under a temporary name in one go and renamed into place.
+Files are not fsynced one by one: ``sync_folder`` flushes every file written
+to a chapter folder, then the folder itself, once the chapter is finished.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+DEFAULT_QUEUE_MB = 64
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class DiskWriter:
+    """A writer thread fed from a queue bounded by the bytes it holds."""
+
+    def __init__(self, max_bytes=DEFAULT_QUEUE_MB * 1024 * 1024, sync=True):
+        self.max_bytes = max_bytes
+        self.sync = sync
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._unsynced = {}
+        self._thread = None
+
+    def submit(self, path, data, callback=None):
+        """Queue ``data`` for ``path``; blocks while the queue is full.
+
+        Returns a future with ``callback()``'s result (True without one) once
+        the file is in place, or False if it could not be written.
+        """
+        size = len(data)
+        with self._cond:
+            # A single buffer larger than the budget still goes through on its own
+            while self._pending and self._pending + size > self.max_bytes:
+                self._cond.wait()
+            self._pending += size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='disk-writer', daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((path, data, callback, future))
+        return future
+
+    def _run(self):
+        while True:
+            path, data, callback, future = self._queue.get()
+            try:
+                self._write(path, data)
+                result = callback() if callback else True
+            except Exception as e:
+                print(f"Error writing {path}: {e}")
+                result = False
+            finally:
+                with self._cond:
+                    self._pending -= len(data)
+                    self._cond.notify_all()
+            future.set_result(result)
+
+    def _write(self, path, data):
+        tmp_path = path + '.part'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+        if self.sync:
+            with self._cond:
+                self._unsynced.setdefault(os.path.dirname(os.path.abspath(path)), set()).add(path)
+
+    def sync_folder(self, folder):
+        """fsync the files written to ``folder`` since the last call, then the folder."""
+        with self._cond:
+            paths = self._unsynced.pop(os.path.abspath(folder), ())
+        if not paths:
+            return
+        for path in paths:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue  # replaced since, e.g. by transcoding or strip normalization
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        try:
+            fd = os.open(folder, os.O_RDONLY)
+        except OSError:
+            return  # directories cannot be opened on Windows
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def configure_disk_writer(queue_mb=DEFAULT_QUEUE_MB, sync=True):
+    """Set the write queue budget in MB and whether finished chapters are fsynced."""
+    global _writer
+    with _writer_lock:
+        _writer = DiskWriter(int(queue_mb * 1024 * 1024), sync)
+
+
+def disk_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = DiskWriter()
+        return _writer
+
+
+def submit_write(path, data, callback=None):
+    return disk_writer().submit(path, data, callback)
+
+
+def sync_folder(folder):
+    disk_writer().sync_folder(folder)
+
+
+_env = os.environ.get('WEBCOMIC_WRITE_QUEUE_MB')
+if _env:
+    configure_disk_writer(float(_env))
@@ -0,0 +1,127 @@
+"""
+Cheap integrity checks for downloaded images.
+
+``StreamVerifier`` is fed the chunks of a response as they arrive. It rejects
+anything that does not start with a known image signature (for example a
+Cloudflare challenge page served as ``001.jpg``) after the first chunk, and
+on completion checks the byte count against ``Content-Length`` and the
+format's end marker to catch truncated transfers.
+
+A full Pillow header decode can be enabled on top with ``WEBCOMIC_VERIFY_DECODE=1``
+or ``configure_verification(decode=True)``; it runs in the CPU pool.
+"""
+
+import os
+
+from .cpu_tasks import verify_image
+from .process_pool import run_cpu
+
+_decode = os.environ.get('WEBCOMIC_VERIFY_DECODE', '') not in ('', '0')
+
+# Enough bytes to identify every format below
+HEAD_SIZE = 16
+
+
+class ImageCheckError(Exception):
+    """Raised when downloaded data is not a complete, valid image."""
+
+
+def configure_verification(decode=False):
+    """Enable or disable the Pillow decode check."""
+    global _decode
+    _decode = bool(decode)
+
+
+def sniff_format(head):
+    """Identify an image format from its first bytes; None if unknown."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'GIF'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    if head[4:8] == b'ftyp' and head[8:12] in (b'avif', b'avis', b'heic', b'heix', b'mif1'):
+        return 'AVIF'
+    if head.startswith(b'\xff\x0a') or head.startswith(b'\x00\x00\x00\x0cJXL '):
+        return 'JXL'
+    if head.startswith(b'BM'):
+        return 'BMP'
+    return None
+
+
+def describe_bad_head(head):
+    text = head.lstrip().lower()
+    if text.startswith((b'<!doctype', b'<html', b'<head', b'<?xml', b'<')):
+        return "got an HTML page instead of an image (challenge or error page?)"
+    if text.startswith((b'{', b'[')):
+        return "got a JSON response instead of an image"
+    return f"unrecognised image signature {head[:8]!r}"
+
+
+def check_trailer(fmt, tail):
+    """True if ``tail`` (the last bytes of the file) ends like a complete ``fmt`` image."""
+    if fmt == 'JPEG':
+        # Some encoders append padding after the EOI marker
+        return b'\xff\xd9' in tail
+    if fmt == 'PNG':
+        return b'IEND' in tail
+    if fmt == 'GIF':
+        return tail.rstrip(b'\x00').endswith(b';')
+    return True
+
+
+class StreamVerifier:
+    """Incrementally validates an image download."""
+
+    def __init__(self, expected_length=None):
+        self.expected_length = int(expected_length) if expected_length else None
+        self.received = 0
+        self.format = None
+        self._head = b''
+        self._tail = b''
+
+    def feed(self, chunk):
+        if self.format is None:
+            self._head += chunk[:HEAD_SIZE]
+            if len(self._head) >= HEAD_SIZE:
+                self._check_head()
+        self.received += len(chunk)
+        self._tail = (self._tail + chunk[-32:])[-32:]
+
+    def _check_head(self):
+        self.format = sniff_format(self._head)
+        if self.format is None:
+            raise ImageCheckError(describe_bad_head(self._head))
+
+    def finish(self, data=None):
+        """Run the end-of-stream checks; ``data`` enables the optional decode check."""
+        if self.format is None:
+            if not self._head:
+                raise ImageCheckError("empty response")
+            self._check_head()
+        if self.expected_length is not None and self.received != self.expected_length:
+            raise ImageCheckError(f"truncated: got {self.received} of {self.expected_length} bytes")
+        if not check_trailer(self.format, self._tail):
+            raise ImageCheckError(f"truncated: {self.format} end marker missing")
+        if _decode and data is not None:
+            try:
+                run_cpu(verify_image, bytes(data))
+            except Exception as e:
+                raise ImageCheckError(f"does not decode: {e}")
+        return self.format
+
+
+def check_file(path):
+    """Cheap check that a file on disk looks like a complete image."""
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            head = f.read(HEAD_SIZE)
+            f.seek(max(0, size - 32))
+            tail = f.read()
+    except OSError:
+        return False
+    fmt = sniff_format(head)
+    return fmt is not None and check_trailer(fmt, tail)
@@ -0,0 +1,208 @@
+"""
+Write-ahead journal of download jobs.
+
+Every change to a job - a series added or its language or chapter selection changed,
+its chapter list scheduled, a chapter started, a page stored, a chapter
+completed or failed - is appended to a JSON-lines journal *before* it is
+acted on, and applied to the in-memory state. Appends are flushed at once and fsynced at most every
+``SYNC_INTERVAL`` seconds, so a crashed process loses nothing and a crashed
+host at most the last second (which only means re-downloading a page).
+
+The journal is compacted once it holds ``COMPACT_AFTER`` events: the state is
+written as a snapshot (with the sequence number of the last event it
+contains) and the journal starts over. On start the snapshot is loaded and
+the newer events are replayed on top; a torn last line is ignored. Chapters
+that were running are scheduled again with the pages they had already
+stored, so finished chapters are neither re-discovered nor re-downloaded.
+"""
+
+import json
+import os
+import threading
+import time
+
+from .manifest import seed_manifest, watch_pages
+from .paths import atomic_write
+
+PENDING = 'pending'
+ACTIVE = 'active'
+DONE = 'done'
+FAILED = 'failed'
+
+COMPACT_AFTER = 5000
+SYNC_INTERVAL = 1.0
+
+
+def new_series(url, lang='en', title=None, selection=None):
+    return {'url': url, 'lang': lang, 'title': title or url, 'selection': selection, 'status': PENDING,
+            'error': None, 'chapters': []}
+
+
+def _chapter_finished(entry):
+    statuses = {c['status'] for c in entry['chapters']}
+    if statuses <= {DONE}:
+        entry['status'] = DONE
+    elif not statuses & {PENDING, ACTIVE}:
+        entry['status'] = FAILED
+
+
+def _relist(entry, **fields):
+    """Change what is listed for a series; it is listed again, and finished chapters stay done."""
+    done = set(entry.get('done', [])) | {ch['id'] for ch in entry['chapters'] if ch['status'] == DONE}
+    entry.update(fields, status=PENDING, error=None, chapters=[], done=sorted(done))
+
+
+def apply_event(series, event):
+    """Apply one journal event to ``series`` (``{url: entry}``)."""
+    op = event['op']
+    entry = series.get(event['url'])
+    if op == 'series':
+        lang = event.get('lang', 'en')
+        if entry is None:
+            series[event['url']] = new_series(event['url'], lang, event.get('title'), event.get('selection'))
+        elif entry.get('lang') != lang:
+            # Another language has its own chapter list
+            _relist(entry, lang=lang)
+        return
+    if entry is None:
+        return
+    if op == 'remove':
+        del series[event['url']]
+    elif op == 'select':
+        _relist(entry, selection=event.get('selection'))
+    elif op == 'status':
+        entry.update(status=event['status'], error=event.get('error'))
+    elif op == 'chapters':
+        # A refreshed chapter list keeps what was already finished
+        done = set(entry.get('done', [])) | {ch['id'] for ch in entry['chapters'] if ch['status'] == DONE}
+        entry['chapters'] = [{'id': ch['id'], 'chapter': str(ch['chapter']),
+                              'status': DONE if ch['id'] in done else PENDING}
+                             for ch in event['chapters']]
+        # A new selection may only list chapters that are finished already
+        _chapter_finished(entry)
+    elif op in ('start', 'page', 'done', 'failed'):
+        index = event['index']
+        if index >= len(entry['chapters']):
+            return
+        ch = entry['chapters'][index]
+        if op == 'start':
+            ch['status'] = ACTIVE
+        elif op == 'page':
+            ch.setdefault('pages', {})[event['page']['file']] = event['page']
+        else:
+            ch['status'] = DONE if op == 'done' else FAILED
+            if op == 'done':
+                ch.pop('pages', None)
+            _chapter_finished(entry)
+
+
+class JobJournal:
+    """Job state backed by a snapshot and an append-only journal of changes."""
+
+    def __init__(self, snapshot_path, journal_path=None):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + '.journal'
+        self.series = {}
+        self.lock = threading.RLock()
+        self._seq = 0
+        self._events = 0
+        self._file = None
+        self._last_sync = 0.0
+        self.load()
+
+    def load(self):
+        """Rebuild the state from the snapshot and the journal."""
+        with self.lock:
+            self.series = {}
+            self._seq = 0
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, encoding='utf-8') as f:
+                    data = json.load(f)
+                self.series = data.get('series', {})
+                self._seq = data.get('seq', 0)
+            self._events = 0
+            if os.path.exists(self.journal_path):
+                good = 0
+                with open(self.journal_path, 'rb') as f:
+                    for line in f:
+                        try:
+                            if not line.endswith(b'\n'):
+                                raise ValueError
+                            event = json.loads(line)
+                        except ValueError:
+                            break  # torn write at the end of the journal
+                        good += len(line)
+                        if event.get('seq', 0) > self._seq:
+                            apply_event(self.series, event)
+                            self._seq = event['seq']
+                        self._events += 1
+                    torn = f.seek(0, os.SEEK_END) > good
+                if torn:
+                    # Cut the fragment off so the next event starts on a line of its own
+                    with open(self.journal_path, 'r+b') as f:
+                        f.truncate(good)
+            # Anything that was running when we stopped starts over
+            for entry in self.series.values():
+                if entry['status'] == ACTIVE:
+                    entry['status'] = PENDING
+                for ch in entry.get('chapters', []):
+                    if ch['status'] == ACTIVE:
+                        ch['status'] = PENDING
+
+    def record(self, op, url, **fields):
+        """Append an event to the journal, then apply it to the state."""
+        with self.lock:
+            self._seq += 1
+            event = dict(fields, op=op, url=url, seq=self._seq)
+            if self._file is None:
+                self._file = open(self.journal_path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(event) + '\n')
+            self._file.flush()
+            now = time.monotonic()
+            if now - self._last_sync >= SYNC_INTERVAL:
+                os.fsync(self._file.fileno())
+                self._last_sync = now
+            apply_event(self.series, event)
+            self._events += 1
+            if self._events >= COMPACT_AFTER:
+                self.compact()
+
+    def compact(self):
+        """Write the state as a snapshot and start an empty journal."""
+        with self.lock:
+            # On disk, directory entry included, before the journal it replaces is truncated
+            atomic_write(self.snapshot_path, json.dumps({'seq': self._seq, 'series': self.series}), sync=True)
+            if self._file is not None:
+                self._file.close()
+            # Truncated only after the snapshot is in place; leftovers are skipped by seq
+            self._file = open(self.journal_path, 'w', encoding='utf-8')
+            self._events = 0
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+
+def journaled_download(journal, url, index, folder, download):
+    """Run ``download()`` for chapter ``index`` of a series, journaling it and its pages.
+
+    Pages stored by an interrupted earlier attempt are put back into the
+    chapter manifest first, so the scraper skips them. Returns the result of
+    ``download``; an exception counts as a failure and is re-raised.
+    """
+    ch = journal.series[url]['chapters'][index]
+    if ch.get('pages'):
+        seed_manifest(folder, list(ch['pages'].values()))
+    journal.record('start', url, index=index)
+    watch_pages(folder, lambda page: journal.record('page', url, index=index, page=page))
+    ok = False
+    try:
+        ok = download()
+    finally:
+        watch_pages(folder, None)
+        journal.record('done' if ok else 'failed', url, index=index)
+    return ok
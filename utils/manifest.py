@@ -0,0 +1,166 @@
+"""
+Per-chapter manifest describing the stored pages.
+
+``manifest.json`` in each chapter folder lists the pages in reading order
+with their source URL, stored size, SHA-256 of the stored file and, when they
+were transcoded, the original size and format.
+"""
+
+import json
+import os
+import threading
+import time
+
+from .disk_writer import sync_folder
+from .paths import atomic_write
+
+MANIFEST_NAME = 'manifest.json'
+# Re-cut strip pages are written under this suffix until they replace the originals
+STRIP_SUFFIX = '.strip'
+
+# Callbacks told about every page stored in a folder (see watch_pages)
+_page_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def watch_pages(folder, callback):
+    """Call ``callback(record)`` for each page stored in ``folder``; None stops watching."""
+    key = os.path.abspath(folder)
+    with _watchers_lock:
+        if callback is None:
+            _page_watchers.pop(key, None)
+        else:
+            _page_watchers[key] = callback
+
+
+def seed_manifest(folder, records):
+    """Add page records (e.g. replayed from the job journal) to a chapter's manifest."""
+    manifest = ChapterManifest(folder)
+    for record in records:
+        if os.path.exists(os.path.join(folder, record['file'])):
+            manifest.pages.setdefault(record['file'], record)
+    manifest.save()
+
+
+class ChapterManifest:
+    """Collects page records while a chapter downloads and writes them out."""
+
+    def __init__(self, folder, source_url=None):
+        self.folder = folder
+        self.source_url = source_url
+        self.pages = {}
+        self.strips = None
+        self._pending = []
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Keep records of pages stored by an earlier run of the same chapter."""
+        try:
+            with open(os.path.join(self.folder, MANIFEST_NAME), encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.source_url = self.source_url or data.get('source')
+        self.strips = data.get('strips')
+        pages = data.get('pages', [])
+        if self.strips:
+            # Normalization may have stopped between saving this manifest and moving the pages
+            self.finish_strips([page['file'] for page in pages])
+        for page in pages:
+            if os.path.exists(os.path.join(self.folder, page['file'])):
+                self.pages[page['file']] = page
+
+    def add_page(self, filename, source_url, size, fmt=None, original_size=None, original_format=None,
+                 sha256=None):
+        record = {
+            'file': filename,
+            'source': source_url,
+            'bytes': size,
+            'format': fmt,
+            'sha256': sha256,
+        }
+        if original_size is not None:
+            record['original_bytes'] = original_size
+            record['original_format'] = original_format
+        with self._lock:
+            self.pages[filename] = record
+        with _watchers_lock:
+            callback = _page_watchers.get(os.path.abspath(self.folder))
+        if callback is not None:
+            callback(record)
+
+    def stored_page(self, filename, source_url=None):
+        """True if the page stored as ``filename`` (or its transcoded form) is already complete."""
+        stem = os.path.splitext(filename)[0]
+        with self._lock:
+            records = list(self.pages.values())
+        for record in records:
+            if os.path.splitext(record['file'])[0] == stem and record.get('source') is not None and (
+                    source_url is None or record['source'] == source_url):
+                return os.path.exists(os.path.join(self.folder, record['file']))
+        # Source pages of a re-cut strip live on in the new pages
+        for record in (self.strips or {}).get('sources', []):
+            if os.path.splitext(record['file'])[0] == stem and (
+                    source_url is None or record.get('source') == source_url):
+                return bool(records)
+        return False
+
+    def replace_pages(self, pages, strips=None):
+        """Swap in re-cut pages given as ``(filename, size, format, sha256)``."""
+        with self._lock:
+            self.pages = {name: {'file': name, 'source': None, 'bytes': size, 'format': fmt, 'sha256': digest}
+                          for name, size, fmt, digest in pages}
+            self.strips = strips
+
+    def finish_strips(self, files=None):
+        """Move re-cut strip pages into place, then remove the pages they replace.
+
+        ``files`` are the page files the saved manifest lists (default: the current pages).
+        """
+        files = list(self.pages) if files is None else files
+        for name in files:
+            strip = os.path.join(self.folder, name + STRIP_SUFFIX)
+            if os.path.exists(strip):
+                os.replace(strip, os.path.join(self.folder, name))
+        for name in (self.strips or {}).get('replaced', []):
+            path = os.path.join(self.folder, name)
+            if name not in files and os.path.exists(path):
+                os.remove(path)
+
+    def defer(self, future):
+        """Track background work (e.g. transcoding) that must finish before saving."""
+        with self._lock:
+            self._pending.append(future)
+
+    def wait(self):
+        """Wait for deferred work; returns False if any of it failed."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        ok = True
+        for future in pending:
+            if not future.result():
+                ok = False
+        return ok
+
+    def totals(self):
+        stored = sum(p['bytes'] for p in self.pages.values())
+        original = sum(p.get('original_bytes', p['bytes']) for p in self.pages.values())
+        return {'page_count': len(self.pages), 'original_bytes': original, 'stored_bytes': stored,
+                'saved_bytes': original - stored}
+
+    def save(self):
+        """Wait for deferred work and write ``manifest.json``; returns False if any work failed."""
+        ok = self.wait()
+        sync_folder(self.folder)
+        data = {
+            'source': self.source_url,
+            'updated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'pages': [self.pages[name] for name in sorted(self.pages)],
+        }
+        data.update(self.totals())
+        if self.strips:
+            data['strips'] = self.strips
+        os.makedirs(self.folder, exist_ok=True)
+        atomic_write(os.path.join(self.folder, MANIFEST_NAME), json.dumps(data, indent=2))
+        return ok
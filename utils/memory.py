@@ -0,0 +1,122 @@
+"""
+Memory report for long-running sessions.
+
+``memory_report()`` describes where the process's memory is: resident size,
+live objects the downloader is known to accumulate (parse trees, chapter
+records, open manifests) and, once tracing is on, the source lines holding
+the most memory and what changed since the previous report. Tracing
+(``tracemalloc``) slows allocation down, so it only starts with
+``WEBCOMIC_TRACEMALLOC=1``, ``cli.py --trace-memory`` or ``start_tracing()``.
+
+The CLI prints a report on ``SIGUSR1`` (``kill -USR1 <pid>``); the GUI has a
+Memory Report button.
+"""
+
+import gc
+import os
+import signal
+import sys
+import threading
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Frames kept per traced allocation
+TRACE_FRAMES = 1
+
+_last_snapshot = None
+_lock = threading.Lock()
+
+# Allocations of the tracing machinery itself are left out of reports
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB now, or its peak where that is all we can get."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def start_tracing(frames=TRACE_FRAMES):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def live_objects():
+    """Counts of live objects the downloader is known to hold on to."""
+    counts = {}
+    watched = {}
+    bs4 = sys.modules.get('bs4')
+    if bs4 is not None:
+        watched['bs4 tags'] = bs4.element.Tag
+    index = sys.modules.get('scrapers.chapter_index')
+    if index is not None:
+        watched['chapter records'] = index.ChapterRecord
+    manifest = sys.modules.get('utils.manifest')
+    if manifest is not None:
+        watched['chapter manifests'] = manifest.ChapterManifest
+    if watched:
+        for obj in gc.get_objects():
+            for name, cls in watched.items():
+                if isinstance(obj, cls):
+                    counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def memory_report(limit=10):
+    """Text report of the process's memory use; see the module docstring."""
+    global _last_snapshot
+    lines = []
+    rss = current_rss_mb()
+    lines.append(f"RSS: {rss:.1f} MB" if rss is not None else "RSS: unknown")
+    collected = gc.collect()
+    lines.append(f"Garbage collector: {len(gc.get_objects())} tracked objects, {collected} collected now")
+    for name, count in sorted(live_objects().items()):
+        lines.append(f"  {name}: {count}")
+    if not tracemalloc.is_tracing():
+        lines.append("Allocation tracing is off (start with --trace-memory or WEBCOMIC_TRACEMALLOC=1).")
+        return '\n'.join(lines)
+    with _lock:
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        previous, _last_snapshot = _last_snapshot, snapshot
+    current, peak = tracemalloc.get_traced_memory()
+    lines.append(f"Traced: {current / (1024 * 1024):.1f} MB now, {peak / (1024 * 1024):.1f} MB peak")
+    lines.append(f"Top {limit} lines:")
+    for stat in snapshot.statistics('lineno')[:limit]:
+        lines.append(f"  {stat.size / 1024:10.1f} KB {stat.count:8d} blocks  {stat.traceback}")
+    if previous is not None:
+        lines.append("Growth since the previous report:")
+        for stat in snapshot.compare_to(previous, 'lineno')[:limit]:
+            lines.append(f"  {stat.size_diff / 1024:+10.1f} KB {stat.count_diff:+8d} blocks  {stat.traceback}")
+    return '\n'.join(lines)
+
+
+def install_report_signal():
+    """Print a memory report whenever the process receives SIGUSR1 (POSIX only)."""
+    if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, lambda signum, frame: print(memory_report(), flush=True))
+
+
+if os.environ.get('WEBCOMIC_TRACEMALLOC') == '1':
+    start_tracing()
@@ -0,0 +1,55 @@
+"""
+Locations for persistent application state.
+
+State (queues, caches, catalogs) lives in ``~/.webcomic-downloader`` unless
+the ``WEBCOMIC_DATA_DIR`` environment variable points somewhere else.
+Downloaded chapters still go to ``downloads/`` in the working directory.
+"""
+
+import os
+import re
+
+DATA_DIR = os.environ.get('WEBCOMIC_DATA_DIR') or os.path.join(os.path.expanduser('~'), '.webcomic-downloader')
+DOWNLOADS_DIR = 'downloads'
+
+
+def data_path(*parts):
+    """Return a path inside the data directory, creating the directory."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, *parts)
+
+
+def atomic_write(path, data, sync=False):
+    """Write text to ``path`` via a temporary file so readers never see half a file.
+
+    With ``sync`` the file and its directory are flushed to disk before this
+    returns, so the new contents survive a crash of the host.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if sync:
+        sync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def sync_directory(folder):
+    """fsync a directory so renames in it are durable; a no-op where directories cannot be opened."""
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return  # Windows
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def safe_name(name):
+    """Strip characters that are invalid in Windows file names."""
+    return re.sub(r'[<>:"/\\|?*]', '', name).rstrip('. ')
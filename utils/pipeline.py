@@ -0,0 +1,123 @@
+"""
+Staged chapter download pipeline.
+
+On WordPress and Asura every chapter needs its reader page fetched (after
+the random request delay) and parsed before its first image can start.
+Downloading chapters one after another leaves the connection idle for that
+whole time. The pipeline splits the work into two stages with their own
+threads:
+
+* resolvers call ``scraper.get_image_urls(chapter_id)`` for the chapters
+  ahead and put the page lists on a bounded queue;
+* fetchers take resolved chapters off the queue and download their pages
+  (``scraper.download_pages``).
+
+So while one chapter's images download, the next chapters' pages are being
+resolved; the queue bound (``WEBCOMIC_RESOLVE_AHEAD``, default 4) keeps the
+resolvers from running arbitrarily far ahead of the downloads, whose image
+URLs may expire. Stage sizes come from ``WEBCOMIC_RESOLVERS`` (default 2) and
+``WEBCOMIC_FETCHERS`` (default 1) or ``configure_pipeline``.
+"""
+
+import os
+import queue
+import threading
+
+DEFAULT_RESOLVERS = 2
+DEFAULT_FETCHERS = 1
+DEFAULT_AHEAD = 4
+
+_resolvers = int(os.environ.get('WEBCOMIC_RESOLVERS', DEFAULT_RESOLVERS) or DEFAULT_RESOLVERS)
+_fetchers = int(os.environ.get('WEBCOMIC_FETCHERS', DEFAULT_FETCHERS) or DEFAULT_FETCHERS)
+_ahead = int(os.environ.get('WEBCOMIC_RESOLVE_AHEAD', DEFAULT_AHEAD) or DEFAULT_AHEAD)
+
+# Marks the end of the resolved queue for one fetcher
+_DONE = object()
+
+
+def configure_pipeline(resolvers=DEFAULT_RESOLVERS, fetchers=DEFAULT_FETCHERS, ahead=DEFAULT_AHEAD):
+    """Set the threads of each stage and how many resolved chapters may wait for download."""
+    global _resolvers, _fetchers, _ahead
+    _resolvers, _fetchers, _ahead = max(1, resolvers), max(1, fetchers), max(1, ahead)
+
+
+class ChapterPipeline:
+    """Resolves chapters' page lists ahead of the threads that download them.
+
+    ``download(job, image_urls)`` runs in a fetcher and returns True if the
+    chapter is complete; ``image_urls`` is None for scrapers that cannot list
+    a chapter's pages up front. ``on_result(job, ok, error)`` is called once
+    per job with the outcome, or the exception raised by either stage.
+    """
+
+    def __init__(self, scraper, resolvers=None, fetchers=None, ahead=None):
+        self.scraper = scraper
+        self.resolvers = resolvers or _resolvers
+        self.fetchers = fetchers or _fetchers
+        self.ahead = ahead or _ahead
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Finish the chapters already downloading and start no new ones."""
+        self._stop.set()
+
+    def run(self, jobs, chapter_id, download, on_result):
+        """Run every job through both stages; ``chapter_id(job)`` names its chapter. Blocks until done."""
+        pending = queue.Queue()
+        for job in jobs:
+            pending.put(job)
+        resolved = queue.Queue(self.ahead)
+        live_resolvers = [self.resolvers]
+        lock = threading.Lock()
+
+        def put(item):
+            # Waits for room unless the pipeline is stopping
+            while not self._stop.is_set():
+                try:
+                    resolved.put(item, timeout=0.2)
+                    return
+                except queue.Full:
+                    continue
+
+        def resolve():
+            try:
+                while not self._stop.is_set():
+                    try:
+                        job = pending.get_nowait()
+                    except queue.Empty:
+                        break
+                    try:
+                        put((job, self.scraper.get_image_urls(chapter_id(job)), None))
+                    except Exception as e:
+                        put((job, None, e))
+            finally:
+                with lock:
+                    live_resolvers[0] -= 1
+                    last = not live_resolvers[0]
+                if last:
+                    for _ in range(self.fetchers):
+                        resolved.put(_DONE)
+
+        def fetch():
+            while True:
+                item = resolved.get()
+                if item is _DONE:
+                    return
+                job, image_urls, error = item
+                if error is None and not self._stop.is_set():
+                    try:
+                        on_result(job, download(job, image_urls), None)
+                        continue
+                    except Exception as e:
+                        error = e
+                if error is not None:
+                    on_result(job, False, error)
+
+        threads = [threading.Thread(target=resolve, name='chapter-resolver', daemon=True)
+                   for _ in range(self.resolvers)]
+        threads += [threading.Thread(target=fetch, name='chapter-fetcher', daemon=True)
+                    for _ in range(self.fetchers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,78 @@
+"""
+Shared process pool for CPU-bound work.
+
+HTML parsing and image processing hold the GIL, so running them on the
+download threads stalls every other transfer. Functions submitted here run
+in a ``ProcessPoolExecutor`` instead; only their (bytes or small) arguments
+and results are pickled across the process boundary, so they must be
+module-level functions such as the ones in ``utils.cpu_tasks``.
+
+The pool size comes from ``WEBCOMIC_CPU_WORKERS`` or ``configure_cpu_pool``.
+With 0 workers (the default) everything runs inline in the calling thread.
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_lock = threading.Lock()
+_pool = None
+_workers = int(os.environ.get('WEBCOMIC_CPU_WORKERS', '0') or 0)
+
+
+def configure_cpu_pool(workers):
+    """Set the number of worker processes; 0 runs CPU work inline. ``None`` means one per core."""
+    global _workers
+    if workers is None:
+        workers = os.cpu_count() or 1
+    shutdown_cpu_pool()
+    with _lock:
+        _workers = max(0, int(workers))
+
+
+def cpu_workers():
+    return _workers
+
+
+def get_cpu_pool():
+    """Return the shared pool, starting it on first use, or None when running inline."""
+    global _pool
+    with _lock:
+        if _workers and _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_workers)
+        return _pool
+
+
+def shutdown_cpu_pool(wait=True):
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
+
+
+def submit_cpu(fn, *args, **kwargs):
+    """Schedule ``fn`` on the pool and return a Future (already resolved when inline)."""
+    pool = get_cpu_pool()
+    if pool is not None:
+        try:
+            return pool.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool next time
+            shutdown_cpu_pool(wait=False)
+    future = Future()
+    try:
+        future.set_result(fn(*args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def run_cpu(fn, *args, **kwargs):
+    """Run ``fn`` on the pool and wait for its result."""
+    try:
+        return submit_cpu(fn, *args, **kwargs).result()
+    except BrokenProcessPool:
+        shutdown_cpu_pool(wait=False)
+        return fn(*args, **kwargs)
@@ -0,0 +1,395 @@
+"""
+Normalize webtoon long strips into fixed-height pages.
+
+Webtoon chapters arrive either as a few enormous images (800x40000) or as
+dozens of thin slices. Both are treated as one continuous virtual strip that
+is streamed top to bottom and cut into pages of about ``page_height`` pixels.
+Cuts are moved to the nearest blank (single-colour) row within ``window``
+pixels so panels are not sliced through, and a short remainder is merged into
+the previous page.
+
+Memory stays bounded: sources are read in tiles of a page plus the search
+window, so only one tile, the pages being assembled and the rows carried
+over to the next tile are decoded at a time. Non-interlaced 8-bit PNGs are
+inflated and decoded tile by tile; Pillow cannot decode part of other
+formats, so those are decoded one source at a time and cropped into tiles.
+Blank rows are only searched for in the window around each cut using
+vectorised numpy row statistics.
+
+The new pages are written next to the originals as ``*.strip`` files and the
+manifest, listing them and the source pages they replace, is saved before
+they are renamed into place and the originals removed, so a crash at any
+point leaves a complete chapter (see ``ChapterManifest.finish_strips``).
+
+Enable with ``WEBCOMIC_STRIP_HEIGHT=2000`` or ``configure_strips(2000)``.
+"""
+
+import hashlib
+import io
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+
+from .manifest import MANIFEST_NAME, STRIP_SUFFIX
+from .process_pool import run_cpu
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.avif', '.jxl', '.gif', '.bmp')
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\x0a'
+# PNG colour type -> samples per pixel
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# Chunks a band needs besides IHDR and IDAT to decode like the whole image
+PNG_BAND_CHUNKS = (b'PLTE', b'tRNS')
+# Most bytes inflated from a PNG at once
+INFLATE_CHUNK = 1 << 20
+# Rows of a PNG decoded at once
+PNG_BAND_ROWS = 256
+# Re-cut pages are named apart from downloaded ones (001.png, 001_<hash>.png),
+# which a later download of the chapter may still write
+PAGE_PREFIX = 'strip-'
+# Pillow's decompression bomb limit while strips are read (e.g. 2000x250000)
+STRIP_MAX_PIXELS = 500_000_000
+
+_pixels_lock = threading.Lock()
+_pixels_users = 0
+_pixels_saved = None
+
+_settings = None
+
+
+def configure_strips(page_height=None, min_height=None, window=None, tolerance=8):
+    """Enable strip normalization with pages of ``page_height`` px; None disables it."""
+    global _settings
+    if not page_height:
+        _settings = None
+        return
+    _settings = {
+        'page_height': int(page_height),
+        'min_height': int(min_height or page_height // 4),
+        'window': int(window or page_height // 5),
+        'tolerance': int(tolerance),
+    }
+
+
+def strip_settings():
+    return _settings
+
+
+@contextmanager
+def _strip_pixel_limit():
+    """Raise Pillow's process-wide pixel limit to ``STRIP_MAX_PIXELS`` while strips are read."""
+    from PIL import Image
+
+    global _pixels_users, _pixels_saved
+    with _pixels_lock:
+        if not _pixels_users:
+            _pixels_saved = Image.MAX_IMAGE_PIXELS
+            if _pixels_saved is not None and _pixels_saved < STRIP_MAX_PIXELS:
+                Image.MAX_IMAGE_PIXELS = STRIP_MAX_PIXELS
+        _pixels_users += 1
+    try:
+        yield
+    finally:
+        with _pixels_lock:
+            _pixels_users -= 1
+            if not _pixels_users:
+                Image.MAX_IMAGE_PIXELS = _pixels_saved
+
+
+def find_cut(img, ideal, window, tolerance):
+    """Return the blank row closest to ``ideal`` within ``window``, or ``ideal`` if none."""
+    import numpy as np
+
+    top = max(0, ideal - window)
+    bottom = min(img.height, ideal + window)
+    if bottom <= top:
+        return ideal
+    tile = np.asarray(img.crop((0, top, img.width, bottom)).convert('L'))
+    # A row is blank when all its pixels have (nearly) the same value
+    blank = (tile.max(axis=1).astype(np.int16) - tile.min(axis=1)) <= tolerance
+    rows = np.flatnonzero(blank)
+    if not rows.size:
+        return ideal
+    return top + int(rows[np.argmin(np.abs(rows + top - ideal))])
+
+
+def _png_chunks(f):
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        length, kind = struct.unpack('>I4s', header)
+        data = f.read(length)
+        f.read(4)  # CRC
+        yield kind, data
+        if kind == b'IEND':
+            return
+
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def _png_bands(f, ihdr, chunks, tile_height):
+    """Decode the rest of a PNG into RGB tiles of ``tile_height`` rows.
+
+    Rows are decoded ``PNG_BAND_ROWS`` at a time: each band is handed to
+    Pillow as a small PNG of its own rows, stored uncompressed, preceded by
+    the previous band's last row so the rows filtered against it decode the
+    same as in the whole image. Bands are pasted into the tile, so only the
+    tile is ever decoded at full size.
+    """
+    from PIL import Image
+
+    width = struct.unpack('>I', ihdr[:4])[0]
+    stride = width * PNG_CHANNELS[ihdr[9]] + 1
+    extra = b''
+    inflater = zlib.decompressobj()
+    rows = bytearray()
+    previous = None
+    tile, filled = None, 0
+
+    def band(count):
+        nonlocal previous, tile, filled
+        data = rows[:count * stride]
+        del rows[:count * stride]
+        first = 0 if previous is None else 1
+        if previous is not None:
+            data[:0] = b'\x00' + previous
+        png = (PNG_SIGNATURE + _png_chunk(b'IHDR', ihdr[:4] + struct.pack('>I', first + count) + ihdr[8:])
+               + extra + _png_chunk(b'IDAT', zlib.compress(data, 0)) + _png_chunk(b'IEND', b''))
+        with Image.open(io.BytesIO(png)) as img:
+            img.load()
+            # The next band's first rows are filtered against this band's last row, unfiltered
+            previous = img.crop((0, first + count - 1, width, first + count)).tobytes()
+            if tile is None:
+                tile = Image.new('RGB', (width, tile_height))
+            tile.paste(img.crop((0, first, width, first + count)).convert('RGB'), (0, filled))
+        filled += count
+        if filled < tile_height:
+            return None
+        done, tile, filled = tile, None, 0
+        return done
+
+    for kind, data in chunks:
+        if kind in PNG_BAND_CHUNKS:
+            extra += _png_chunk(kind, data)
+        elif kind == b'IDAT':
+            while data:
+                rows += inflater.decompress(data, INFLATE_CHUNK)
+                data = inflater.unconsumed_tail
+                while True:
+                    count = min(PNG_BAND_ROWS, tile_height - filled)
+                    if len(rows) < count * stride:
+                        break
+                    done = band(count)
+                    if done is not None:
+                        yield done
+    rows += inflater.flush()
+    while len(rows) >= stride:
+        done = band(min(PNG_BAND_ROWS, tile_height - filled, len(rows) // stride))
+        if done is not None:
+            yield done
+    if tile is not None:
+        yield tile.crop((0, 0, width, filled))
+
+
+def read_tiles(path, tile_height):
+    """Yield an image file top to bottom as RGB tiles of ``tile_height`` rows."""
+    from PIL import Image
+
+    f = open(path, 'rb')
+    try:
+        if f.read(8) == PNG_SIGNATURE:
+            chunks = _png_chunks(f)
+            kind, ihdr = next(chunks, (None, None))
+            # 8-bit, non-interlaced: the raw rows Pillow returns are the PNG's own
+            if kind == b'IHDR' and ihdr[8] == 8 and ihdr[9] in PNG_CHANNELS and ihdr[12] == 0:
+                yield from _png_bands(f, ihdr, chunks, tile_height)
+                return
+        with Image.open(path) as img:
+            for top in range(0, img.height, tile_height):
+                yield img.crop((0, top, img.width, min(img.height, top + tile_height))).convert('RGB')
+    finally:
+        f.close()
+
+
+def _stack(top, bottom):
+    from PIL import Image
+
+    stacked = Image.new('RGB', (max(top.width, bottom.width), top.height + bottom.height), 'white')
+    stacked.paste(top, (0, 0))
+    stacked.paste(bottom, (0, top.height))
+    return stacked
+
+
+def is_strip_chapter(sizes, page_height, min_height):
+    """True when pages are much taller than a page or mostly tiny slices."""
+    if len(sizes) < 2 and not any(h > page_height * 2 for _, h in sizes):
+        return False
+    tall = sum(h > page_height * 2 for _, h in sizes)
+    tiny = sum(h < min_height for _, h in sizes)
+    return tall > 0 or tiny > len(sizes) // 2
+
+
+class _PageBuilder:
+    """Collects strip segments and encodes them as numbered pages."""
+
+    def __init__(self, folder, fmt, width):
+        self.folder = folder
+        self.fmt = fmt
+        self.width = width
+        self.segments = []
+        self.height = 0
+        self.pending = None
+        self.written = []
+
+    def add(self, img, top, bottom):
+        if bottom > top:
+            self.segments.append(img.crop((0, top, img.width, bottom)))
+            self.height += bottom - top
+
+    def cut(self):
+        """Close the current page; it is held back so a short tail can still join it."""
+        if self.pending is not None:
+            self._write(self.pending)
+        self.pending, self.segments, self.height = self.segments, [], 0
+
+    def finish(self, min_height):
+        if self.segments and self.pending is not None and self.height < min_height:
+            self.pending += self.segments
+        elif self.segments:
+            self.cut()
+        if self.pending:
+            self._write(self.pending)
+            self.pending = None
+
+    def _write(self, segments):
+        from PIL import Image
+
+        height = sum(s.height for s in segments)
+        page = Image.new('RGB', (self.width, height), 'white')
+        y = 0
+        for segment in segments:
+            if segment.mode != 'RGB':
+                segment = segment.convert('RGB')
+            page.paste(segment, ((self.width - segment.width) // 2, y))
+            y += segment.height
+        ext = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp', 'AVIF': '.avif', 'JXL': '.jxl'}[self.fmt]
+        name = f"{PAGE_PREFIX}{len(self.written) + 1:03d}{ext}"
+        out = io.BytesIO()
+        page.save(out, format=self.fmt, quality=90)
+        data = out.getvalue()
+        with open(os.path.join(self.folder, name + STRIP_SUFFIX), 'wb') as f:
+            f.write(data)
+        self.written.append((name, len(data), self.fmt, hashlib.sha256(data).hexdigest()))
+
+
+def _cut_pages(builder, img, page_height, window, tolerance, final):
+    """Cut ``img`` into the pages being built; returns the first row not used yet.
+
+    Unless ``final``, rows within ``window`` of the end are kept for the next
+    tile, so a cut can move down to a blank row that is not read yet.
+    """
+    y = 0
+    while y < img.height:
+        need = page_height - builder.height
+        if not final and img.height - y < need + window:
+            return y
+        if img.height - y <= need:
+            builder.add(img, y, img.height)
+            return img.height
+        cut = find_cut(img, y + need, window, tolerance)
+        if cut <= y:
+            cut = y + need
+        builder.add(img, y, cut)
+        builder.cut()
+        y = cut
+    return y
+
+
+def normalize_folder(folder, files, page_height, min_height, window, tolerance):
+    """Re-cut the ordered page ``files`` of a chapter into ``*.strip`` files; runs in the CPU pool.
+
+    Returns ``[(filename, size, format, sha256)]`` for the new pages, or None
+    when the chapter does not look like a strip and was left alone. The
+    source pages are not touched.
+    """
+    with _strip_pixel_limit():
+        return _normalize_folder(folder, files, page_height, min_height, window, tolerance)
+
+
+def _normalize_folder(folder, files, page_height, min_height, window, tolerance):
+    from PIL import Image
+
+    paths = [os.path.join(folder, name) for name in files]
+    sizes, fmt = [], None
+    for path in paths:
+        with Image.open(path) as img:
+            sizes.append(img.size)
+            fmt = fmt or img.format
+    if not is_strip_chapter(sizes, page_height, min_height):
+        return None
+    fmt = fmt if fmt in ('JPEG', 'PNG', 'WEBP', 'AVIF', 'JXL') else 'PNG'
+
+    builder = _PageBuilder(folder, fmt, max(w for w, _ in sizes))
+    for path in paths:
+        carry = None
+        for tile in read_tiles(path, page_height + 2 * window):
+            tile = tile if carry is None else _stack(carry, tile)
+            y = _cut_pages(builder, tile, page_height, window, tolerance, final=False)
+            carry = tile.crop((0, y, tile.width, tile.height))
+        if carry is not None:
+            _cut_pages(builder, carry, page_height, window, tolerance, final=True)
+    builder.finish(min_height)
+    return builder.written
+
+
+def page_files(folder, manifest=None):
+    """Image files of a chapter in reading order.
+
+    Pages re-cut earlier come before pages downloaded since, which continue the chapter.
+    """
+    if manifest is not None and manifest.pages:
+        order = sorted(manifest.pages, key=lambda name: (manifest.pages[name].get('source') is not None, name))
+        return [name for name in order if os.path.exists(os.path.join(folder, name))]
+    return sorted(name for name in os.listdir(folder)
+                  if name != MANIFEST_NAME and name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def normalize_chapter(manifest):
+    """Normalize a finished chapter in place and update its manifest. Returns True if it changed."""
+    settings = _settings
+    if settings is None or not os.path.isdir(manifest.folder):
+        return False
+    # Already re-cut and nothing downloaded since
+    if manifest.strips and not any(page.get('source') for page in manifest.pages.values()):
+        return False
+    files = page_files(manifest.folder, manifest)
+    if not files:
+        return False
+    written = run_cpu(normalize_folder, manifest.folder, files, **settings)
+    if written is None:
+        return False
+    # The downloaded pages stay recorded, so downloading the chapter again skips them
+    previous = manifest.strips or {}
+    downloaded = [name for name in files if manifest.pages.get(name, {}).get('source') is not None]
+    sources = previous.get('sources', []) + [
+        {'file': name, 'source': manifest.pages[name]['source'], 'sha256': manifest.pages[name].get('sha256')}
+        for name in downloaded]
+    source_bytes = sum(os.path.getsize(os.path.join(manifest.folder, name)) for name in downloaded)
+    # ``replaced`` lists every input, earlier re-cut pages included, for finish_strips to remove
+    manifest.replace_pages(written, {'source_pages': len(sources),
+                                     'source_bytes': previous.get('source_bytes', 0) + source_bytes,
+                                     'sources': sources, 'replaced': files})
+    # Saved before any file moves: from here on the manifest can finish the job after a crash
+    manifest.save()
+    manifest.finish_strips()
+    return True
+
+
+_env = os.environ.get('WEBCOMIC_STRIP_HEIGHT')
+if _env:
+    configure_strips(int(_env))
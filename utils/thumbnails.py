@@ -0,0 +1,231 @@
+"""
+Thumbnail cache of series covers and downloaded chapters.
+
+Thumbnails are small JPEGs (at most ``THUMBNAIL_SIZE``) made with Pillow by
+background workers, in the CPU pool when it is on, so browsing a library
+never decodes full-size pages on the UI thread. They are stored in
+``thumbnails/`` in the data directory under the SHA-256 of the source image:
+a chapter's thumbnail is found from the first page's hash in its manifest
+without reading the page, and a cover shared by several URLs is stored once.
+Covers are looked up by series URL through ``index.json``.
+
+The cache holds at most ``WEBCOMIC_THUMBNAIL_CACHE_MB`` (default 64) MB; the
+least recently shown thumbnails are removed first. ``WEBCOMIC_THUMBNAIL_WORKERS``
+(default 2) sets how many thumbnails are made at once.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .cpu_tasks import make_thumbnail
+from .manifest import ChapterManifest
+from .paths import atomic_write, data_path
+from .process_pool import run_cpu
+
+THUMBNAIL_DIR = 'thumbnails'
+INDEX_FILE = 'index.json'
+THUMBNAIL_SIZE = (160, 240)
+THUMBNAIL_QUALITY = 80
+# After an eviction the cache is this fraction of its limit, so not every new thumbnail evicts
+EVICT_TO = 0.9
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif', '.jxl')
+
+_max_mb = int(os.environ.get('WEBCOMIC_THUMBNAIL_CACHE_MB', '64') or 64)
+_workers = int(os.environ.get('WEBCOMIC_THUMBNAIL_WORKERS', '2') or 2)
+
+
+def first_page(folder):
+    """``(path, sha256)`` of a chapter's first page; the hash is None without a manifest record."""
+    if not os.path.isdir(folder):
+        return None, None
+    pages = ChapterManifest(folder).pages
+    if pages:
+        page = pages[min(pages)]
+        return os.path.join(folder, page['file']), page.get('sha256')
+    files = sorted(name for name in os.listdir(folder) if name.lower().endswith(IMAGE_EXTENSIONS))
+    return (os.path.join(folder, files[0]), None) if files else (None, None)
+
+
+class ThumbnailCache:
+    """Size-bounded on-disk thumbnails keyed by the source image's SHA-256."""
+
+    def __init__(self, directory=None, max_mb=None, workers=None):
+        self.directory = directory or data_path(THUMBNAIL_DIR)
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = int((max_mb if max_mb is not None else _max_mb) * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers or _workers),
+                                            thread_name_prefix='thumbnails')
+        self._pending = {}
+        self._covers = self._load_index()
+        self._size = sum(entry.stat().st_size for entry in os.scandir(self.directory)
+                         if entry.name.endswith('.jpg'))
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        atomic_write(os.path.join(self.directory, INDEX_FILE), json.dumps(self._covers))
+
+    def path_for(self, digest):
+        return os.path.join(self.directory, f"{digest}.jpg")
+
+    def lookup(self, digest):
+        """Path of the cached thumbnail for ``digest``, or None; marks it as recently used."""
+        path = self.path_for(digest)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def store(self, digest, data):
+        """Make and cache the thumbnail of image bytes ``data``; returns its path."""
+        thumbnail = run_cpu(make_thumbnail, data, *THUMBNAIL_SIZE, THUMBNAIL_QUALITY)
+        path = self.path_for(digest)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(thumbnail)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += len(thumbnail)
+            over = self._size > self.max_bytes
+        if over:
+            self._evict(keep=path)
+        return path
+
+    def _evict(self, keep=None):
+        """Remove the least recently used thumbnails until the cache is under its limit again."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.jpg'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_bytes * EVICT_TO:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+        with self._lock:
+            self._size = size
+
+    def _submit(self, key, fn):
+        """Run ``fn`` on a worker once per ``key`` at a time; returns a Future of a path or None."""
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = self._executor.submit(self._run, key, fn)
+            return future
+
+    def _run(self, key, fn):
+        try:
+            return fn()
+        except Exception as e:
+            print(f"Could not make thumbnail for {key}: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def chapter_thumbnail(self, folder):
+        """Future of the thumbnail path of a downloaded chapter's first page (None if it has none)."""
+        path, digest = first_page(folder)
+        cached = self.lookup(digest) if digest else None
+        if cached or path is None:
+            future = Future()
+            future.set_result(cached)
+            return future
+
+        def make():
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            return self.lookup(digest) or self.store(digest, data)
+        return self._submit(os.path.abspath(folder), make)
+
+    def cover_thumbnail(self, series_url, scraper=None, refresh=False):
+        """Future of the thumbnail path of a series cover, fetched with ``scraper`` if not cached."""
+        with self._lock:
+            digest = None if refresh else self._covers.get(series_url)
+        cached = self.lookup(digest) if digest else None
+        if cached:
+            future = Future()
+            future.set_result(cached)
+            return future
+
+        def make():
+            nonlocal scraper
+            if scraper is None:
+                from scrapers import get_scraper_for_url
+                scraper = get_scraper_for_url(series_url)
+            data = scraper.get_cover(series_url) if scraper else None
+            if not data:
+                return None
+            digest = hashlib.sha256(data).hexdigest()
+            path = self.lookup(digest) or self.store(digest, data)
+            with self._lock:
+                self._covers[series_url] = digest
+                self._save_index()
+            return path
+        return self._submit(series_url, make)
+
+    def prefetch_covers(self, series_urls):
+        """Start fetching the covers of ``series_urls`` that are not cached yet."""
+        return [self.cover_thumbnail(url) for url in series_urls]
+
+    def usage(self):
+        """``(thumbnails, bytes)`` in the cache."""
+        with self._lock:
+            count = sum(1 for entry in os.scandir(self.directory) if entry.name.endswith('.jpg'))
+            return count, self._size
+
+    def clear(self):
+        with self._lock:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.jpg'):
+                    os.remove(entry.path)
+            self._covers = {}
+            self._save_index()
+            self._size = 0
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def configure_thumbnails(directory=None, max_mb=None, workers=None):
+    """Use a new cache; the arguments default to the data directory and the environment."""
+    global _cache
+    with _cache_lock:
+        old, _cache = _cache, ThumbnailCache(directory, max_mb, workers)
+    if old is not None:
+        old.shutdown(wait=False)
+
+
+def get_thumbnail_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ThumbnailCache()
+        return _cache
@@ -0,0 +1,125 @@
+"""
+Optional transcoding of downloaded pages to a smaller format.
+
+Set ``WEBCOMIC_TRANSCODE=webp:80`` (format and quality) or call
+``configure_transcoding('avif', 60)`` to enable it. Pages are encoded in the
+CPU pool straight from the download buffer, written under their original
+name with the new extension (``001.png`` -> ``001.webp``), and the size
+savings are recorded in the chapter manifest. A page is kept as-is when the
+new encoding would not be smaller.
+"""
+
+import hashlib
+import os
+from concurrent.futures import Future
+
+from .cpu_tasks import transcode_image
+from .disk_writer import submit_write
+from .process_pool import submit_cpu
+
+EXTENSIONS = {
+    'WEBP': '.webp',
+    'AVIF': '.avif',
+    'JXL': '.jxl',
+    'JPEG': '.jpg',
+    'PNG': '.png',
+}
+
+# Animated or already-small formats that are not worth re-encoding
+SKIP_FORMATS = {'GIF'}
+
+_target = None
+
+
+def configure_transcoding(fmt=None, quality=80):
+    """Enable transcoding to ``fmt`` at ``quality``; ``fmt=None`` disables it."""
+    global _target
+    if fmt is None:
+        _target = None
+        return
+    fmt = fmt.upper().replace('JPG', 'JPEG').replace('JPEGXL', 'JXL').replace('JPEG-XL', 'JXL')
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unsupported transcode format: {fmt}")
+    _target = (fmt, int(quality))
+
+
+def parse_setting(value):
+    """Parse ``'webp:80'`` style settings into ``(format, quality)``."""
+    fmt, _, quality = value.partition(':')
+    return fmt, int(quality) if quality else 80
+
+
+def transcode_target():
+    """Return ``(format, quality)`` or None when transcoding is off."""
+    return _target
+
+
+def target_path(filepath):
+    """Path a page ends up at after transcoding."""
+    if _target is None:
+        return filepath
+    return os.path.splitext(filepath)[0] + EXTENSIONS[_target[0]]
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_page(path, data, manifest, record, replaces=None):
+    """Hand a page to the disk writer; it is added to the manifest once it is on disk."""
+    def written():
+        if replaces and replaces != path and os.path.exists(replaces):
+            os.remove(replaces)
+        if manifest is not None:
+            manifest.add_page(os.path.basename(path), *record, sha256=sha256(data))
+        return True
+
+    return submit_write(path, data, written)
+
+
+def store_page(data, filepath, source_url, source_format, manifest=None):
+    """Write a verified page, transcoding it first when enabled.
+
+    With a manifest, transcoding and writing happen in the background and the
+    manifest waits for them on save; the return value is then always True.
+    The disk writer blocks this call while its queue is full.
+    """
+    target = _target
+    if target is None or source_format in SKIP_FORMATS or source_format == target[0]:
+        written = _write_page(filepath, data, manifest, (source_url, len(data), source_format))
+        if manifest is None:
+            return written.result()
+        manifest.defer(written)
+        return True
+
+    def finish(future):
+        try:
+            converted = future.result()
+        except Exception as e:
+            print(f"Could not transcode {os.path.basename(filepath)}: {e}")
+            converted = None
+        if converted is None:
+            return _write_page(filepath, data, manifest, (source_url, len(data), source_format))
+        return _write_page(target_path(filepath), converted, manifest,
+                           (source_url, len(converted), target[0], len(data), source_format), filepath)
+
+    future = submit_cpu(transcode_image, bytes(data), target[0], target[1])
+    if manifest is None:
+        return finish(future).result()
+    done = Future()
+
+    def chain(f):
+        try:
+            finish(f).add_done_callback(lambda written: done.set_result(written.result()))
+        except Exception as e:
+            print(f"Error writing {filepath}: {e}")
+            done.set_result(False)
+
+    future.add_done_callback(chain)
+    manifest.defer(done)
+    return True
+
+
+_env = os.environ.get('WEBCOMIC_TRANSCODE')
+if _env:
+    configure_transcoding(*parse_setting(_env))